@@ -1,12 +1,17 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from BigQueryIntergration import BigQueryClient
-from AppointmentManagementLogic import AppointmentManager
-from ChatGPTIntegration import ChatGPTAdapter
-import os
+from ClientRegistry import registry
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def startup_event():
+    registry.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await registry.aclose()
+
 class ChatRequest(BaseModel):
     text: str
     user_id: str
@@ -15,14 +20,13 @@ class ChatRequest(BaseModel):
 async def handle_chat(request: ChatRequest):
     try:
         # Step 1: Parse natural language
-        gpt_adapter = ChatGPTAdapter(os.getenv("OPENAI_API_KEY"))
-        parsed_request = gpt_adapter.parse_request(request.text)
+        gpt_adapter = registry.gpt_adapter
+        parsed_request = gpt_adapter.parse_request(request.text, request.user_id)
         
         # Step 2: Process request
-        bq_client = BigQueryClient()
-        manager = AppointmentManager(bq_client)
+        manager = registry.appointment_manager
         
-        match parsed_request.get('intent'):
+        match parsed_request.intent:
             case 'create_appointment':
                 result = manager.create_appointment(parsed_request)
             case 'cancel_appointment':
@@ -35,4 +39,4 @@ async def handle_chat(request: ChatRequest):
             "structured_data": result
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
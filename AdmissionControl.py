@@ -0,0 +1,112 @@
+# AdmissionControl.py
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from Metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT = REGISTRY.gauge(
+    "calendar_admission_in_flight", "Calls currently admitted to an upstream", ("limiter",)
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "calendar_admission_queue_depth", "Calls waiting for admission to an upstream", ("limiter",)
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    "calendar_admission_wait_seconds", "Time spent waiting for admission", ("limiter", "outcome")
+)
+REJECTED = REGISTRY.counter(
+    "calendar_admission_rejected_total", "Calls rejected by admission control", ("limiter", "reason")
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted to an upstream in time"""
+
+    def __init__(self, limiter: str, reason: str, status_code: int, retry_after: int):
+        super().__init__(f"{limiter} overloaded ({reason}), retry after {retry_after}s")
+        self.limiter = limiter
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent calls to one upstream, with a bounded wait queue.
+
+    A call that finds the queue full is rejected at once with 503; a call that
+    waits longer than `queue_timeout` is rejected with 429. Either way the
+    client gets a Retry-After estimated from recent call durations.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._waiting = 0
+        self._in_flight = 0
+        self._avg_hold = 0.5  # seconds, exponentially weighted
+
+    @asynccontextmanager
+    async def acquire(self):
+        await self._admit()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - started
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * held
+            self._in_flight -= 1
+            IN_FLIGHT.set(self._in_flight, limiter=self.name)
+            self._semaphore.release()
+
+    async def _admit(self):
+        started = time.perf_counter()
+        if not self._semaphore.locked():
+            # Free slot: acquire() returns without suspending
+            await self._semaphore.acquire()
+        else:
+            if self._waiting >= self.max_queue:
+                # Not queued: the caller would wait behind everyone already waiting
+                self._reject("queue_full", 503, self._waiting + 1)
+
+            self._waiting += 1
+            QUEUE_DEPTH.set(self._waiting, limiter=self.name)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                QUEUE_WAIT.observe(time.perf_counter() - started, limiter=self.name, outcome="timeout")
+                # Still counted in _waiting
+                self._reject("queue_timeout", 429, self._waiting)
+            finally:
+                self._waiting -= 1
+                QUEUE_DEPTH.set(self._waiting, limiter=self.name)
+
+        QUEUE_WAIT.observe(time.perf_counter() - started, limiter=self.name, outcome="admitted")
+        self._in_flight += 1
+        IN_FLIGHT.set(self._in_flight, limiter=self.name)
+
+    def _reject(self, reason: str, status_code: int, queued: int):
+        REJECTED.inc(limiter=self.name, reason=reason)
+        # Time for `queued` calls (the caller included) to drain through the available slots
+        drain = self._avg_hold * queued / self.max_concurrent
+        retry_after = min(30, max(1, math.ceil(drain)))
+        logger.warning(f"Admission rejected for {self.name}: {reason}")
+        raise AdmissionRejected(self.name, reason, status_code, retry_after)
+
+
+def limiter_from_env(name: str, env_prefix: str, max_concurrent: int, max_queue: int,
+                     queue_timeout: float) -> ConcurrencyLimiter:
+    """Build a limiter whose settings can be overridden by <PREFIX>_MAX_CONCURRENCY etc."""
+    return ConcurrencyLimiter(
+        name,
+        max_concurrent=int(os.getenv(f"{env_prefix}_MAX_CONCURRENCY", max_concurrent)),
+        max_queue=int(os.getenv(f"{env_prefix}_MAX_QUEUE", max_queue)),
+        queue_timeout=float(os.getenv(f"{env_prefix}_QUEUE_TIMEOUT", queue_timeout)),
+    )
@@ -2,18 +2,48 @@ from BigQueryIntergration import bigquery
 from CoreDatamodels import Appointment,ParsedRequest
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, AsyncIterator
 from pydantic import BaseModel
 from google.cloud import bigquery
 import pytz,json
+import base64
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor
+from Metrics import stage, timed
+from AdmissionControl import ConcurrencyLimiter
+from WorkerDirectory import WorkerDirectory, working_hours
+from QueryRegistry import QUERIES
+from contextlib import nullcontext
 
 logger = logging.getLogger(__name__)
 
+# Alternatives are probed up to this far past the requested slot (see suggest_alternatives)
+ALTERNATIVES_HORIZON = timedelta(hours=6)
+# get_availability: days searched when no date is given, and the slot grid
+AVAILABILITY_DAYS = 7
+AVAILABILITY_STEP = timedelta(minutes=30)
+
 class AppointmentManager:
-    def __init__(self, bq_client):
+    def __init__(self, bq_client, worker_cache: Optional[Dict] = None, busy_cache: Optional[Dict] = None,
+                 directory: Optional[WorkerDirectory] = None):
         self.bq_client = bq_client
         self.default_duration = 30  # minutes
-
+        # Process-wide in-memory copy of the workers table; lookups fall back
+        # to BigQuery when it is absent or could not be loaded
+        self.directory = directory
+        # Optional request-scoped caches, used to share lookups across a batch:
+        #   worker_cache: lower-cased name / worker_id -> worker dict
+        #   busy_cache:   worker_id -> (window_start, window_end, [(appointment_id, start, end)])
+        self.worker_cache = worker_cache
+        self.busy_cache = busy_cache
+
+    def for_batch(self) -> 'AppointmentManager':
+        """Manager sharing this BigQuery client with fresh, batch-scoped caches"""
+        return AppointmentManager(self.bq_client, worker_cache={}, busy_cache={}, directory=self.directory)
+
+    @timed("create_appointment")
     def create_appointment(self, request: ParsedRequest) -> Dict:
         """Main appointment creation flow"""
         try:
@@ -58,55 +88,40 @@ class AppointmentManager:
             #     'calendar_system.appointments',
             #     [appointment_data]
             # )
-            errors = self.bq_client.insert_data('appointments', [appointment_data])
+            with stage("insert"):
+                errors = self.bq_client.insert_data('appointments', [appointment_data])
             
             if errors:
                 logger.error(f"BigQuery insert errors: {errors}")
                 raise RuntimeError("Failed to create appointment")
 
-            return appointment_data
+            self._record_busy(worker['worker_id'], appointment_id, start_time, end_time)
+            # Worker name/timezone let the response renderer show local times
+            return {**appointment_data, "worker_name": worker['name'], "timezone": worker['timezone']}
 
         except Exception as e:
             logger.error(f"Appointment creation failed: {str(e)}")
             raise
 
     # AppointmentManagementLogic.py (in check_availability)
+    @timed("availability_check")
     def check_availability(self, worker_id: str, start: datetime, end: datetime, exclude_id: str = None) -> bool:
         """Check availability while optionally excluding an appointment"""
-        query = """
-            SELECT COUNT(*) AS conflicts
-            FROM `calendar_system.appointments`
-            WHERE worker_id = @worker_id
-            AND status NOT IN ('cancelled', 'rescheduled')
-            AND (
-                (start_time BETWEEN @start AND @end) OR
-                (end_time BETWEEN @start AND @end) OR
-                (start_time <= @start AND end_time >= @end)
-            )
-            {}
-        """.format("AND appointment_id != @exclude_id" if exclude_id else "")
-        
-        params = [
-            bigquery.ScalarQueryParameter("worker_id", "STRING", worker_id),
-            bigquery.ScalarQueryParameter("start", "DATETIME", start.replace(tzinfo=None)),
-            bigquery.ScalarQueryParameter("end", "DATETIME", end.replace(tzinfo=None))
-        ]
-        
-        if exclude_id:
-            params.append(
-                bigquery.ScalarQueryParameter("exclude_id", "STRING", exclude_id)
-            )
-        
-        job_config = bigquery.QueryJobConfig(query_parameters=params)
-        
+        cached = self._cached_busy_intervals(worker_id, start, end)
+        if cached is not None:
+            return not _overlaps_any(cached, start, end, exclude_id)
+
         try:
-            query_job = self.bq_client.query(query, job_config=job_config)
-            result = next(query_job.result())
-            return result.conflicts == 0
+            result = QUERIES.first(
+                self.bq_client, "availability_conflicts", worker_id=worker_id,
+                start=start.replace(tzinfo=None), end=end.replace(tzinfo=None), exclude_id=exclude_id
+            )
+            return result['conflicts'] == 0
         except Exception as e:
             logger.error(f"Availability check failed: {str(e)}")
             raise
 
+    @timed("suggest_alternatives")
     def suggest_alternatives(self, worker_id: str, original_time: datetime, max_slots=3) -> List[str]:
         """Find next available time slots"""
         worker = self._get_worker_by_id(worker_id)
@@ -132,6 +147,7 @@ class AppointmentManager:
 
         return alternatives
     
+    @timed("reschedule_appointment")
     def reschedule_appointment(self, request: ParsedRequest) -> Dict:
         """Reschedule an existing appointment"""
         try:
@@ -146,7 +162,7 @@ class AppointmentManager:
             # Validate new time
             worker = self._get_worker_by_id(existing['worker_id'])
             new_start = self._convert_to_utc(request.datetime, worker['timezone'])
-            new_end = new_start + timedelta(minutes=request.duration)
+            new_end = new_start + timedelta(minutes=request.duration or self.default_duration)
 
             # Check availability (excluding current appointment)
             if not self.check_availability(
@@ -160,22 +176,19 @@ class AppointmentManager:
                 }
 
             # Update appointment
-            update_query = f"""
-                UPDATE `calendar_system.appointments`
-                SET start_time = '{new_start.isoformat()}',
-                    end_time = '{new_end.isoformat()}',
-                    status = 'rescheduled'
-                WHERE appointment_id = '{request.appointment_id}'
-                AND user_id = '{request.user_id}'
-            """
-            
-            query_job = self.bq_client.query(update_query)
-            query_job.result()
+            with stage("update"):
+                QUERIES.run(
+                    self.bq_client, "reschedule_appointment", start_time=new_start, end_time=new_end,
+                    appointment_id=request.appointment_id, user_id=request.user_id
+                ).result()
+            self._invalidate_busy(worker['worker_id'])
             
             return {
                 "status": "success",
                 "appointment_id": request.appointment_id,
-                "new_time": new_start.isoformat()
+                "new_time": new_start.isoformat(),
+                "worker_name": worker['name'],
+                "timezone": worker['timezone']
             }
 
         except Exception as e:
@@ -183,6 +196,7 @@ class AppointmentManager:
             raise
             
 
+    @timed("cancel_appointment")
     def cancel_appointment(self, request: ParsedRequest) -> Dict:
         """Cancel an appointment by ID or worker/time details"""
         try:
@@ -201,23 +215,12 @@ class AppointmentManager:
             if not existing:
                 raise ValueError("Appointment not found or access denied")
 
-            # Parameterized query for security
-            cancel_query = """
-                UPDATE `calendar_system.appointments`
-                SET status = 'cancelled'
-                WHERE appointment_id = @appointment_id
-                AND user_id = @user_id
-            """
-            
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ScalarQueryParameter("appointment_id", "STRING", existing['appointment_id']),
-                    bigquery.ScalarQueryParameter("user_id", "STRING", request.user_id)
-                ]
-            )
-
-            query_job = self.bq_client.query(cancel_query, job_config=job_config)
-            query_job.result()  # Wait for completion
+            with stage("update"):
+                QUERIES.run(
+                    self.bq_client, "cancel_appointment",
+                    appointment_id=existing['appointment_id'], user_id=request.user_id
+                ).result()  # Wait for completion
+            self._invalidate_busy(existing.get('worker_id'))
 
             return {
                 "status": "success",
@@ -229,6 +232,72 @@ class AppointmentManager:
             logger.error(f"Appointment cancellation failed: {str(e)}")
             raise
 
+    @timed("get_availability")
+    def get_availability(self, request: ParsedRequest) -> Dict:
+        """Free slots of a worker, computed from one busy-interval query.
+
+        Searches the requested day (or the next AVAILABILITY_DAYS days when no
+        date is given), intersects the worker's working hours in their timezone
+        with the gaps between booked appointments, and cuts those gaps into
+        slots of the requested duration on an AVAILABILITY_STEP grid.
+        """
+        try:
+            if not request.worker_name:
+                raise ValueError("worker_name is required for availability")
+            worker = self._get_worker_details(request.worker_name)
+            if not worker:
+                raise ValueError(f"Worker '{request.worker_name}' not found. Valid workers: {self._list_all_worker_names()}")
+
+            tz = pytz.timezone(worker['timezone'])
+            duration = timedelta(minutes=request.duration or self.default_duration)
+            now = datetime.now(pytz.utc)
+            if request.datetime:
+                first_day = request.datetime.date()
+                days = 1
+            else:
+                first_day = now.astimezone(tz).date()
+                days = AVAILABILITY_DAYS
+
+            # Working windows in UTC, one per local day
+            windows = []
+            for offset in range(days):
+                day = first_day + timedelta(days=offset)
+                window_start, window_end = _working_window(worker, day, tz)
+                window_start = max(window_start, now)
+                if window_start + duration <= window_end:
+                    windows.append((window_start, window_end))
+
+            slots = []
+            free_windows = []
+            if windows:
+                range_start, range_end = windows[0][0], windows[-1][1]
+                busy = self._cached_busy_intervals(worker['worker_id'], range_start, range_end)
+                if busy is None:
+                    busy = self._get_busy_intervals([worker['worker_id']], range_start, range_end).get(worker['worker_id'], [])
+                busy = sorted((pytz.utc.localize(s), pytz.utc.localize(e)) for _, s, e in busy)
+
+                for window_start, window_end in windows:
+                    for gap in _subtract_intervals(window_start, window_end, busy):
+                        free_windows.append(gap)
+                        slots.extend(_slots_in_gap(gap, duration, AVAILABILITY_STEP, tz))
+
+            return {
+                "status": "success",
+                "worker_name": worker['name'],
+                "timezone": worker['timezone'],
+                "duration": int(duration.total_seconds() // 60),
+                "slots": [slot.astimezone(tz).isoformat() for slot in slots],
+                "free_windows": [
+                    {"start": start.astimezone(tz).isoformat(), "end": end.astimezone(tz).isoformat()}
+                    for start, end, _, _ in free_windows
+                ]
+            }
+
+        except Exception as e:
+            logger.error(f"Availability lookup failed: {str(e)}")
+            raise
+
+    @timed("appointment_lookup")
     def _find_appointment_by_details(self, user_id: str, worker_name: str, dt: datetime) -> Optional[Dict]:
         """Find appointment by user, worker, and LOCAL time"""
         try:
@@ -244,109 +313,185 @@ class AppointmentManager:
             start_window = utc_time - timedelta(hours=2)
             end_window = utc_time + timedelta(hours=2)
             
-            query = """
-                SELECT a.* 
-                FROM `calendar_system.appointments` a
-                JOIN `calendar_system.workers` w ON a.worker_id = w.worker_id
-                WHERE a.user_id = @user_id
-                AND LOWER(w.name) = LOWER(@worker_name)
-                AND a.start_time BETWEEN @start_time AND @end_time
-                AND a.status != 'cancelled'
-                LIMIT 1
-            """
-            
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-                    bigquery.ScalarQueryParameter("worker_name", "STRING", worker_name.strip()),
-                    bigquery.ScalarQueryParameter("start_time", "DATETIME", start_window),
-                    bigquery.ScalarQueryParameter("end_time", "DATETIME", end_window)
-                ]
+            return QUERIES.first(
+                self.bq_client, "appointment_by_details", user_id=user_id, worker_name=worker_name.strip(),
+                start_time=start_window, end_time=end_window
             )
             
-            result = next(self.bq_client.query(query, job_config=job_config).result(), None)
-            return dict(result) if result else None
-            
         except Exception as e:
             logger.error(f"Appointment lookup failed: {str(e)}")
             return None
 
-    # Example: get_user_appointments()
-    def get_user_appointments(self, user_id: str) -> List[Dict]:
+    def iter_user_appointments(self, user_id: str, cursor: Optional[str] = None, page_size: Optional[int] = None,
+                               max_rows: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Pages of a user's active appointments, newest first, after `cursor` when given"""
+        before_time, before_id = parse_appointment_cursor(cursor) if cursor else (None, None)
+        if max_rows:
+            yield from QUERIES.pages(self.bq_client, "user_appointments_page", page_size, max_rows, user_id=user_id,
+                                     before_time=before_time, before_id=before_id, row_limit=max_rows)
+        else:
+            yield from QUERIES.pages(self.bq_client, "user_appointments", page_size, user_id=user_id,
+                                     before_time=before_time, before_id=before_id)
+
+    @timed("get_user_appointments")
+    def get_user_appointments(self, user_id: str, limit: Optional[int] = None,
+                              cursor: Optional[str] = None) -> List[Dict]:
+        """A user's active appointments, newest first: all of them, or one page of `limit` after `cursor`"""
+        if cursor:
+            parse_appointment_cursor(cursor)  # ValueError for the caller, not an empty list
         try:
-            query = f"""
-                SELECT * 
-                FROM `calendar_system.appointments`
-                WHERE user_id = '{user_id}'
-                AND status != 'cancelled'
-                ORDER BY start_time DESC
-            """
-            query_job = self.bq_client.query(query)  # Get job object
-            results = query_job.result()             # Process results here
-            return [dict(row) for row in results]
+            return [row for page in self.iter_user_appointments(user_id, cursor, max_rows=limit) for row in page]
         except Exception as e:
             logger.error(f"Failed to fetch appointments: {str(e)}")
             return []
 
+    @timed("get_worker_appointments")
+    def get_worker_appointments(self, worker_id: str) -> List[Dict]:
+        """Active appointments of one worker, newest first"""
+        try:
+            return QUERIES.rows(self.bq_client, "worker_appointments", worker_id=worker_id)
+        except Exception as e:
+            logger.error(f"Failed to fetch worker appointments: {str(e)}")
+            return []
+
+    def get_appointment(self, appointment_id: str, user_id: str) -> Optional[Dict]:
+        """Public lookup of a single appointment owned by user_id"""
+        return self._get_appointment(appointment_id, user_id)
+
+    @timed("appointment_lookup")
     def _get_appointment(self, appointment_id: str, user_id: str) -> Optional[Dict]:
         """Internal method to retrieve an appointment"""
         try:
-            query = f"""
-                SELECT * 
-                FROM `calendar_system.appointments`
-                WHERE appointment_id = '{appointment_id}'
-                AND user_id = '{user_id}'
-                LIMIT 1
-            """
-            result = next(self.bq_client.query(query).result(), None)
-            return dict(result) if result else None
+            return QUERIES.first(self.bq_client, "appointment_by_id", appointment_id=appointment_id, user_id=user_id)
         except Exception as e:
             logger.error(f"Appointment lookup failed: {str(e)}")
             return None
 
+    @timed("worker_lookup")
     def _get_worker_by_id(self, worker_id: str) -> Optional[Dict]:
         """Get worker details by ID"""
+        if self.worker_cache is not None and worker_id in self.worker_cache:
+            return self.worker_cache[worker_id]
         try:
-            query = f"""
-                SELECT * 
-                FROM `calendar_system.workers`
-                WHERE worker_id = '{worker_id}'
-                LIMIT 1
-            """
-            result = next(self.bq_client.query(query).result(), None)
-            return dict(result) if result else None
+            if self.directory is not None and self.directory.ready():
+                return self.directory.by_id(worker_id)
+            return QUERIES.first(self.bq_client, "worker_by_id", worker_id=worker_id)
         except Exception as e:
             logger.error(f"Worker lookup failed: {str(e)}")
             return None
 
+    @timed("worker_lookup")
     def _get_worker_details(self, worker_name: str) -> Optional[Dict]:
         """Get worker details from BigQuery"""
         worker_name = worker_name.strip()
-        
-        query = """
-            SELECT worker_id, name, working_hours, timezone
-            FROM `calendar_system.workers`
-            WHERE LOWER(name) = LOWER(@worker_name)
-            LIMIT 1
-        """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("worker_name", "STRING", worker_name)
-            ]
-        )
+        if self.worker_cache is not None and worker_name.lower() in self.worker_cache:
+            return self.worker_cache[worker_name.lower()]
+        if self.directory is not None and self.directory.ready():
+            try:
+                return self.directory.by_name(worker_name)
+            except Exception as e:
+                logger.error(f"Worker lookup failed: {str(e)}")
+                return None
         
         try:
-            # Execute query and fetch results
-            query_job = self.bq_client.query(query, job_config=job_config)
-            result = next(query_job.result(), None)
+            result = QUERIES.first(self.bq_client, "worker_by_name", worker_name=worker_name)
             
             logger.info(f"Worker lookup: {worker_name} → Found: {bool(result)}")
-            return dict(result) if result else None  # Convert Row to dict
+            if result and self.worker_cache is not None:
+                self._cache_worker(result)
+            return result
             
         except Exception as e:
             logger.error(f"Worker lookup failed: {str(e)}")
             return None
 
+    def worker_timezone(self, worker_name: Optional[str] = None, worker_id: Optional[str] = None) -> Optional[str]:
+        """Timezone of a worker looked up by name or id, None if unknown"""
+        worker = self._get_worker_by_id(worker_id) if worker_id else self._get_worker_details(worker_name or "")
+        return worker.get('timezone') if worker else None
+
+    @timed("prefetch")
+    def prefetch_for(self, requests: Iterable[ParsedRequest]):
+        """Warm the batch caches for a set of parsed requests.
+
+        One query resolves every named worker, one more loads the busy
+        intervals of all those workers over the span the requests touch.
+        """
+        requests = [r for r in requests if r.worker_name]
+        if not requests:
+            return
+        workers = self.prefetch_workers(r.worker_name for r in requests)
+
+        windows: Dict[str, List[datetime]] = {}
+        for request in requests:
+            worker = workers.get(request.worker_name.strip().lower())
+            if not worker or not request.datetime:
+                continue
+            start = self._convert_to_utc(request.datetime, worker['timezone'])
+            end = start + timedelta(minutes=request.duration or self.default_duration) + ALTERNATIVES_HORIZON
+            windows.setdefault(worker['worker_id'], []).extend([start, end])
+
+        if windows:
+            bounds = [t for times in windows.values() for t in times]
+            self.prefetch_busy_intervals(list(windows), min(bounds), max(bounds))
+
+    def prefetch_workers(self, names: Iterable[str]) -> Dict[str, Dict]:
+        """Resolve many workers by name with a single query"""
+        names = sorted({n.strip().lower() for n in names if n})
+        if self.worker_cache is None:
+            self.worker_cache = {}
+        missing = [n for n in names if n not in self.worker_cache]
+        if missing and self.directory is not None and self.directory.ready():
+            for name in missing:
+                worker = self.directory.by_name(name)
+                if worker is not None:
+                    self._cache_worker(worker)
+        elif missing:
+            for worker in QUERIES.rows(self.bq_client, "workers_by_names", names=missing):
+                self._cache_worker(worker)
+        return {n: self.worker_cache[n] for n in names if n in self.worker_cache}
+
+    def prefetch_busy_intervals(self, worker_ids: List[str], start: datetime, end: datetime):
+        """Load busy intervals for several workers over [start, end] in one query"""
+        if self.busy_cache is None:
+            self.busy_cache = {}
+        intervals = self._get_busy_intervals(worker_ids, start, end)
+        window_start, window_end = _naive_utc(start), _naive_utc(end)
+        for worker_id in worker_ids:
+            self.busy_cache[worker_id] = (window_start, window_end, intervals.get(worker_id, []))
+
+    def _get_busy_intervals(self, worker_ids: List[str], start: datetime, end: datetime) -> Dict[str, List[Tuple[str, datetime, datetime]]]:
+        """Active appointments touching [start, end], grouped by worker (naive UTC)"""
+        job = QUERIES.run(self.bq_client, "busy_intervals", worker_ids=list(worker_ids),
+                          start=_naive_utc(start), end=_naive_utc(end))
+        intervals: Dict[str, List[Tuple[str, datetime, datetime]]] = {}
+        for row in job.result():
+            intervals.setdefault(row['worker_id'], []).append(
+                (row['appointment_id'], _naive_utc(row['start_time']), _naive_utc(row['end_time']))
+            )
+        return intervals
+
+    def _cached_busy_intervals(self, worker_id: str, start: datetime, end: datetime) -> Optional[List[Tuple[str, datetime, datetime]]]:
+        """Cached intervals if the batch cache fully covers [start, end]"""
+        if not self.busy_cache or worker_id not in self.busy_cache:
+            return None
+        window_start, window_end, intervals = self.busy_cache[worker_id]
+        if window_start <= _naive_utc(start) and _naive_utc(end) <= window_end:
+            return intervals
+        return None
+
+    def _record_busy(self, worker_id: str, appointment_id: str, start: datetime, end: datetime):
+        if self.busy_cache and worker_id in self.busy_cache:
+            self.busy_cache[worker_id][2].append((appointment_id, _naive_utc(start), _naive_utc(end)))
+
+    def _invalidate_busy(self, worker_id: Optional[str]):
+        if self.busy_cache and worker_id:
+            self.busy_cache.pop(worker_id, None)
+
+    def _cache_worker(self, worker: Dict):
+        self.worker_cache[worker['name'].strip().lower()] = worker
+        self.worker_cache[worker['worker_id']] = worker
+
     def _convert_to_utc(self, naive_time: datetime, source_tz: str) -> datetime:
         """Convert naive datetime to UTC"""
         try:
@@ -363,8 +508,7 @@ class AppointmentManager:
             tz = pytz.timezone(worker['timezone'])
             local_time = utc_time.astimezone(tz)
             
-            start_hour, start_minute = map(int, worker['working_hours']['start'].split(':'))
-            end_hour, end_minute = map(int, worker['working_hours']['end'].split(':'))
+            start_hour, start_minute, end_hour, end_minute = working_hours(worker)
             
             start = local_time.replace(hour=start_hour, minute=start_minute, second=0)
             end = local_time.replace(hour=end_hour, minute=end_minute, second=0)
@@ -375,7 +519,158 @@ class AppointmentManager:
             return False
     def _list_all_worker_names(self) -> List[str]:
         """Debug method to list all workers"""
-        query = "SELECT name FROM `calendar_system.workers`"
-        results = self.bq_client.query(query)
-        return [row['name'] for row in results]
-
+        if self.directory is not None and self.directory.ready():
+            return self.directory.names()
+        return [row['name'] for row in QUERIES.rows(self.bq_client, "worker_names")]
+
+
+def appointment_cursor(appointment: Dict) -> str:
+    """Opaque position just past `appointment` in a newest-first listing"""
+    start_time = appointment['start_time']
+    if isinstance(start_time, str):
+        start_time = datetime.fromisoformat(start_time)
+    payload = json.dumps([_naive_utc(start_time).isoformat(), appointment['appointment_id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def parse_appointment_cursor(cursor: str) -> Tuple[datetime, str]:
+    """(start_time as aware UTC, appointment_id) from appointment_cursor; ValueError if malformed"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        start_time, appointment_id = json.loads(payload)
+        return pytz.utc.localize(datetime.fromisoformat(start_time)), str(appointment_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _naive_utc(value: datetime) -> datetime:
+    """Normalise a datetime to naive UTC, matching the DATETIME parameters we send"""
+    if value.tzinfo is not None:
+        value = value.astimezone(pytz.utc).replace(tzinfo=None)
+    return value
+
+def _overlaps_any(intervals, start: datetime, end: datetime, exclude_id: str = None) -> bool:
+    """In-memory equivalent of the conflict predicate in check_availability"""
+    start, end = _naive_utc(start), _naive_utc(end)
+    return any(
+        busy_start <= end and busy_end >= start
+        for appointment_id, busy_start, busy_end in intervals
+        if appointment_id != exclude_id
+    )
+
+
+def _working_window(worker: Dict, day, tz) -> Tuple[datetime, datetime]:
+    """Worker's working hours on a local day, as aware UTC datetimes"""
+    start_hour, start_minute, end_hour, end_minute = working_hours(worker)
+    start = tz.localize(datetime(day.year, day.month, day.day, start_hour, start_minute))
+    end = tz.localize(datetime(day.year, day.month, day.day, end_hour, end_minute))
+    return start.astimezone(pytz.utc), end.astimezone(pytz.utc)
+
+def _subtract_intervals(window_start: datetime, window_end: datetime, busy: List[Tuple[datetime, datetime]]):
+    """Gaps of [window_start, window_end] not covered by the sorted busy intervals.
+
+    Busy intervals are closed, like the conflict predicate in
+    check_availability: a slot may not start at a busy end or end at a busy
+    start. Each gap is (start, end, start_open, end_open).
+    """
+    gaps = []
+    cursor, cursor_open = window_start, False
+    for busy_start, busy_end in busy:
+        if busy_end < cursor or (busy_end == cursor and cursor_open):
+            continue
+        if busy_start > window_end:
+            break
+        if busy_start > cursor:
+            gaps.append((cursor, busy_start, cursor_open, True))
+        if busy_end >= cursor:
+            cursor, cursor_open = busy_end, True
+    if cursor < window_end:
+        gaps.append((cursor, window_end, cursor_open, False))
+    return gaps
+
+def _slots_in_gap(gap, duration: timedelta, step: timedelta, tz) -> List[datetime]:
+    """Slot start times inside a gap, aligned to `step` on the local clock"""
+    gap_start, gap_end, start_open, end_open = gap
+    local_start = gap_start.astimezone(tz)
+    midnight = tz.localize(datetime(local_start.year, local_start.month, local_start.day))
+    steps_since_midnight = -(-(local_start - midnight) // step)  # ceil division
+    slot = (midnight + steps_since_midnight * step).astimezone(pytz.utc)
+    if start_open and slot == gap_start:
+        slot += step
+
+    slots = []
+    while slot + duration < gap_end or (not end_open and slot + duration == gap_end):
+        slots.append(slot)
+        slot += step
+    return slots
+
+
+class AsyncAppointmentManager:
+    """Async facade over AppointmentManager.
+
+    Every call runs the blocking BigQuery work on a dedicated, bounded executor
+    (reads and writes are kept apart so slow DML cannot starve lookups), so the
+    event loop stays free to serve other requests.
+    """
+
+    def __init__(self, manager: AppointmentManager, read_executor: Executor, write_executor: Optional[Executor] = None,
+                 read_limiter: Optional[ConcurrencyLimiter] = None, write_limiter: Optional[ConcurrencyLimiter] = None):
+        self.manager = manager
+        self.read_executor = read_executor
+        self.write_executor = write_executor or read_executor
+        # Admission control in front of BigQuery (raises AdmissionRejected)
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter or read_limiter
+
+    async def _run(self, executor: Executor, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        limiter = self.write_limiter if executor is self.write_executor else self.read_limiter
+        # Carry contextvars (request-scoped state) into the worker thread
+        ctx = contextvars.copy_context()
+        async with (limiter.acquire() if limiter else nullcontext()):
+            return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+    async def run_read(self, fn, *args, **kwargs):
+        """Run any blocking read-side call on the read executor"""
+        return await self._run(self.read_executor, fn, *args, **kwargs)
+
+    async def create_appointment(self, request: ParsedRequest) -> Dict:
+        return await self._run(self.write_executor, self.manager.create_appointment, request)
+
+    async def cancel_appointment(self, request: ParsedRequest) -> Dict:
+        return await self._run(self.write_executor, self.manager.cancel_appointment, request)
+
+    async def reschedule_appointment(self, request: ParsedRequest) -> Dict:
+        return await self._run(self.write_executor, self.manager.reschedule_appointment, request)
+
+    async def get_availability(self, request: ParsedRequest) -> Dict:
+        return await self._run(self.read_executor, self.manager.get_availability, request)
+
+    async def get_user_appointments(self, user_id: str, limit: Optional[int] = None,
+                                    cursor: Optional[str] = None) -> List[Dict]:
+        return await self._run(self.read_executor, self.manager.get_user_appointments, user_id, limit, cursor)
+
+    async def iter_user_appointments(self, user_id: str, cursor: Optional[str] = None,
+                                     page_size: Optional[int] = None) -> AsyncIterator[List[Dict]]:
+        """Pages of a user's appointments; each page is fetched on the read executor"""
+        pages = self.manager.iter_user_appointments(user_id, cursor, page_size)
+        while True:
+            page = await self._run(self.read_executor, next, pages, None)
+            if page is None:
+                return
+            yield page
+
+    async def get_worker_appointments(self, worker_id: str) -> List[Dict]:
+        return await self._run(self.read_executor, self.manager.get_worker_appointments, worker_id)
+
+    async def get_appointment(self, appointment_id: str, user_id: str) -> Optional[Dict]:
+        return await self._run(self.read_executor, self.manager.get_appointment, appointment_id, user_id)
+
+    async def worker_timezone(self, worker_name: Optional[str] = None, worker_id: Optional[str] = None) -> Optional[str]:
+        return await self._run(self.read_executor, self.manager.worker_timezone, worker_name, worker_id)
+
+    def for_batch(self) -> 'AsyncAppointmentManager':
+        """Facade over a batch-scoped manager, sharing these executors"""
+        return AsyncAppointmentManager(self.manager.for_batch(), self.read_executor, self.write_executor,
+                                       self.read_limiter, self.write_limiter)
+
+    async def prefetch_for(self, requests: List[ParsedRequest]):
+        return await self._run(self.read_executor, self.manager.prefetch_for, requests)
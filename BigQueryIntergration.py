@@ -1,17 +1,34 @@
 from google.cloud import bigquery
 from google.oauth2 import service_account
 from CoreDatamodels import User,Worker,Appointment
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 import os
 import json
+from InsertBuffer import InsertBuffer
+from QueryStream import iter_pages, iter_rows
+
+try:
+    from google.cloud import bigquery_storage
+except ImportError:  # optional; large results are then read over REST
+    bigquery_storage = None
 
 class BigQueryClient:
-    def __init__(self, credentials_path='service-account.json'):
-        self.credentials = service_account.Credentials.from_service_account_file(credentials_path)
+    def __init__(self, credentials_path='service-account.json', credentials=None, http=None):
+        # Reuse already-loaded credentials and a shared HTTP session when given
+        self.credentials = credentials or service_account.Credentials.from_service_account_file(credentials_path)
         self.client = bigquery.Client(
             credentials=self.credentials,
-            project=self.credentials.project_id
+            project=self.credentials.project_id,
+            _http=http
         )
+        # Coalesces streaming inserts from concurrent requests (see InsertBuffer)
+        self.inserts = InsertBuffer(self.client)
+        self._bqstorage_client = None
+
+    def close(self):
+        """Flush buffered inserts and close the underlying HTTP session"""
+        self.inserts.close()
+        self.client.close()
     
     def initialize_database(self):
     # Create dataset if it doesn't exist
@@ -71,13 +88,7 @@ class BigQueryClient:
                 print(f"Table {table_name} created.")
                 
     def insert_data(self, table_name: str, data: List[Dict[str, Any]]):
-
-        print("Sample data being inserted:", json.dumps(data[0], indent=2))
-
-        table_ref = self.client.dataset('calendar_system').table(table_name)
-        table = self.client.get_table(table_ref)
-        
-        errors = self.client.insert_rows_json(table, data)
+        errors = self.inserts.insert(f"calendar_system.{table_name}", data)
         if errors:
             raise RuntimeError(f"BigQuery insertion errors: {errors}")
 
@@ -85,6 +96,23 @@ class BigQueryClient:
         query_job = self.client.query(query, job_config=job_config)  # Pass job_config
         return query_job
 
+    def query_pages(self, query: str, job_config=None, page_size: Optional[int] = None,
+                    max_rows: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Run a query and yield its result a page (list of row dicts) at a time"""
+        return iter_pages(self.query(query, job_config=job_config), page_size, max_rows, self.bqstorage_client)
+
+    def iter_query(self, query: str, job_config=None, page_size: Optional[int] = None,
+                   max_rows: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Run a query and yield its rows as dicts, fetching a page at a time"""
+        return iter_rows(self.query(query, job_config=job_config), page_size, max_rows, self.bqstorage_client)
+
+    @property
+    def bqstorage_client(self):
+        """Storage Read API client for large columnar reads, when the package is installed"""
+        if self._bqstorage_client is None and bigquery_storage is not None:
+            self._bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=self.credentials)
+        return self._bqstorage_client
+
     def list_datasets_and_tables(self):
         print("Listing datasets and tables:")
         for dataset in self.client.list_datasets():
@@ -92,10 +120,9 @@ class BigQueryClient:
             for table in self.client.list_tables(dataset.reference):
                 print(f"  Table: {table.table_id}")
 
-    def insert_rows_json(self, table_id: str, rows: list) -> list:
+    def insert_rows_json(self, table_id: str, rows: list, row_ids: Optional[list] = None) -> list:
         """Insert JSON rows into a BigQuery table"""
-        table_ref = self.client.get_table(table_id)
-        errors = self.client.insert_rows_json(table_ref, rows)
+        errors = self.inserts.insert(table_id, rows, row_ids)
         if errors:
             raise RuntimeError(f"Insert errors: {errors}")
         return errors
\ No newline at end of file
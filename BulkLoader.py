@@ -0,0 +1,302 @@
+# BulkLoader.py
+"""Chunked, parallel and resumable loading of large row sets into BigQuery.
+
+Rows are first spooled to newline-delimited JSON under BULK_LOAD_DIR, so a
+failed run can be resumed with exactly the same rows even when they were
+randomly generated. Up to `load_job_rows` rows are sent as size-bounded
+chunks of parallel streaming inserts, and completed chunks are checkpointed.
+Larger sets go in a single load job from the spool file, with a job id
+derived from its contents so a resumed run cannot load it twice.
+`load_many` spools several tables before loading any of them, so related
+tables (e.g. a generated seed) are resumed together.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from InsertBuffer import row_id
+
+logger = logging.getLogger(__name__)
+
+# BigQuery accepts up to 10 MB per insertAll request and recommends ~500 rows
+CHUNK_ROWS = 500
+CHUNK_BYTES = 5 * 1024 * 1024
+
+
+class BulkLoadError(RuntimeError):
+    """A load stopped part-way; run it again to resume from the checkpoint"""
+
+
+@dataclass
+class LoadReport:
+    table: str
+    method: str  # "stream" or "load_job"
+    rows: int
+    chunks: int
+    resumed_chunks: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class BulkLoader:
+    def __init__(self, bq_client, chunk_rows: int = CHUNK_ROWS, chunk_bytes: int = CHUNK_BYTES,
+                 workers: Optional[int] = None, load_job_rows: Optional[int] = None,
+                 state_dir: Optional[str] = None, max_attempts: int = 3,
+                 on_progress: Optional[Callable[[str], None]] = None):
+        self.bq = bq_client  # BigQueryClient
+        self.chunk_rows = chunk_rows
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers or int(os.getenv("BULK_LOAD_WORKERS", "8"))
+        self.load_job_rows = load_job_rows or int(os.getenv("BULK_LOAD_JOB_ROWS", "20000"))
+        self.state_dir = state_dir or os.getenv("BULK_LOAD_DIR", ".bulk_load")
+        self.max_attempts = max_attempts
+        self.on_progress = on_progress or logger.info
+
+    def load(self, table_name: str, rows: Optional[Iterable[Dict[str, Any]]] = None) -> LoadReport:
+        """Load rows into calendar_system.<table_name>, resuming an interrupted run if there is one"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        spool, checkpoint = self._paths(table_name)
+        state = self._read_checkpoint(checkpoint)
+        if state is None:
+            if rows is None:
+                raise BulkLoadError(f"{table_name}: no rows given and no interrupted load to resume")
+            state = self._prepare(table_name, rows)
+        elif rows is None:
+            self.on_progress(f"{table_name}: resuming from {checkpoint}")
+        else:
+            self.on_progress(f"{table_name}: resuming from {checkpoint}; the rows passed in are ignored")
+
+        table_id = f"calendar_system.{table_name}"
+        started = time.perf_counter()
+        if state["method"] == "load_job":
+            resumed = self._load_job(table_id, spool, checkpoint, state)
+            chunks = 1
+        else:
+            chunks, resumed = self._stream(table_id, spool, checkpoint, state)
+        report = LoadReport(table_name, state["method"], state["rows"], chunks, resumed,
+                            time.perf_counter() - started)
+
+        os.remove(spool)
+        os.remove(checkpoint)
+        self.on_progress(f"{table_name}: {report.rows} rows via {report.method} in {report.seconds:.1f}s "
+                         f"({report.rows_per_second:.0f} rows/s)")
+        return report
+
+    def load_many(self, produce: Callable[[], Dict[str, Iterable[Dict[str, Any]]]],
+                  name: str = "batch") -> List[LoadReport]:
+        """Load several tables as one resumable unit.
+
+        `produce()` returns {table_name: rows}. Every table is spooled before
+        any is loaded, and `produce` is not called again while an earlier run
+        is unfinished: a rerun loads what is left of the same rows, even when
+        they were randomly generated and some tables are already loaded.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        manifest = os.path.join(self.state_dir, f"{name}.manifest.json")
+        tables = self._read_checkpoint(manifest)
+        if tables is None:
+            # Nothing has been loaded before the manifest exists: stale spools are simply replaced
+            tables = []
+            for table_name, rows in produce().items():
+                self._prepare(table_name, rows)
+                tables.append(table_name)
+            self._write_checkpoint(manifest, tables)
+        else:
+            self.on_progress(f"{name}: resuming from {manifest}")
+
+        reports = []
+        for table_name in tables:
+            if os.path.exists(self._paths(table_name)[1]):  # no checkpoint: loaded by an earlier run
+                reports.append(self.load(table_name))
+        os.remove(manifest)
+        return reports
+
+    # ------------------------------------------------------------------
+    # Streaming inserts
+    # ------------------------------------------------------------------
+    def _stream(self, table_id: str, spool: str, checkpoint: str, state: dict) -> Tuple[int, int]:
+        table = self.bq.client.get_table(table_id)
+        done = set(state["done"])
+        resumed = len(done)
+        progress = {"rows": 0, "started": time.perf_counter(), "reported": 0.0}
+        in_flight = {}
+        failure: Optional[BaseException] = None
+        chunk_count = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-load") as executor:
+            for index, chunk in enumerate(self._chunks(spool)):
+                chunk_count += 1
+                if index in done:
+                    progress["rows"] += len(chunk)
+                    continue
+                # Read at most two chunks per worker ahead of the inserts
+                while len(in_flight) >= self.workers * 2 and not failure:
+                    failure = self._collect(in_flight, done, progress, FIRST_COMPLETED)
+                    self._checkpoint(table_id, checkpoint, state, done, progress)
+                if failure:
+                    break
+                in_flight[executor.submit(self._insert_chunk, table, table_id, chunk)] = (index, len(chunk))
+            while in_flight and not failure:
+                failure = self._collect(in_flight, done, progress, FIRST_COMPLETED)
+                self._checkpoint(table_id, checkpoint, state, done, progress)
+            if in_flight:
+                # After a failure, chunks already sent still finish and are checkpointed
+                self._collect(in_flight, done, progress, ALL_COMPLETED)
+                self._checkpoint(table_id, checkpoint, state, done, progress)
+
+        if failure:
+            raise BulkLoadError(f"{table_id}: stopped after {progress['rows']} of {state['rows']} rows: "
+                                f"{str(failure)}. Run again to resume.") from failure
+        return chunk_count, resumed
+
+    @staticmethod
+    def _collect(in_flight: dict, done: set, progress: dict, return_when) -> Optional[BaseException]:
+        if not in_flight:
+            return None
+        finished, _ = wait(list(in_flight), return_when=return_when)
+        failure = None
+        for future in finished:
+            index, rows = in_flight.pop(future)
+            if future.exception() is None:
+                done.add(index)
+                progress["rows"] += rows
+            else:
+                failure = future.exception()
+        return failure
+
+    def _checkpoint(self, table_id: str, checkpoint: str, state: dict, done: set, progress: dict):
+        state["done"] = sorted(done)
+        self._write_checkpoint(checkpoint, state)
+        now = time.perf_counter()
+        if now - progress["reported"] < 2.0 and progress["rows"] < state["rows"]:
+            return
+        progress["reported"] = now
+        elapsed = max(now - progress["started"], 1e-9)
+        self.on_progress(f"{table_id}: {progress['rows']}/{state['rows']} rows "
+                         f"({100 * progress['rows'] / max(1, state['rows']):.0f}%), "
+                         f"{progress['rows'] / elapsed:.0f} rows/s")
+
+    def _insert_chunk(self, table, table_id: str, chunk: List[Dict[str, Any]]):
+        row_ids = [row_id(table_id, row) for row in chunk]  # same ids on retry: no duplicates
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                errors = self.bq.client.insert_rows_json(table, chunk, row_ids=row_ids)
+                if errors:
+                    raise RuntimeError(f"BigQuery insertion errors: {errors[:3]}")
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning(f"Chunk insert into {table_id} failed (attempt {attempt}): {str(e)}")
+                time.sleep(min(10.0, 0.5 * 2 ** attempt))
+
+    def _chunks(self, spool: str) -> Iterator[List[Dict[str, Any]]]:
+        chunk, size = [], 0
+        with open(spool, encoding="utf-8") as f:
+            for line in f:
+                if chunk and (len(chunk) >= self.chunk_rows or size + len(line) > self.chunk_bytes):
+                    yield chunk
+                    chunk, size = [], 0
+                chunk.append(json.loads(line))
+                size += len(line)
+        if chunk:
+            yield chunk
+
+    # ------------------------------------------------------------------
+    # Load job
+    # ------------------------------------------------------------------
+    def _load_job(self, table_id: str, spool: str, checkpoint: str, state: dict) -> int:
+        client = self.bq.client
+        # Same spool, same job id: a resumed run finds the job instead of loading twice
+        job_id = state.get("job_id") or (f"bulk_load_{table_id.replace('.', '_')}_{self._digest(spool)}"
+                                         f"_{state.get('attempt', 0)}")
+        state["job_id"] = job_id
+        self._write_checkpoint(checkpoint, state)
+
+        try:
+            job = client.get_job(job_id)
+            resumed = 1
+            self.on_progress(f"{table_id}: found load job {job_id} ({job.state})")
+        except NotFound:
+            table = client.get_table(table_id)
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                schema=table.schema,
+            )
+            with open(spool, "rb") as f:
+                job = client.load_table_from_file(f, table, job_id=job_id, job_config=job_config)
+            resumed = 0
+            self.on_progress(f"{table_id}: started load job {job_id} for {state['rows']} rows")
+
+        started = time.perf_counter()
+        while not job.done():
+            time.sleep(2)
+            job.reload()
+            self.on_progress(f"{table_id}: load job {job.state}, {time.perf_counter() - started:.0f}s")
+        if job.error_result:
+            # A failed job id cannot be reused; the next run submits a fresh one
+            state.pop("job_id", None)
+            state["attempt"] = state.get("attempt", 0) + 1
+            self._write_checkpoint(checkpoint, state)
+            raise BulkLoadError(f"{table_id}: load job {job_id} failed: {job.error_result}. Run again to retry.")
+        return resumed
+
+    def _digest(self, spool: str) -> str:
+        digest = hashlib.sha1()
+        with open(spool, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()[:16]
+
+    # ------------------------------------------------------------------
+    # Spool and checkpoint files
+    # ------------------------------------------------------------------
+    def _paths(self, table_name: str) -> Tuple[str, str]:
+        base = os.path.join(self.state_dir, table_name)
+        return base + ".ndjson", base + ".checkpoint.json"
+
+    def _prepare(self, table_name: str, rows: Iterable[Dict[str, Any]]) -> dict:
+        """Spool the rows and write a fresh checkpoint"""
+        spool, checkpoint = self._paths(table_name)
+        total = self._spool(rows, spool)
+        state = {"rows": total, "method": "load_job" if total > self.load_job_rows else "stream", "done": []}
+        self._write_checkpoint(checkpoint, state)
+        return state
+
+    @staticmethod
+    def _spool(rows: Iterable[Dict[str, Any]], spool: str) -> int:
+        count = 0
+        partial = spool + ".partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(",", ":"), default=str) + "\n")
+                count += 1
+        os.replace(partial, spool)
+        return count
+
+    @staticmethod
+    def _read_checkpoint(checkpoint: str) -> Optional[dict]:
+        try:
+            with open(checkpoint, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write_checkpoint(checkpoint: str, state: dict):
+        partial = checkpoint + ".partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(partial, checkpoint)
@@ -1,116 +1,360 @@
 # ChatGPTAdapter.py
-import json
-from openai import OpenAI
+import os
+import time
+import httpx
+from openai import OpenAI, AsyncOpenAI
 from pydantic import ValidationError
 from CoreDatamodels import ParsedRequest  # We'll create this next
-from datetime import datetime
+from ResponseRenderer import render_response
+from typing import AsyncIterator, Optional, Union
 import logging
+from contextlib import nullcontext
+from AdmissionControl import ConcurrencyLimiter
+from ParseCache import ParseCache
+from Metrics import REGISTRY, current_intent
+from PromptBuilder import PromptBuilder, PromptTooLarge, record_usage
+from ResilientLLM import ResilientCaller, upstream_unavailable
+from ModelCascade import ModelCascade
+from JsonRepair import repair_parse_output, record_repairs
 
 # Initialize logger first
 logger = logging.getLogger(__name__)
 
+# Defaults; override with LLM_PARSE_MODEL / LLM_RESPONSE_MODEL
+PARSE_MODEL = "gpt-3.5-turbo"  # Use gpt-4 if available
+RESPONSE_MODEL = "gpt-3.5-turbo"
+PARSE_FUNCTION = "submit_parsed_request"
+# Error returned by parse_request when OpenAI is down or the circuit is open
+LLM_UNAVAILABLE = "Language service unavailable"
+
+LLM_PARSE_TOTAL = REGISTRY.counter(
+    "calendar_llm_parse_total", "LLM parse attempts by outcome and where the JSON came from", ("outcome", "source")
+)
+
+
+def _parse_tool() -> dict:
+    """Function-calling tool whose parameters are ParsedRequest's own JSON schema"""
+    schema = ParsedRequest.model_json_schema()
+    schema.pop("title", None)
+    return {
+        "type": "function",
+        "function": {
+            "name": PARSE_FUNCTION,
+            "description": "Submit the structured form of the user's calendar request",
+            "parameters": schema,
+        },
+    }
+
+
+PARSE_TOOL = _parse_tool()
+PARSE_TOOL_CHOICE = {"type": "function", "function": {"name": PARSE_FUNCTION}}
+
+
+def _parse_output(response) -> tuple:
+    """Raw JSON from the forced tool call, or from the message body if the model ignored it"""
+    message = response.choices[0].message
+    if message.tool_calls:
+        return message.tool_calls[0].function.arguments, "tool"
+    return message.content or "", "content"
+
+
+def _parse_failure(e: Exception) -> dict:
+    if upstream_unavailable(e):
+        LLM_PARSE_TOTAL.inc(outcome="unavailable", source="none")
+        logger.error(f"LLM unavailable: {str(e)}")
+        return {"error": LLM_UNAVAILABLE, "details": str(e)}
+    LLM_PARSE_TOTAL.inc(outcome="error", source="none")
+    logger.error(f"Unexpected error: {str(e)}")
+    return {"error": "Processing failed", "details": str(e)}
+
+
+def _parse_intent(result) -> str:
+    return result.intent if isinstance(result, ParsedRequest) else "unknown"
+
+
+def _validate_parse_output(raw_json: str, source: str = "tool") -> Union[ParsedRequest, dict]:
+    """Validate raw model output into a ParsedRequest or an error dict.
+
+    Output that fails as is goes through JsonRepair once before giving up,
+    which saves the user a retry (and us a second LLM call).
+    """
+    try:
+        # pydantic-core parses and validates in one pass, no json.loads
+        parsed = ParsedRequest.model_validate_json(raw_json)
+        LLM_PARSE_TOTAL.inc(outcome="ok", source=source)
+        return parsed
+
+    except (ValidationError, TypeError) as e:  # TypeError: aware vs naive datetime comparison
+        repaired = _repair_parse_output(raw_json, source)
+        if repaired is not None:
+            return repaired
+        errors = e.errors(include_url=False, include_context=False) if isinstance(e, ValidationError) else [
+            {"type": "value_error", "msg": str(e)}
+        ]
+        if any(error["type"] == "json_invalid" for error in errors):
+            LLM_PARSE_TOTAL.inc(outcome="invalid_json", source=source)
+            logger.error(f"JSON parsing failed: {errors[0]['msg']}")
+            return {"error": "Invalid response format", "details": errors[0]["msg"]}
+
+        LLM_PARSE_TOTAL.inc(outcome="validation_failed", source=source)
+        logger.error(f"Validation failed: {errors}")
+        return {"error": "Validation failed", "details": errors}
+
+
+def _repair_parse_output(raw_json: str, source: str) -> Optional[ParsedRequest]:
+    data, repairs = repair_parse_output(raw_json)
+    if data is None or not repairs:
+        return None
+    try:
+        parsed = ParsedRequest.model_validate(data)
+    except (ValidationError, TypeError):
+        return None
+    record_repairs(repairs)
+    LLM_PARSE_TOTAL.inc(outcome="repaired", source=source)
+    logger.info(f"Repaired LLM parse output: {', '.join(repairs)}")
+    return parsed
+
 
 class ChatGPTAdapter:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, http_client: Optional[httpx.Client] = None,
+                 parse_cache: Optional[ParseCache] = None, prompts: Optional[PromptBuilder] = None,
+                 resilience: Optional[ResilientCaller] = None, base_url: Optional[str] = None,
+                 parse_model: Optional[str] = None, response_model: Optional[str] = None,
+                 cascade: Optional[ModelCascade] = None, cascade_resilience: Optional[ResilientCaller] = None):
+        # Pass a shared http_client to reuse one connection pool across requests.
+        # Retries and timeouts are ResilientCaller's job, not the SDK's.
+        self.client = OpenAI(api_key=api_key, http_client=http_client, base_url=base_url, max_retries=0)
+        self.parse_cache = parse_cache
+        self.parse_model = parse_model or os.getenv("LLM_PARSE_MODEL", PARSE_MODEL)
+        self.response_model = response_model or os.getenv("LLM_RESPONSE_MODEL", RESPONSE_MODEL)
+        self.prompts = prompts or PromptBuilder(parse_tools=[PARSE_TOOL], model=self.parse_model)
+        self.resilience = resilience or ResilientCaller()
+        # Cheap model tried before parse_model (LLM_CASCADE_MODEL), or None
+        self.cascade = cascade if cascade is not None else ModelCascade.from_env(self.parse_model)
+        # The cheap model has its own breaker: its failures must not open the strong model's circuit
+        self.cascade_resilience = cascade_resilience or (ResilientCaller("openai_cascade") if self.cascade else None)
+
+    def close(self):
+        """Release the underlying HTTP connection pool"""
+        self.client.close()
     
     def parse_request(self, natural_language: str,user_id : str) -> dict:
         """Converts natural language to structured data"""
-        
-        
-        prompt = f"""
-                User ID: {user_id}
-                Current time: {datetime.now().isoformat()}
-                Convert this request to JSON:
-                {natural_language}
-
-                Important Rules:
-                - Use CURRENT YEAR ({datetime.now().year})
-                - For future dates without time: assume 9 AM
-                - Never suggest past dates
-                - Appointment IDs look like: APT-1234567890-WORKER123
-
-                Response Structure:
-                {{
-                "intent": "create_appointment|cancel_appointment|reschedule_appointment|get_availability",
-                "user_id": "USERXXX",
-                "worker_name": "Only for create/reschedule/get_availability",
-                "datetime": "ISO 8601 (required for create/reschedule)",
-                "duration": "Minutes (only for create/reschedule, default 30)",
-                "appointment_id": "Required for cancel/reschedule if mentioned"
-                }}
-
-                Examples:
-                1. Cancel by ID:
-                {{"intent": "cancel_appointment", "user_id": "USER048", "appointment_id": "APT-1740812400-WORKER123"}}
-
-                2. Cancel by details:
-                {{"intent": "cancel_appointment", "user_id": "USER048", "worker_name": "Tyler", "datetime": "2025-03-04T16:00:00"}}
-
-                3. Create new:
-                {{"intent": "create_appointment", "user_id": "USER046", "worker_name": "John", "datetime": "2025-03-22T15:00:00", "duration": 30}}
-
-                4. Reschedule:
-                {{"intent": "reschedule_appointment", "appointment_id": "APT-1740812400-WORKER123", "user_id": "USER046", "datetime": "2025-03-23T11:00:00"}}
-
-                Required Fields by Intent:
-                - create_appointment: user_id, worker_name, datetime
-                - cancel_appointment: user_id + (appointment_id OR worker_name+datetime)
-                - reschedule_appointment: user_id + (appointment_id OR worker_name) + datetime
-                - get_availability: user_id, worker_name
-
-                Respond ONLY with valid JSON. Never include comments or explanations.
-                """
-        
+        if self.parse_cache:
+            cached = self.parse_cache.get(natural_language, user_id)
+            if cached is not None:
+                return cached
+
+        result = self._parse_with_llm(natural_language, user_id)
+        if self.parse_cache:
+            self.parse_cache.put(natural_language, user_id, result)
+        return result
+
+    def _parse_with_llm(self, natural_language: str, user_id: str):
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",  # Use gpt-4 if available
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1
-            )
-            raw_json = response.choices[0].message.content
+            prompt = self.prompts.parse_prompt(natural_language, user_id)
+        except PromptTooLarge as e:
+            logger.warning(f"Parse prompt rejected: {str(e)}")
+            return {"error": "Request too long", "details": str(e)}
+
+        if self.cascade is not None:
+            started = time.monotonic()
+            result, usage = self._parse_with_model(self.cascade.model, prompt, self.cascade_resilience)
+            reason = self.cascade.escalation_reason(result, natural_language)
+            if reason is None:
+                self.cascade.accepted(time.monotonic() - started, usage)
+                return result
+            self.cascade.escalated(reason, time.monotonic() - started, usage)
+
+        started = time.monotonic()
+        result, _ = self._parse_with_model(self.parse_model, prompt)
+        if self.cascade is not None and isinstance(result, ParsedRequest):
+            self.cascade.observe_strong(time.monotonic() - started)
+        return result
+
+    def _parse_with_model(self, model: str, prompt,
+                          resilience: Optional[ResilientCaller] = None) -> tuple:
+        """(ParsedRequest or error dict, token usage or None)"""
+        try:
+            response = (resilience or self.resilience).call_sync("parse", lambda timeout: self.client.chat.completions.create(
+                model=model,
+                messages=prompt.messages,
+                tools=[PARSE_TOOL],
+                tool_choice=PARSE_TOOL_CHOICE,
+                max_tokens=prompt.max_tokens,
+                temperature=0.1,
+                timeout=timeout
+            ))
+            raw_json, source = _parse_output(response)
             print("ChatGPT Raw Output:", raw_json)
-            parsed_data = json.loads(raw_json)
-            validated = ParsedRequest(**parsed_data)
-            return validated
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing failed: {str(e)}")
-            return {"error": "Invalid response format", "details": str(e)}
-            
-        except ValidationError as e:
-            logger.error(f"Validation failed: {e.errors()}")
-            return {"error": "Validation failed", "details": e.errors()}
-            
+            result = _validate_parse_output(raw_json, source)
+            record_usage("parse", response.usage, _parse_intent(result))
+            return result, response.usage
+
         except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            return {"error": "Processing failed", "details": str(e)}
+            return _parse_failure(e), None
     
     
     def generate_response(self, structured_data: dict) -> str:
-        """Convert structured data into natural language response"""
+        """Convert structured data into natural language response.
+
+        This is the optional LLM "polish" path; ResponseRenderer.render_response
+        produces the default, template-based message locally.
+        """
         try:
-            prompt = f"""
-                Convert this appointment data into a friendly user message:
-                {json.dumps(structured_data, indent=2)}
-
-                Rules:
-                - Use simple, conversational language
-                - Highlight key details: worker name, date/time, status
-                - For conflicts, suggest alternatives clearly
-                - Never expose internal IDs or technical terms
-                
-            """
+            prompt = self.prompts.response_prompt(structured_data)
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
-            )
+            response = self.resilience.call_sync("response", lambda timeout: self.client.chat.completions.create(
+                model=self.response_model,
+                messages=prompt.messages,
+                max_tokens=prompt.max_tokens,
+                temperature=0.3,
+                timeout=timeout
+            ))
+            record_usage("response", response.usage, current_intent())
             
             return response.choices[0].message.content.strip()
             
         except Exception as e:
             logger.error(f"Response generation failed: {str(e)}")
-            return "Your appointment has been processed. Check details below."
-            
\ No newline at end of file
+            return render_response(structured_data)
+
+
+class AsyncChatGPTAdapter:
+    """Non-blocking counterpart of ChatGPTAdapter built on AsyncOpenAI (LLM_BACKEND=openai)"""
+
+    def __init__(self, api_key: str, http_client: Optional[httpx.AsyncClient] = None,
+                 limiter: Optional[ConcurrencyLimiter] = None, parse_cache: Optional[ParseCache] = None,
+                 prompts: Optional[PromptBuilder] = None, resilience: Optional[ResilientCaller] = None,
+                 base_url: Optional[str] = None, parse_model: Optional[str] = None,
+                 response_model: Optional[str] = None, cascade: Optional[ModelCascade] = None,
+                 cascade_resilience: Optional[ResilientCaller] = None):
+        self.client = AsyncOpenAI(api_key=api_key, http_client=http_client, base_url=base_url, max_retries=0)
+        self.parse_cache = parse_cache
+        self.parse_model = parse_model or os.getenv("LLM_PARSE_MODEL", PARSE_MODEL)
+        self.response_model = response_model or os.getenv("LLM_RESPONSE_MODEL", RESPONSE_MODEL)
+        self.prompts = prompts or PromptBuilder(parse_tools=[PARSE_TOOL], model=self.parse_model)
+        # Deadlines, retries, hedging and the circuit breaker for OpenAI
+        self.resilience = resilience or ResilientCaller()
+        # Cheap model tried before parse_model (LLM_CASCADE_MODEL), or None
+        self.cascade = cascade if cascade is not None else ModelCascade.from_env(self.parse_model)
+        # The cheap model has its own breaker: its failures must not open the strong model's circuit
+        self.cascade_resilience = cascade_resilience or (ResilientCaller("openai_cascade") if self.cascade else None)
+        # Admission control in front of OpenAI; parse_request raises
+        # AdmissionRejected when overloaded, replies fall back to templates
+        self.limiter = limiter
+
+    def _admit(self):
+        return self.limiter.acquire() if self.limiter else nullcontext()
+
+    async def warm_up(self):
+        """Open a connection to OpenAI before the first request"""
+        await self.client.models.list()
+
+    async def close(self):
+        """Release the underlying HTTP connection pool"""
+        await self.client.close()
+
+    async def parse_request(self, natural_language: str, user_id: str) -> Union[ParsedRequest, dict]:
+        """Converts natural language to structured data"""
+        if self.parse_cache:
+            cached = self.parse_cache.get(natural_language, user_id)
+            if cached is not None:
+                return cached
+
+        result = await self._parse_with_llm(natural_language, user_id)
+        if self.parse_cache:
+            self.parse_cache.put(natural_language, user_id, result)
+        return result
+
+    async def _parse_with_llm(self, natural_language: str, user_id: str) -> Union[ParsedRequest, dict]:
+        try:
+            prompt = self.prompts.parse_prompt(natural_language, user_id)
+        except PromptTooLarge as e:
+            logger.warning(f"Parse prompt rejected: {str(e)}")
+            return {"error": "Request too long", "details": str(e)}
+
+        async with self._admit():
+            if self.cascade is not None:
+                started = time.monotonic()
+                result, usage = await self._parse_with_model(self.cascade.model, prompt, self.cascade_resilience)
+                reason = self.cascade.escalation_reason(result, natural_language)
+                if reason is None:
+                    self.cascade.accepted(time.monotonic() - started, usage)
+                    return result
+                self.cascade.escalated(reason, time.monotonic() - started, usage)
+
+            started = time.monotonic()
+            result, _ = await self._parse_with_model(self.parse_model, prompt)
+            if self.cascade is not None and isinstance(result, ParsedRequest):
+                self.cascade.observe_strong(time.monotonic() - started)
+            return result
+
+    async def _parse_with_model(self, model: str, prompt,
+                                resilience: Optional[ResilientCaller] = None) -> tuple:
+        """(ParsedRequest or error dict, token usage or None)"""
+        try:
+            response = await (resilience or self.resilience).call("parse", lambda timeout: self.client.chat.completions.create(
+                model=model,
+                messages=prompt.messages,
+                tools=[PARSE_TOOL],
+                tool_choice=PARSE_TOOL_CHOICE,
+                max_tokens=prompt.max_tokens,
+                temperature=0.1,
+                timeout=timeout
+            ))
+            raw_json, source = _parse_output(response)
+            logger.debug(f"ChatGPT Raw Output: {raw_json}")
+            result = _validate_parse_output(raw_json, source)
+            record_usage("parse", response.usage, _parse_intent(result))
+            return result, response.usage
+
+        except Exception as e:
+            return _parse_failure(e), None
+
+    async def generate_response(self, structured_data: dict) -> str:
+        """Convert structured data into natural language response"""
+        try:
+            prompt = self.prompts.response_prompt(structured_data)
+            async with self._admit():
+                response = await self.resilience.call("response", lambda timeout: self.client.chat.completions.create(
+                    model=self.response_model,
+                    messages=prompt.messages,
+                    max_tokens=prompt.max_tokens,
+                    temperature=0.3,
+                    timeout=timeout
+                ))
+            record_usage("response", response.usage, current_intent())
+            return response.choices[0].message.content.strip()
+
+        except Exception as e:
+            logger.error(f"Response generation failed: {str(e)}")
+            return render_response(structured_data)
+
+    async def stream_response(self, structured_data: dict) -> AsyncIterator[str]:
+        """Stream the natural language response token by token"""
+        emitted = False
+        try:
+            prompt = self.prompts.response_prompt(structured_data)
+            async with self._admit():
+                # Deadline and retries cover opening the stream, not reading it
+                stream = await self.resilience.call("stream", lambda timeout: self.client.chat.completions.create(
+                    model=self.response_model,
+                    messages=prompt.messages,
+                    max_tokens=prompt.max_tokens,
+                    temperature=0.3,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=timeout
+                ), hedge=False)
+                async for chunk in stream:
+                    if chunk.usage:  # final chunk, no choices
+                        record_usage("response", chunk.usage, current_intent())
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        emitted = True
+                        yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            logger.error(f"Response streaming failed: {str(e)}")
+            if not emitted:
+                yield render_response(structured_data)
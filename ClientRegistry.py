@@ -0,0 +1,350 @@
+# ClientRegistry.py
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from requests.adapters import HTTPAdapter
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2 import service_account
+
+from ChatGPTIntegration import ChatGPTAdapter, AsyncChatGPTAdapter
+from BigQueryIntergration import BigQueryClient
+from AppointmentManagementLogic import AppointmentManager, AsyncAppointmentManager
+from WorkerDirectory import WorkerDirectory
+from AdmissionControl import ConcurrencyLimiter, limiter_from_env
+from ParseCache import ParseCache
+from FastPathParser import FastPathParser
+from SpeculativeLookup import WorkerNameIndex
+from ResilientLLM import ResilientCaller
+from LLMBackends import LLMBackend, StubLLMBackend, backend_name
+from TrafficRecorder import TrafficRecorder, RecordingLLMBackend, RecordingBigQueryClient
+
+logger = logging.getLogger(__name__)
+
+BIGQUERY_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+class ClientRegistry:
+    """Process-wide owner of the OpenAI and BigQuery clients.
+
+    Clients are built once (on application startup or first use) and shared by
+    every request, so credential loading, TLS handshakes and token refresh are
+    paid once per process instead of once per request.
+    """
+
+    def __init__(
+        self,
+        openai_key: Optional[str] = None,
+        credentials_path: str = 'service-account.json',
+        openai_max_connections: Optional[int] = None,
+        openai_keepalive_connections: Optional[int] = None,
+        bq_pool_size: Optional[int] = None,
+        refresh_margin: Optional[int] = None,  # seconds
+        bq_read_workers: Optional[int] = None,
+        bq_write_workers: Optional[int] = None,
+    ):
+        # Unset values are read from the environment when the clients are built,
+        # so a .env loaded after import is still honoured
+        self.openai_key = openai_key
+        self.credentials_path = credentials_path
+        self.openai_max_connections = openai_max_connections
+        self.openai_keepalive_connections = openai_keepalive_connections
+        self.bq_pool_size = bq_pool_size
+        self.refresh_margin = refresh_margin
+        self.bq_read_workers = bq_read_workers
+        self.bq_write_workers = bq_write_workers
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+        self._bq_session: Optional[AuthorizedSession] = None
+        self._credentials = None
+        self._gpt_adapter: Optional[ChatGPTAdapter] = None
+        self._llm_backend: Optional[LLMBackend] = None
+        self._bq_client: Optional[BigQueryClient] = None
+        self._manager: Optional[AppointmentManager] = None
+        self._async_manager: Optional[AsyncAppointmentManager] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        self._limiters: dict = {}
+        self._llm_resilience: Optional[ResilientCaller] = None
+        self._llm_cascade_resilience: Optional[ResilientCaller] = None
+        self._recorder: Optional[TrafficRecorder] = None
+        self._recorder_loaded = False
+        # Shared by the sync and async adapters
+        self.parse_cache = ParseCache()
+        self.fast_path = FastPathParser()
+        self.worker_names = WorkerNameIndex()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        """Eagerly build all clients and start the credential refresher"""
+        if backend_name() == "openai":
+            self.gpt_adapter
+        self.llm_backend
+        self.async_appointment_manager
+        if self._refresher is None:
+            self._stop.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="credentials-refresher", daemon=True
+            )
+            self._refresher.start()
+        logger.info("Client registry started")
+
+    async def warm_up(self):
+        """Get this process ready to serve before it accepts traffic.
+
+        Builds every client, fetches an access token, opens connections to
+        BigQuery and OpenAI and loads the worker directory, so the first real
+        request pays none of that.
+        BigQuery failures are raised; an unreachable OpenAI only logs.
+        """
+        await asyncio.to_thread(self.start)
+        await asyncio.to_thread(self.refresh_credentials, True)
+        await asyncio.to_thread(lambda: self.bq_client.query("SELECT 1").result())
+        await asyncio.to_thread(self.appointment_manager.directory.ready)
+        try:
+            await self.llm_backend.warm_up()
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {str(e)}")
+        logger.info("Client registry warmed up")
+
+    async def aclose(self):
+        """Close the async clients, then everything else (see close)"""
+        backend = self._llm_backend
+        self._llm_backend = None
+        if backend is not None:
+            await backend.close()
+        self._async_http_client = None
+        self.close()
+
+    def close(self):
+        """Stop the refresher and release all connection pools"""
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=5)
+            self._refresher = None
+
+        with self._lock:
+            if self._gpt_adapter is not None:
+                self._gpt_adapter.close()
+            for executor in (self._read_executor, self._write_executor):
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            if self._bq_client is not None:
+                self._bq_client.close()
+            self._gpt_adapter = None
+            self._bq_client = None
+            self._manager = None
+            self._async_manager = None
+            self._read_executor = None
+            self._write_executor = None
+            self._http_client = None
+            self._bq_session = None
+            self._credentials = None
+            if self._recorder is not None:
+                self._recorder.close()
+            self._recorder = None
+            self._recorder_loaded = False
+        logger.info("Client registry closed")
+
+    # ------------------------------------------------------------------
+    # Shared clients
+    # ------------------------------------------------------------------
+    @property
+    def gpt_adapter(self) -> ChatGPTAdapter:
+        if self._gpt_adapter is None:
+            with self._lock:
+                if self._gpt_adapter is None:
+                    api_key = self.openai_key or os.getenv("OPENAI_API_KEY")
+                    if not api_key:
+                        raise RuntimeError("OpenAI API key not configured")
+                    self._http_client = httpx.Client(
+                        limits=self._openai_limits(), timeout=httpx.Timeout(60.0, connect=5.0)
+                    )
+                    self._gpt_adapter = ChatGPTAdapter(
+                        api_key, http_client=self._http_client, parse_cache=self.parse_cache,
+                        resilience=self.llm_resilience, cascade_resilience=self.llm_cascade_resilience,
+                        base_url=os.getenv("OPENAI_BASE_URL")
+                    )
+        return self._gpt_adapter
+
+    @property
+    def llm_backend(self) -> LLMBackend:
+        """Async LLM backend selected by LLM_BACKEND (openai, or the offline stub)"""
+        if self._llm_backend is None:
+            with self._lock:
+                if self._llm_backend is None:
+                    backend = self._build_llm_backend()
+                    if self.recorder is not None:
+                        backend = RecordingLLMBackend(backend, self.recorder)
+                    self._llm_backend = backend
+        return self._llm_backend
+
+    def llm_configured(self) -> bool:
+        return backend_name() != "openai" or bool(self.openai_key or os.getenv("OPENAI_API_KEY"))
+
+    def _build_llm_backend(self) -> LLMBackend:
+        if backend_name() == "stub":
+            logger.info("Using the offline stub LLM backend")
+            return StubLLMBackend.from_env(limiter=self.limiter("llm"), parse_cache=self.parse_cache)
+
+        api_key = self.openai_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OpenAI API key not configured")
+        self._async_http_client = httpx.AsyncClient(
+            limits=self._openai_limits(), timeout=httpx.Timeout(60.0, connect=5.0)
+        )
+        return AsyncChatGPTAdapter(
+            api_key, http_client=self._async_http_client, limiter=self.limiter("llm"),
+            parse_cache=self.parse_cache, resilience=self.llm_resilience,
+            cascade_resilience=self.llm_cascade_resilience, base_url=os.getenv("OPENAI_BASE_URL")
+        )
+
+    @property
+    def llm_resilience(self) -> ResilientCaller:
+        """Retry/hedging policy and circuit breaker shared by both OpenAI adapters"""
+        if self._llm_resilience is None:
+            self._llm_resilience = ResilientCaller("openai")
+        return self._llm_resilience
+
+    @property
+    def llm_cascade_resilience(self) -> ResilientCaller:
+        """Policy and circuit breaker for the cascade's cheap model, kept apart from the strong model's"""
+        if self._llm_cascade_resilience is None:
+            self._llm_cascade_resilience = ResilientCaller("openai_cascade")
+        return self._llm_cascade_resilience
+
+    @property
+    def bq_client(self) -> BigQueryClient:
+        if self._bq_client is None:
+            with self._lock:
+                if self._bq_client is None:
+                    self._credentials = service_account.Credentials.from_service_account_file(
+                        self.credentials_path, scopes=BIGQUERY_SCOPES
+                    )
+                    session = AuthorizedSession(self._credentials)
+                    pool_size = self._setting(self.bq_pool_size, "BQ_POOL_SIZE", 50)
+                    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                    session.mount("https://", adapter)
+                    self._bq_session = session
+                    self._bq_client = BigQueryClient(
+                        credentials=self._credentials, http=session
+                    )
+                    if self.recorder is not None:
+                        self._bq_client = RecordingBigQueryClient(self._bq_client, self.recorder)
+        return self._bq_client
+
+    @property
+    def recorder(self) -> Optional[TrafficRecorder]:
+        """Traffic recorder when RECORD_TRAFFIC is set (see TrafficRecorder), else None"""
+        if not self._recorder_loaded:
+            self._recorder = TrafficRecorder.from_env()
+            self._recorder_loaded = True
+        return self._recorder
+
+    @property
+    def appointment_manager(self) -> AppointmentManager:
+        if self._manager is None:
+            bq_client = self.bq_client
+            with self._lock:
+                if self._manager is None:
+                    self._manager = AppointmentManager(bq_client, directory=WorkerDirectory(bq_client))
+        return self._manager
+
+    @property
+    def async_appointment_manager(self) -> AsyncAppointmentManager:
+        """AppointmentManager facade whose BigQuery calls run on bounded executors"""
+        if self._async_manager is None:
+            manager = self.appointment_manager
+            with self._lock:
+                if self._async_manager is None:
+                    self._read_executor = ThreadPoolExecutor(
+                        max_workers=self._setting(self.bq_read_workers, "BQ_READ_WORKERS", 32),
+                        thread_name_prefix="bigquery-read",
+                    )
+                    self._write_executor = ThreadPoolExecutor(
+                        max_workers=self._setting(self.bq_write_workers, "BQ_WRITE_WORKERS", 8),
+                        thread_name_prefix="bigquery-write",
+                    )
+                    self._async_manager = AsyncAppointmentManager(
+                        manager, self._read_executor, self._write_executor,
+                        read_limiter=self.limiter("bigquery_read"),
+                        write_limiter=self.limiter("bigquery_write"),
+                    )
+        return self._async_manager
+
+    def limiter(self, name: str) -> ConcurrencyLimiter:
+        """Admission limiter for one upstream: "llm", "bigquery_read" or "bigquery_write".
+
+        Limits default to what OpenAI rate limits and BigQuery's concurrent
+        DML quota tolerate, and can be tuned with <NAME>_MAX_CONCURRENCY,
+        <NAME>_MAX_QUEUE and <NAME>_QUEUE_TIMEOUT.
+        """
+        if name not in self._limiters:
+            defaults = {
+                "llm": (32, 128, 5.0),
+                "bigquery_read": (self._setting(self.bq_read_workers, "BQ_READ_WORKERS", 32), 128, 2.0),
+                "bigquery_write": (self._setting(self.bq_write_workers, "BQ_WRITE_WORKERS", 8), 64, 5.0),
+            }
+            max_concurrent, max_queue, queue_timeout = defaults[name]
+            self._limiters[name] = limiter_from_env(
+                name, name.upper(), max_concurrent, max_queue, queue_timeout
+            )
+        return self._limiters[name]
+
+    # ------------------------------------------------------------------
+    # Credential refresh
+    # ------------------------------------------------------------------
+    def refresh_credentials(self, force: bool = False):
+        """Refresh the service-account token if it is close to expiry"""
+        credentials = self._credentials
+        if credentials is None:
+            return
+        expiry = credentials.expiry  # naive UTC
+        margin = timedelta(seconds=self._refresh_margin())
+        if force or expiry is None or expiry - datetime.utcnow() < margin:
+            credentials.refresh(Request())
+            logger.info(f"BigQuery credentials refreshed, valid until {credentials.expiry}")
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_credentials()
+            except Exception as e:
+                logger.error(f"Credential refresh failed: {str(e)}")
+            self._stop.wait(min(60, max(self._refresh_margin() // 2, 1)))
+
+    def _openai_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self._setting(self.openai_max_connections, "OPENAI_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=self._setting(
+                self.openai_keepalive_connections, "OPENAI_KEEPALIVE_CONNECTIONS", 20
+            ),
+        )
+
+    def _refresh_margin(self) -> int:
+        return self._setting(self.refresh_margin, "CREDENTIALS_REFRESH_MARGIN", 300)
+
+    @staticmethod
+    def _setting(value: Optional[int], env_var: str, default: int) -> int:
+        if value is not None:
+            return value
+        return int(os.getenv(env_var, default))
+
+
+# Process-wide registry shared by every FastAPI app in this process
+registry = ClientRegistry()
+
+
+def get_registry() -> ClientRegistry:
+    return registry
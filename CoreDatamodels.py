@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Optional
 import random
 from datetime import datetime
+from datetime import datetime as DateTime  # alias: ParsedRequest.datetime shadows the type
 
 
 
@@ -63,13 +64,18 @@ class Appointment(BaseModel):
         return v
 
 
+INTENTS = ("create_appointment", "cancel_appointment", "reschedule_appointment", "get_availability")
+
+
 class ParsedRequest(BaseModel):
-    intent: str = Field(pattern="^(create|cancel|reschedule)_appointment$|^get_availability$")
+    # Descriptions and the intent enum end up in the LLM tool schema (model_json_schema)
+    intent: str = Field(pattern="^(create|cancel|reschedule)_appointment$|^get_availability$",
+                        json_schema_extra={"enum": list(INTENTS)})
     user_id: str = Field(..., pattern=r"^USER\d{3}$")
-    worker_name: Optional[str] = None
-    datetime: Optional[datetime] = None
-    duration: Optional[int] = Field(None, ge=15, le=240)
-    appointment_id: Optional[str] = None
+    worker_name: Optional[str] = Field(None, description="Worker's name, for create/reschedule/get_availability")
+    datetime: Optional[DateTime] = Field(None, description="ISO 8601 local time, required for create/reschedule")
+    duration: Optional[int] = Field(None, ge=15, le=240, description="Minutes, for create/reschedule (default 30)")
+    appointment_id: Optional[str] = Field(None, description="Like APT-1234567890-WORKER123, if mentioned")
 
     class Config:
         extra = "ignore"  # Ignore unexpected fields
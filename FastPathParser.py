@@ -0,0 +1,318 @@
+# FastPathParser.py
+import os
+import re
+import time as clock
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable, Optional
+
+import pytz
+from cachetools import TTLCache
+from pydantic import ValidationError
+
+from CoreDatamodels import ParsedRequest
+from Metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+FAST_PATH_TOTAL = REGISTRY.counter(
+    "calendar_fast_path_total", "Requests seen by the rule-based parser", ("result", "intent")
+)
+FAST_PATH_SAVED = REGISTRY.counter(
+    "calendar_fast_path_saved_seconds_total",
+    "Estimated LLM parse latency avoided by fast-path hits (running mean of LLM parse latency per hit)"
+)
+FAST_PATH_LATENCY = REGISTRY.histogram(
+    "calendar_fast_path_duration_seconds", "Latency of the rule-based parser",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tue": 1, "tues": 1, "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thur": 3, "thurs": 3, "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5, "sunday": 6, "sun": 6,
+}
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4, "apr": 4,
+    "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7, "august": 8, "aug": 8,
+    "september": 9, "sep": 9, "sept": 9, "october": 10, "oct": 10, "november": 11, "nov": 11,
+    "december": 12, "dec": 12,
+}
+
+_WEEKDAY = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_ORDINAL = r"(?:st|nd|rd|th)?"
+
+# Relative or absolute day, e.g. "tomorrow", "next tuesday", "march 22", "22nd of march", "2025-03-22", "3/22"
+_DATE = (
+    rf"(?:today|tomorrow|day after tomorrow"
+    rf"|(?:(?:next|this)\s+)?(?:{_WEEKDAY})"
+    rf"|(?:{_MONTH})\s+\d{{1,2}}{_ORDINAL}(?:,?\s+\d{{4}})?"
+    rf"|\d{{1,2}}{_ORDINAL}\s+(?:of\s+)?(?:{_MONTH})(?:,?\s+\d{{4}})?"
+    rf"|\d{{4}}-\d{{2}}-\d{{2}}"
+    rf"|\d{{1,2}}/\d{{1,2}}(?:/\d{{2,4}})?)"
+)
+# Clock time with am/pm or 24h minutes; a bare "at 9" is ambiguous and left to the LLM
+_TIME = r"(?:noon|midday|\d{1,2}(?::\d{2})?\s*(?:am|pm|a\.m\.?|p\.m\.?)|\d{1,2}:\d{2})"
+_DURATION = r"(?:\d{1,3}\s*(?:minutes|minute|mins|min)|an?\s+hour|half\s+an\s+hour|\d\s*hours?)"
+
+# Words that can never be (part of) a worker name
+_NOT_NAME = rf"(?:me|my|an?|the|appointment|meeting|session|with|on|for|at|to|next|this|today|tomorrow|{_WEEKDAY}|{_MONTH})\b"
+_WORD = r"[a-z][a-z\-]*(?:'(?!s\b)[a-z]+)?"  # allows O'Brien, not a possessive 's
+_NAME = rf"(?!{_NOT_NAME}){_WORD}(?:\s+(?!{_NOT_NAME}){_WORD})?"
+_ID = r"apt-\d+-worker\d+"
+
+
+def _when(suffix: str) -> str:
+    """Date and time in either order, with numbered groups"""
+    return (
+        rf"(?:(?:on\s+)?(?P<date{suffix}a>{_DATE})\s+(?:at\s+)?(?P<time{suffix}a>{_TIME})"
+        rf"|(?:at\s+)?(?P<time{suffix}b>{_TIME})\s+(?:on\s+)?(?P<date{suffix}b>{_DATE}))"
+    )
+
+
+_PREFIX = r"(?:please\s+)?(?:(?:can|could|would)\s+you\s+)?"
+_FOR_DURATION = rf"(?:\s+for\s+(?P<duration>{_DURATION}))?"
+
+_SOURCES = {
+    "cancel_appointment":
+        rf"{_PREFIX}(?:cancel|delete|remove)\s+(?:my\s+)?(?:appointment\s+)?(?:id\s+)?(?P<appointment_id>{_ID})",
+    "reschedule_appointment":
+        rf"{_PREFIX}(?:reschedule|move|change)\s+(?:my\s+)?(?:appointment\s+)?(?:id\s+)?"
+        rf"(?P<appointment_id>{_ID})\s+to\s+{_when('')}{_FOR_DURATION}",
+    "create_appointment":
+        rf"{_PREFIX}(?:book|schedule|make|create|set\s+up)\s+(?:me\s+)?(?:(?:an?|my)\s+)?"
+        rf"(?:(?:appointment|meeting|session)\s+)?(?:with\s+)?(?P<worker_name>{_NAME})\s+"
+        rf"(?:(?:on|for)\s+)?{_when('')}{_FOR_DURATION}",
+    "get_availability":
+        rf"(?:(?:when\s+is|is)\s+(?P<worker_name>{_NAME})\s+(?:free|available)"
+        rf"|(?:show|check|what\s+is|what's)\s+(?P<worker_name2>{_NAME})(?:'s)?\s+availability)"
+        rf"(?:\s+(?:on\s+|for\s+)?(?P<date>{_DATE}))?",
+}
+# The whole text must be one known phrasing
+PATTERNS = {intent: re.compile(rf"^{source}$") for intent, source in _SOURCES.items()}
+# Degraded mode (LLM unavailable): a known phrasing anywhere in the text, but never a cancel or
+# reschedule: "do not cancel APT-..." must not be acted on without the LLM to read it
+LENIENT_PATTERNS = {intent: re.compile(rf"(?<!\w){source}(?!\w)") for intent, source in _SOURCES.items()
+                    if intent in ("create_appointment", "get_availability")}
+_APPOINTMENT_ID = re.compile(rf"(?<!\w){_ID}(?!\w)")
+
+
+@dataclass
+class FastPathMatch:
+    """Fields pulled out of the text; dates are still unresolved phrases"""
+    intent: str
+    worker_name: Optional[str] = None
+    appointment_id: Optional[str] = None
+    date_text: Optional[str] = None
+    time_text: Optional[str] = None
+    duration_text: Optional[str] = None
+
+    @property
+    def worker_id(self) -> Optional[str]:
+        """Worker id embedded in an appointment id (APT-<ts>-WORKERnnn)"""
+        if self.appointment_id:
+            return self.appointment_id.rsplit("-", 1)[-1]
+        return None
+
+    @property
+    def needs_timezone(self) -> bool:
+        return self.date_text is not None
+
+
+class FastPathParser:
+    """Deterministic parser for formulaic requests.
+
+    `match` recognises a fixed set of phrasings (cancel/reschedule by
+    appointment id, "book <worker> <date> at <time> for <n> minutes",
+    availability questions) and `build` resolves relative dates in the
+    worker's timezone. Anything that does not match completely, or does not
+    validate as a ParsedRequest, returns None and goes to the LLM.
+    """
+
+    def __init__(self, timezone_ttl: Optional[float] = None):
+        self._llm_parse_seconds = 1.0  # running mean, used for the savings estimate
+        # Worker timezones change rarely; avoid a lookup per request
+        self._timezones = TTLCache(maxsize=1024, ttl=timezone_ttl or float(os.getenv("FAST_PATH_TZ_TTL", "600")))
+
+    async def parse(self, natural_language: str, user_id: str,
+                    timezone_lookup: Callable[..., Awaitable[Optional[str]]],
+                    lenient: bool = False) -> Optional[ParsedRequest]:
+        """Match, resolve and record; `timezone_lookup(worker_name=, worker_id=)` finds the worker's zone"""
+        started = clock.perf_counter()
+        match = self.match(natural_language, lenient)
+        parsed = None
+        if match is not None:
+            timezone = "UTC"
+            if match.needs_timezone:
+                # Unknown worker (or a word mistaken for one): dates cannot be resolved, leave it to the LLM
+                timezone = await self._timezone(match, timezone_lookup)
+            if timezone:
+                parsed = self.build(match, user_id, timezone)
+        # fallthrough: a phrasing we know, but the values did not resolve or validate
+        result = "hit" if parsed is not None else "fallthrough" if match is not None else "miss"
+        if lenient:
+            result = f"degraded_{result}"
+        self.record(result, match.intent if match else "unknown", clock.perf_counter() - started)
+        return parsed
+
+    async def _timezone(self, match: FastPathMatch, timezone_lookup) -> Optional[str]:
+        key = match.worker_id or (match.worker_name or "").lower()
+        if key in self._timezones:
+            return self._timezones[key]
+        timezone = await timezone_lookup(worker_name=match.worker_name, worker_id=match.worker_id)
+        if timezone:
+            self._timezones[key] = timezone
+        return timezone
+
+    def match(self, natural_language: str, lenient: bool = False) -> Optional[FastPathMatch]:
+        text = re.sub(r"\s+", " ", natural_language.strip().lower()).rstrip(" .!?")
+        if lenient and _APPOINTMENT_ID.search(text):
+            # The text is (also) about an existing appointment: acting on part of it is a guess
+            return None
+        for intent, pattern in (LENIENT_PATTERNS if lenient else PATTERNS).items():
+            m = pattern.search(text)
+            if not m:
+                continue
+            groups = {k: v for k, v in m.groupdict().items() if v}
+            worker_name = groups.get("worker_name") or groups.get("worker_name2")
+            return FastPathMatch(
+                intent=intent,
+                worker_name=worker_name.title() if worker_name else None,
+                appointment_id=groups["appointment_id"].upper() if "appointment_id" in groups else None,
+                date_text=groups.get("date") or groups.get("datea") or groups.get("dateb"),
+                time_text=groups.get("timea") or groups.get("timeb"),
+                duration_text=groups.get("duration"),
+            )
+        return None
+
+    def build(self, match: FastPathMatch, user_id: str, timezone: str = "UTC",
+              now: Optional[datetime] = None) -> Optional[ParsedRequest]:
+        """Resolve dates in `timezone` and validate; None when not confident"""
+        try:
+            local_now = (now or datetime.now(pytz.utc)).astimezone(pytz.timezone(timezone))
+            fields = {"intent": match.intent, "user_id": user_id}
+            if match.worker_name:
+                fields["worker_name"] = match.worker_name
+            if match.appointment_id:
+                fields["appointment_id"] = match.appointment_id
+
+            if match.date_text:
+                day = _resolve_date(match.date_text, local_now.date())
+                if day is None:
+                    return None
+                if match.time_text:
+                    when = datetime.combine(day, _resolve_time(match.time_text))
+                    if tz_localize(when, timezone) <= local_now:
+                        return None  # never book in the past
+                else:
+                    # Day-only (availability): end of that day keeps it in the future
+                    when = datetime.combine(day, time(23, 59))
+                fields["datetime"] = when
+
+            if match.duration_text:
+                fields["duration"] = _resolve_duration(match.duration_text)
+
+            return ParsedRequest(**fields)
+        except (ValidationError, ValueError) as e:
+            logger.debug(f"Fast path could not build request: {str(e)}")
+            return None
+
+    def record(self, result: str, intent: str, seconds: float):
+        """Count an attempt (hit, fallthrough or miss); hits add the LLM latency they avoided"""
+        FAST_PATH_LATENCY.observe(seconds)
+        FAST_PATH_TOTAL.inc(result=result, intent=intent)
+        if result in ("hit", "degraded_hit"):
+            FAST_PATH_SAVED.inc(max(self._llm_parse_seconds - seconds, 0.0))
+
+    def observe_llm_parse(self, seconds: float):
+        """Feed the running mean of LLM parse latency used by `record`"""
+        self._llm_parse_seconds = 0.95 * self._llm_parse_seconds + 0.05 * seconds
+
+
+_DATE_SEARCH = re.compile(rf"\b{_DATE}\b")
+
+
+def find_date(natural_language: str, today: date) -> Optional[date]:
+    """First date phrase anywhere in free text, resolved against `today`"""
+    found = _DATE_SEARCH.search(re.sub(r"\s+", " ", natural_language.lower()))
+    if not found:
+        return None
+    try:
+        return _resolve_date(found.group(0), today)
+    except ValueError:
+        return None
+
+
+def tz_localize(naive: datetime, timezone: str) -> datetime:
+    return pytz.timezone(timezone).localize(naive)
+
+
+def _resolve_date(text: str, today: date) -> Optional[date]:
+    text = text.strip()
+    if text == "today":
+        return today
+    if text == "tomorrow":
+        return today + timedelta(days=1)
+    if text == "day after tomorrow":
+        return today + timedelta(days=2)
+
+    m = re.fullmatch(rf"(?:(?:next|this)\s+)?({_WEEKDAY})", text)
+    if m:
+        # The upcoming occurrence, never today ("next tuesday" == "tuesday")
+        ahead = (WEEKDAYS[m.group(1)] - today.weekday()) % 7 or 7
+        return today + timedelta(days=ahead)
+
+    m = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", text)
+    if m:
+        return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+
+    m = re.fullmatch(r"(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?", text)
+    if m:
+        return _with_year(int(m.group(1)), int(m.group(2)), m.group(3), today)
+
+    m = re.fullmatch(rf"({_MONTH})\s+(\d{{1,2}}){_ORDINAL}(?:,?\s+(\d{{4}}))?", text)
+    if m:
+        return _with_year(MONTHS[m.group(1)], int(m.group(2)), m.group(3), today)
+
+    m = re.fullmatch(rf"(\d{{1,2}}){_ORDINAL}\s+(?:of\s+)?({_MONTH})(?:,?\s+(\d{{4}}))?", text)
+    if m:
+        return _with_year(MONTHS[m.group(2)], int(m.group(1)), m.group(3), today)
+    return None
+
+
+def _with_year(month: int, day: int, year: Optional[str], today: date) -> date:
+    if year:
+        year = int(year) + (2000 if len(year) == 2 else 0)
+        return date(year, month, day)
+    candidate = date(today.year, month, day)
+    # No year given: the next occurrence of that day
+    return candidate if candidate >= today else date(today.year + 1, month, day)
+
+
+def _resolve_time(text: str) -> time:
+    text = text.replace(".", "").replace(" ", "")
+    if text in ("noon", "midday"):
+        return time(12, 0)
+    m = re.fullmatch(r"(\d{1,2})(?::(\d{2}))?(am|pm)?", text)
+    if not m:
+        raise ValueError(f"Unrecognised time: {text}")
+    hour, minute, meridiem = int(m.group(1)), int(m.group(2) or 0), m.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError(f"Invalid 12-hour time: {text}")
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    return time(hour, minute)
+
+
+def _resolve_duration(text: str) -> int:
+    text = text.strip()
+    if text == "half an hour":
+        return 30
+    if re.fullmatch(r"an?\s+hour", text):
+        return 60
+    m = re.fullmatch(r"(\d)\s*hours?", text)
+    if m:
+        return int(m.group(1)) * 60
+    return int(re.match(r"\d+", text).group(0))
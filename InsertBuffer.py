@@ -0,0 +1,168 @@
+# InsertBuffer.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence
+
+from Metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+INSERT_FLUSHES = REGISTRY.counter(
+    "calendar_bq_insert_flushes_total", "Batched insert_rows_json calls by flush trigger", ("table", "reason")
+)
+INSERT_ROWS = REGISTRY.counter(
+    "calendar_bq_insert_rows_total", "Rows sent through the insert buffer by outcome", ("table", "outcome")
+)
+INSERT_BATCH_ROWS = REGISTRY.histogram(
+    "calendar_bq_insert_batch_rows", "Rows per insert_rows_json call", ("table",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 500)
+)
+
+
+def row_id(table: str, row: Dict[str, Any]) -> str:
+    """Stable insert id: the same row sent twice (a retry) is deduplicated by BigQuery"""
+    payload = json.dumps(row, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(f"{table}\n{payload}".encode()).hexdigest()
+
+
+class _Pending:
+    __slots__ = ("rows", "row_ids", "futures", "bytes", "first_at")
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+        self.row_ids: List[str] = []
+        self.futures: List[Future] = []
+        self.bytes = 0
+        self.first_at = 0.0
+
+
+class InsertBuffer:
+    """Coalesces streaming inserts from concurrent callers into batched insert_rows_json calls.
+
+    `insert` blocks its caller (a write-executor thread) until the rows it
+    added have been sent, and returns the errors for just those rows. A
+    table's buffer is flushed once it holds `max_rows` rows or `max_bytes`
+    of JSON (by the caller that filled it), or `max_delay` seconds after its
+    first row arrived (by a background thread). Rows carry content-derived
+    row ids, so BigQuery drops duplicates when a call is retried, and are
+    sent with skip_invalid_rows so one bad row cannot fail its neighbours.
+    """
+
+    def __init__(self, client, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_delay: Optional[float] = None):
+        self.client = client  # google.cloud.bigquery.Client
+        self.max_rows = max_rows or int(os.getenv("BQ_INSERT_BATCH_ROWS", "500"))
+        self.max_bytes = max_bytes or int(os.getenv("BQ_INSERT_BATCH_BYTES", str(5 * 1024 * 1024)))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("BQ_INSERT_MAX_DELAY", "0.02"))
+        self._tables: Dict[str, Any] = {}  # table id -> bigquery.Table, fetched once
+        self._pending: Dict[str, _Pending] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+
+    def insert(self, table_id: str, rows: Sequence[Dict[str, Any]],
+               row_ids: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Insert rows and wait; returns insert_rows_json-style errors indexed into `rows`"""
+        futures = self.submit(table_id, rows, row_ids)
+        errors = []
+        for index, future in enumerate(futures):
+            row_errors = future.result()
+            if row_errors:
+                errors.append({"index": index, "errors": row_errors})
+        return errors
+
+    def submit(self, table_id: str, rows: Sequence[Dict[str, Any]],
+               row_ids: Optional[Sequence[str]] = None) -> List[Future]:
+        """Queue rows; each future resolves to that row's error list ([] when inserted)"""
+        ids = list(row_ids) if row_ids is not None else [row_id(table_id, row) for row in rows]
+        futures = [Future() for _ in rows]
+        full = []
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Insert buffer is closed")
+            self._ensure_flusher()
+            for row, rid, future in zip(rows, ids, futures):
+                pending = self._pending.get(table_id)
+                if pending is None:
+                    pending = self._pending[table_id] = _Pending()
+                    pending.first_at = time.monotonic()
+                    self._cond.notify()
+                pending.rows.append(row)
+                pending.row_ids.append(rid)
+                pending.futures.append(future)
+                pending.bytes += len(json.dumps(row, separators=(",", ":"), default=str))
+                if len(pending.rows) >= self.max_rows or pending.bytes >= self.max_bytes:
+                    reason = "rows" if len(pending.rows) >= self.max_rows else "bytes"
+                    full.append((table_id, self._pending.pop(table_id), reason))
+        # Full batches are sent by the caller that filled them, outside the lock
+        for table, pending, reason in full:
+            self._flush(table, pending, reason)
+        return futures
+
+    def flush(self):
+        """Send everything buffered now"""
+        with self._cond:
+            batches = list(self._pending.items())
+            self._pending.clear()
+        for table, pending in batches:
+            self._flush(table, pending, "manual")
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="bigquery-insert-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    due = [t for t, p in self._pending.items() if now - p.first_at >= self.max_delay]
+                    if due:
+                        break
+                    waits = [p.first_at + self.max_delay - now for p in self._pending.values()]
+                    self._cond.wait(timeout=min(waits) if waits else None)
+                if self._closed:
+                    return
+                batches = [(t, self._pending.pop(t)) for t in due]
+            for table, pending in batches:
+                self._flush(table, pending, "delay")
+
+    def _flush(self, table_id: str, pending: _Pending, reason: str):
+        INSERT_FLUSHES.inc(table=table_id, reason=reason)
+        INSERT_BATCH_ROWS.observe(len(pending.rows), table=table_id)
+        try:
+            errors = self.client.insert_rows_json(
+                self._table(table_id), pending.rows, row_ids=pending.row_ids, skip_invalid_rows=True
+            )
+        except Exception as e:
+            logger.error(f"BigQuery batch insert into {table_id} failed: {str(e)}")
+            INSERT_ROWS.inc(len(pending.rows), table=table_id, outcome="error")
+            for future in pending.futures:
+                future.set_exception(e)
+            return
+
+        by_index = {error["index"]: error["errors"] for error in errors}
+        INSERT_ROWS.inc(len(pending.rows) - len(by_index), table=table_id, outcome="ok")
+        INSERT_ROWS.inc(len(by_index), table=table_id, outcome="error")
+        for index, future in enumerate(pending.futures):
+            future.set_result(by_index.get(index, []))
+
+    def _table(self, table_id: str):
+        table = self._tables.get(table_id)
+        if table is None:
+            table = self._tables[table_id] = self.client.get_table(table_id)
+        return table
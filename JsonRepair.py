@@ -0,0 +1,220 @@
+# JsonRepair.py
+"""Local repair of malformed parse output, so a fixable answer needs no second LLM call.
+
+Syntax: markdown fences and surrounding prose, // and /* */ comments,
+trailing commas, single-quoted strings, unquoted keys and Python literals.
+Values: durations like "1 hour" or 30.0, intent and id casing, timezone
+suffixes on the (local) datetime, empty values and a wrapping object.
+"""
+import json
+import re
+from typing import List, Optional, Tuple
+
+from CoreDatamodels import INTENTS
+from Metrics import REGISTRY
+
+JSON_REPAIRS = REGISTRY.counter(
+    "calendar_llm_json_repairs_total", "Fixes applied to LLM parse output before validation", ("repair",)
+)
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_WRAPPERS = ("arguments", "parameters", "parsed_request", "request", "data", "result")
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)?\s*$", re.I)
+_TZ_SUFFIX = re.compile(r"(?<=\d)(?:Z|[+-]\d{2}:?\d{2})$")
+
+
+def repair_parse_output(raw: str) -> Tuple[Optional[dict], List[str]]:
+    """(object to validate as a ParsedRequest, names of the repairs applied).
+
+    The object is None when the text cannot be turned into a JSON object.
+    """
+    repairs: List[str] = []
+    text = raw.strip()
+
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+        repairs.append("fence")
+    obj = _extract_object(text)
+    if obj is None:
+        return None, repairs
+    if obj != text:
+        repairs.append("prose")
+
+    try:
+        data = json.loads(obj)
+    except ValueError:
+        obj, syntax_repairs = _fix_syntax(obj)
+        repairs.extend(syntax_repairs)
+        try:
+            data = json.loads(obj)
+        except ValueError:
+            return None, repairs
+    if not isinstance(data, dict):
+        return None, repairs
+
+    return _coerce(data, repairs), repairs
+
+
+def record_repairs(repairs: List[str]):
+    for repair in repairs:
+        JSON_REPAIRS.inc(repair=repair)
+
+
+def _extract_object(text: str) -> Optional[str]:
+    """The first balanced {...} in the text, ignoring braces inside strings"""
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth, quote, escaped = 0, None, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]  # truncated output; let the syntax pass try to close it
+
+
+def _fix_syntax(text: str) -> Tuple[str, List[str]]:
+    """Rewrite JSON-ish text as JSON in one pass that tracks string state"""
+    out: List[str] = []
+    found = set()
+    depth = 0
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            # Copy the string, re-quoted with double quotes
+            j, chars = i + 1, []
+            while j < n and text[j] != ch:
+                if text[j] == "\\" and j + 1 < n:
+                    # JSON has no \' escape: the apostrophe needs none inside double quotes
+                    chars.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                chars.append('\\"' if text[j] == '"' else text[j])
+                j += 1
+            if ch == "'":
+                found.add("quotes")
+            out.append('"' + "".join(chars) + '"')
+            i = j + 1
+        elif text.startswith("//", i) or text.startswith("/*", i):
+            found.add("comments")
+            i = _skip_blank(text, i)
+        elif ch == ",":
+            rest = text[_skip_blank(text, i + 1):]
+            if rest[:1] in ("}", "]") or not rest:
+                found.add("trailing_comma")
+            else:
+                out.append(ch)
+            i += 1
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if text[j:].lstrip().startswith(":"):
+                found.add("unquoted_key")
+                out.append(f'"{word}"')
+            elif word in _LITERALS:
+                found.add("literals")
+                out.append(_LITERALS[word])
+            else:
+                out.append(word)
+            i = j
+        else:
+            depth += ch in "{["
+            depth -= ch in "}]"
+            out.append(ch)
+            i += 1
+    if depth > 0:
+        found.add("unclosed")
+        out.append("}" * depth)
+    return "".join(out), sorted(found)
+
+
+def _skip_blank(text: str, i: int) -> int:
+    """Index of the next character that is not whitespace or inside a comment"""
+    n = len(text)
+    while i < n:
+        if text[i].isspace():
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end + 1
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        else:
+            break
+    return i
+
+
+def _coerce(data: dict, repairs: List[str]) -> dict:
+    """Normalise field values the model commonly gets almost right"""
+    if len(data) == 1:
+        key, value = next(iter(data.items()))
+        if key in _WRAPPERS and isinstance(value, dict):
+            data = value
+            repairs.append("unwrap")
+
+    cleaned = {k: v for k, v in data.items() if v not in (None, "", "null", "None")}
+    if len(cleaned) != len(data):
+        repairs.append("empty_values")
+    data = cleaned
+
+    intent = data.get("intent")
+    if isinstance(intent, str):
+        normalised = re.sub(r"[\s-]+", "_", intent.strip().lower())
+        if normalised in ("create", "cancel", "reschedule"):
+            normalised += "_appointment"
+        elif normalised in ("availability", "check_availability"):
+            normalised = "get_availability"
+        if normalised != intent and normalised in INTENTS:
+            data["intent"] = normalised
+            repairs.append("intent")
+
+    for field in ("user_id", "appointment_id"):
+        value = data.get(field)
+        if isinstance(value, str) and value.strip().upper() != value:
+            data[field] = value.strip().upper()
+            repairs.append(field)
+
+    duration = data.get("duration")
+    # Plain numeric strings ("30") already pass validation as is
+    if isinstance(duration, float) or (isinstance(duration, str) and not duration.strip().isdigit()):
+        minutes = _minutes(duration)
+        if minutes is not None:
+            data["duration"] = minutes
+            repairs.append("duration")
+
+    when = data.get("datetime")
+    if isinstance(when, str) and _TZ_SUFFIX.search(when.strip()):
+        # The schema asks for the worker's local time; an offset is the model's guess
+        data["datetime"] = _TZ_SUFFIX.sub("", when.strip())
+        repairs.append("timezone_suffix")
+
+    return data
+
+
+def _minutes(value) -> Optional[int]:
+    if isinstance(value, float):
+        return int(round(value))
+    found = _DURATION.match(value)
+    if not found:
+        return None
+    amount, unit = float(found.group(1)), (found.group(2) or "m").lower()
+    return int(round(amount * 60 if unit.startswith("h") else amount))
@@ -0,0 +1,159 @@
+# LLMBackends.py
+import asyncio
+import logging
+import os
+import random
+from contextlib import nullcontext
+from typing import AsyncIterator, Optional, Protocol, Union, runtime_checkable
+
+from AdmissionControl import ConcurrencyLimiter
+from ChatGPTIntegration import LLM_PARSE_TOTAL, LLM_UNAVAILABLE
+from CoreDatamodels import ParsedRequest
+from FastPathParser import FastPathParser
+from ParseCache import ParseCache
+from ResponseRenderer import render_response
+
+logger = logging.getLogger(__name__)
+
+# LLM_BACKEND values
+BACKENDS = ("openai", "stub")
+
+
+@runtime_checkable
+class LLMBackend(Protocol):
+    """What the API needs from a language model (AsyncChatGPTAdapter, StubLLMBackend)"""
+
+    async def parse_request(self, natural_language: str, user_id: str) -> Union[ParsedRequest, dict]:
+        """ParsedRequest, or an error dict ({"error": ..., "details": ...})"""
+
+    async def generate_response(self, structured_data: dict) -> str:
+        """User-facing reply; must not raise (fall back to render_response)"""
+
+    def stream_response(self, structured_data: dict) -> AsyncIterator[str]:
+        """Reply as an async stream of text chunks"""
+
+    async def warm_up(self) -> None:
+        """Open connections before the first request"""
+
+    async def close(self) -> None:
+        """Release connections"""
+
+
+def backend_name() -> str:
+    name = os.getenv("LLM_BACKEND", "openai").strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{name}', expected one of {BACKENDS}")
+    return name
+
+
+class LatencyModel:
+    """Simulated call latency in seconds, sampled from a spec string.
+
+    "0.4" or "fixed:0.4", "uniform:0.2,1.0", "exponential:0.5" (mean),
+    "lognormal:0.8,0.5" (median, sigma: realistic long tail), "normal:0.8,0.2".
+    """
+
+    def __init__(self, spec: str, rng: Optional[random.Random] = None):
+        self.spec = spec
+        self._rng = rng or random.Random()
+        kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        self.kind = kind.strip().lower()
+        self.args = [float(a) for a in args.split(",") if a.strip()]
+        expected = {"fixed": 1, "uniform": 2, "exponential": 1, "lognormal": 2, "normal": 2}
+        if expected.get(self.kind) != len(self.args):
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self) -> float:
+        rng, args = self._rng, self.args
+        if self.kind == "fixed":
+            value = args[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(args[0], args[1])
+        elif self.kind == "exponential":
+            value = rng.expovariate(1 / args[0]) if args[0] > 0 else 0.0
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(0, args[1]) * args[0]
+        else:
+            value = rng.gauss(args[0], args[1])
+        return max(0.0, value)
+
+
+class StubLLMBackend:
+    """Offline, deterministic stand-in for the OpenAI backend.
+
+    Parses with the fast-path rules, falling back to lenient mode (a known
+    booking or availability phrasing anywhere in the text; dates in UTC), and
+    renders replies with the templates, after sleeping for a sampled latency.
+    Admission control and the parse cache behave as with OpenAI, so the rest
+    of /api/chat can be benchmarked as is.
+    """
+
+    def __init__(self, parse_latency: str = "lognormal:0.8,0.4", response_latency: str = "lognormal:0.6,0.4",
+                 token_latency: float = 0.02, error_rate: float = 0.0, seed: Optional[int] = None,
+                 limiter: Optional[ConcurrencyLimiter] = None, parse_cache: Optional[ParseCache] = None):
+        self._rng = random.Random(seed)
+        self.parse_latency = LatencyModel(parse_latency, self._rng)
+        self.response_latency = LatencyModel(response_latency, self._rng)
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.limiter = limiter
+        self.parse_cache = parse_cache
+        self._parser = FastPathParser()
+
+    @classmethod
+    def from_env(cls, **kwargs) -> 'StubLLMBackend':
+        seed = os.getenv("LLM_STUB_SEED")
+        return cls(
+            parse_latency=os.getenv("LLM_STUB_PARSE_LATENCY", "lognormal:0.8,0.4"),
+            response_latency=os.getenv("LLM_STUB_RESPONSE_LATENCY", "lognormal:0.6,0.4"),
+            token_latency=float(os.getenv("LLM_STUB_TOKEN_LATENCY", "0.02")),
+            error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+            seed=int(seed) if seed else None,
+            **kwargs,
+        )
+
+    def _admit(self):
+        return self.limiter.acquire() if self.limiter else nullcontext()
+
+    async def parse_request(self, natural_language: str, user_id: str) -> Union[ParsedRequest, dict]:
+        if self.parse_cache:
+            cached = self.parse_cache.get(natural_language, user_id)
+            if cached is not None:
+                return cached
+
+        async with self._admit():
+            await asyncio.sleep(self.parse_latency.sample())
+        if self._rng.random() < self.error_rate:
+            LLM_PARSE_TOTAL.inc(outcome="unavailable", source="stub")
+            return {"error": LLM_UNAVAILABLE, "details": "injected stub failure"}
+
+        match = self._parser.match(natural_language) or self._parser.match(natural_language, lenient=True)
+        parsed = self._parser.build(match, user_id) if match else None
+        if parsed is None:
+            LLM_PARSE_TOTAL.inc(outcome="validation_failed", source="stub")
+            return {"error": "Validation failed", "details": "stub backend could not parse the request"}
+
+        LLM_PARSE_TOTAL.inc(outcome="ok", source="stub")
+        if self.parse_cache:
+            self.parse_cache.put(natural_language, user_id, parsed)
+        return parsed
+
+    async def generate_response(self, structured_data: dict) -> str:
+        async with self._admit():
+            await asyncio.sleep(self.response_latency.sample())
+        return render_response(structured_data)
+
+    async def stream_response(self, structured_data: dict) -> AsyncIterator[str]:
+        async with self._admit():
+            await asyncio.sleep(self.response_latency.sample())  # time to first token
+            words = render_response(structured_data).split(" ")
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self.token_latency)
+                yield word if i == len(words) - 1 else word + " "
+
+    async def warm_up(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
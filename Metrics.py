@@ -0,0 +1,286 @@
+# Metrics.py
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock;
+recording a sample is a dict lookup plus a bisect, cheap enough to leave on
+in production. Stage timings of the current request are also collected in a
+context variable so they can be returned as a Server-Timing header.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans a cached dict lookup up to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class RequestTimings:
+    """Stage timings and intent of one request.
+
+    Mutable on purpose: the endpoint runs in a copied context, so the
+    middleware can only see what the endpoint recorded through this object.
+    """
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []  # (stage, duration_ms)
+        self.intent = "unknown"
+
+
+_request_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+# Intent of the request being served, used as a metric label
+_current_intent: contextvars.ContextVar[str] = contextvars.ContextVar("current_intent", default="unknown")
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._values.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "calendar_stage_duration_seconds", "Latency of each pipeline stage", ("stage", "intent", "outcome")
+)
+STAGE_TOTAL = REGISTRY.counter(
+    "calendar_stage_total", "Number of pipeline stage executions", ("stage", "intent", "outcome")
+)
+REQUEST_LATENCY = REGISTRY.histogram(
+    "calendar_request_duration_seconds", "End-to-end HTTP request latency", ("endpoint", "intent", "outcome")
+)
+REQUEST_TOTAL = REGISTRY.counter(
+    "calendar_requests_total", "Number of HTTP requests served", ("endpoint", "intent", "outcome")
+)
+
+
+# ----------------------------------------------------------------------
+# Stage timing
+# ----------------------------------------------------------------------
+def set_intent(intent: str):
+    """Label every later stage of the current request with this intent"""
+    _current_intent.set(intent or "unknown")
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.intent = intent or "unknown"
+
+
+def current_intent() -> str:
+    return _current_intent.get()
+
+
+def start_request_timings() -> RequestTimings:
+    """Begin collecting stage timings for the current request"""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    _current_intent.set("unknown")
+    return timings
+
+
+def record_stage(stage: str, seconds: float, outcome: str = "ok", intent: Optional[str] = None):
+    intent = intent or _current_intent.get()
+    STAGE_LATENCY.observe(seconds, stage=stage, intent=intent, outcome=outcome)
+    STAGE_TOTAL.inc(stage=stage, intent=intent, outcome=outcome)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.stages.append((stage, seconds * 1000))
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one pipeline stage"""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - started, outcome)
+
+
+def timed(name: str):
+    """Decorator form of `stage` for sync and async functions"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing_header(timings: RequestTimings, total_ms: Optional[float] = None) -> str:
+    """Format stage timings as a Server-Timing header value"""
+    # Stages that run more than once (e.g. availability probes) are summed
+    totals: Dict[str, float] = {}
+    for name, duration_ms in timings.stages:
+        totals[name] = totals.get(name, 0.0) + duration_ms
+    if total_ms is not None:
+        totals["total"] = total_ms
+    return ", ".join(f"{name};dur={duration_ms:.1f}" for name, duration_ms in totals.items())
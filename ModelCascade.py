@@ -0,0 +1,111 @@
+# ModelCascade.py
+import json
+import logging
+import os
+import re
+import threading
+from typing import Optional, Union
+
+from CoreDatamodels import ParsedRequest
+from Metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CASCADE_TOTAL = REGISTRY.counter(
+    "calendar_llm_cascade_total", "Cascaded parses: answered by the cheap model or escalated, and why",
+    ("result", "reason")
+)
+CASCADE_SECONDS = REGISTRY.counter(
+    "calendar_llm_cascade_seconds_total",
+    "Parse latency saved by cheap-model answers, and wasted on cheap attempts that were escalated", ("kind",)
+)
+CASCADE_COST = REGISTRY.counter(
+    "calendar_llm_cascade_cost_usd_total",
+    "Estimated spend saved by cheap-model answers, and wasted on cheap attempts that were escalated", ("kind",)
+)
+
+# USD per million (prompt, completion) tokens; extend or override with LLM_MODEL_PRICES='{"model": [in, out]}'
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+}
+
+# Parse errors a stronger model may fix; anything else is also escalated, as "error"
+_INVALID_OUTPUT = ("Validation failed", "Invalid response format")
+# Same message as ChatGPTIntegration.LLM_UNAVAILABLE (not imported: that module imports this one)
+_UNAVAILABLE = "Language service unavailable"
+
+
+class ModelCascade:
+    """Parse with a cheap model first and escalate to the strong one only when needed.
+
+    The cheap answer is kept when it validates as a ParsedRequest and looks
+    grounded in the request text: a worker name or appointment id the user
+    never typed, or a reschedule without a new time, counts as low confidence.
+    Enabled by LLM_CASCADE_MODEL; the strong model is the adapter's parse model.
+    """
+
+    def __init__(self, model: str, strong_model: str):
+        self.model = model
+        self.strong_model = strong_model
+        self.prices = dict(MODEL_PRICES)
+        self.prices.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_MODEL_PRICES", "{}")).items()})
+        self._strong_seconds: Optional[float] = None  # running mean of strong-model parse latency
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, strong_model: str) -> Optional['ModelCascade']:
+        model = os.getenv("LLM_CASCADE_MODEL")
+        if not model or model == strong_model:
+            return None
+        logger.info(f"Parse cascade: {model}, escalating to {strong_model}")
+        return cls(model, strong_model)
+
+    def escalation_reason(self, result: Union[ParsedRequest, dict], natural_language: str) -> Optional[str]:
+        """Why the cheap model's result should not be used, or None to accept it.
+
+        "unavailable" means the cheap model was throttled, failed or has its
+        circuit open. Rate limits and outages are per model, so this escalates
+        too; the strong model's own breaker decides whether OpenAI is down.
+        """
+        if not isinstance(result, ParsedRequest):
+            if result.get("error") == _UNAVAILABLE:
+                return "unavailable"
+            return "invalid" if result.get("error") in _INVALID_OUTPUT else "error"
+        text = natural_language.lower()
+        if result.worker_name and not all(word in text for word in re.findall(r"\w+", result.worker_name.lower())):
+            return "low_confidence"
+        if result.appointment_id and result.appointment_id.lower() not in text:
+            return "low_confidence"
+        if result.intent == "reschedule_appointment" and result.datetime is None:
+            return "low_confidence"
+        return None
+
+    def accepted(self, seconds: float, usage):
+        CASCADE_TOTAL.inc(result="accepted", reason="none")
+        if self._strong_seconds is not None:
+            CASCADE_SECONDS.inc(max(0.0, self._strong_seconds - seconds), kind="saved")
+        saved = self.cost(self.strong_model, usage) - self.cost(self.model, usage)
+        CASCADE_COST.inc(max(0.0, saved), kind="saved")
+
+    def escalated(self, reason: str, seconds: float, usage):
+        """Record a cheap attempt that was thrown away (`seconds` and `usage` are its own)"""
+        logger.info(f"Escalating parse to {self.strong_model}: {reason}")
+        CASCADE_TOTAL.inc(result="escalated", reason=reason)
+        CASCADE_SECONDS.inc(seconds, kind="wasted")
+        CASCADE_COST.inc(self.cost(self.model, usage), kind="wasted")
+
+    def observe_strong(self, seconds: float):
+        with self._lock:
+            previous = self._strong_seconds
+            self._strong_seconds = seconds if previous is None else 0.9 * previous + 0.1 * seconds
+
+    def cost(self, model: str, usage) -> float:
+        """Estimated USD for one completion's token usage; 0 for unknown models"""
+        if usage is None or model not in self.prices:
+            return 0.0
+        prompt_price, completion_price = self.prices[model]
+        return ((usage.prompt_tokens or 0) * prompt_price + (usage.completion_tokens or 0) * completion_price) / 1e6
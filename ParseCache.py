@@ -0,0 +1,79 @@
+# ParseCache.py
+import os
+import re
+import threading
+from datetime import date
+from typing import Optional, Tuple
+
+from cachetools import TTLCache
+
+from CoreDatamodels import ParsedRequest
+from Metrics import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter(
+    "calendar_parse_cache_lookups_total", "Parse cache lookups", ("result",)
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "calendar_parse_cache_evictions_total", "Parse cache entries dropped", ("reason",)
+)
+CACHE_SIZE = REGISTRY.gauge("calendar_parse_cache_entries", "Entries currently in the parse cache")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that reports LRU evictions and TTL expirations"""
+
+    def popitem(self):
+        item = super().popitem()
+        CACHE_EVICTIONS.inc(reason="lru")
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if expired:
+            CACHE_EVICTIONS.inc(len(expired), reason="ttl")
+        return expired
+
+
+class ParseCache:
+    """LRU + TTL cache of successful parse_request results.
+
+    Keyed on the normalised text, the user and the reference day, because
+    relative dates ("tomorrow", "next Tuesday") resolve differently each day.
+    Only validated ParsedRequests are cached, never error dicts.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        self._cache = _CountingTTLCache(
+            maxsize=maxsize or int(os.getenv("PARSE_CACHE_SIZE", "10000")),
+            ttl=ttl or float(os.getenv("PARSE_CACHE_TTL", "300")),
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(natural_language: str, user_id: str, reference_day: Optional[date] = None) -> Tuple[str, str, str]:
+        text = _WHITESPACE.sub(" ", natural_language.strip().lower()).rstrip(" .!?")
+        return text, user_id, (reference_day or date.today()).isoformat()
+
+    def get(self, natural_language: str, user_id: str) -> Optional[ParsedRequest]:
+        key = self.key(natural_language, user_id)
+        with self._lock:
+            cached = self._cache.get(key)
+            CACHE_SIZE.set(len(self._cache))
+        CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        # Copy so callers can't mutate the shared entry
+        return cached.model_copy() if cached is not None else None
+
+    def put(self, natural_language: str, user_id: str, parsed) -> None:
+        if not isinstance(parsed, ParsedRequest):
+            return
+        key = self.key(natural_language, user_id)
+        with self._lock:
+            self._cache[key] = parsed.model_copy()
+            CACHE_SIZE.set(len(self._cache))
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            CACHE_SIZE.set(0)
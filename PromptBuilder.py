@@ -0,0 +1,170 @@
+# PromptBuilder.py
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from Metrics import REGISTRY
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character-based estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+LLM_TOKENS = REGISTRY.counter(
+    "calendar_llm_tokens_total", "Tokens reported by the LLM provider", ("call", "kind", "intent")
+)
+PROMPT_TOKENS_ESTIMATED = REGISTRY.histogram(
+    "calendar_prompt_tokens_estimated", "Locally counted prompt tokens per call", ("call",),
+    buckets=(64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+)
+PROMPT_REJECTED = REGISTRY.counter(
+    "calendar_prompt_budget_rejected_total", "Prompts refused for exceeding the token budget", ("call",)
+)
+
+# Static part of the parse prompt. Nothing per-request may go in here: the
+# provider caches identical prompt prefixes, and this (with the tool schema)
+# is that prefix.
+PARSE_INSTRUCTIONS = """
+You convert calendar requests into a call to the submit_parsed_request function.
+
+Important Rules:
+- Use the year from "Current time" unless the user names another year
+- For future dates without time: assume 9 AM
+- Never suggest past dates
+- Appointment IDs look like: APT-1234567890-WORKER123
+
+Examples:
+1. Cancel by ID:
+{"intent": "cancel_appointment", "user_id": "USER048", "appointment_id": "APT-1740812400-WORKER123"}
+
+2. Cancel by details:
+{"intent": "cancel_appointment", "user_id": "USER048", "worker_name": "Tyler", "datetime": "2025-03-04T16:00:00"}
+
+3. Create new:
+{"intent": "create_appointment", "user_id": "USER046", "worker_name": "John", "datetime": "2025-03-22T15:00:00", "duration": 30}
+
+4. Reschedule:
+{"intent": "reschedule_appointment", "appointment_id": "APT-1740812400-WORKER123", "user_id": "USER046", "datetime": "2025-03-23T11:00:00"}
+
+Required Fields by Intent:
+- create_appointment: user_id, worker_name, datetime
+- cancel_appointment: user_id + (appointment_id OR worker_name+datetime)
+- reschedule_appointment: user_id + (appointment_id OR worker_name) + datetime
+- get_availability: user_id, worker_name
+
+Only include fields that apply. Never include comments or explanations.
+""".strip()
+
+RESPONSE_INSTRUCTIONS = """
+Convert the appointment data in the user message into a friendly user message.
+
+Rules:
+- Use simple, conversational language
+- Highlight key details: worker name, date/time, status
+- For conflicts, suggest alternatives clearly
+- Never expose internal IDs or technical terms
+""".strip()
+
+# Per-message framing overhead of the chat format
+_MESSAGE_OVERHEAD = 4
+
+
+class PromptTooLarge(ValueError):
+    """Raised when a prompt would exceed the configured token budget"""
+
+    def __init__(self, call: str, tokens: int, budget: int):
+        super().__init__(f"{call} prompt is {tokens} tokens, budget is {budget}")
+        self.call = call
+        self.tokens = tokens
+        self.budget = budget
+
+
+@dataclass
+class Prompt:
+    messages: List[Dict[str, str]]
+    tokens: int  # local count, tools included
+    max_tokens: int  # completion cap sent to the provider
+
+
+class PromptBuilder:
+    """Builds chat messages as a static, cacheable prefix plus a dynamic tail.
+
+    The system message (rules, examples) and the tool schema are rendered and
+    counted once; each call only renders and counts the user message with the
+    request-specific values. Prompts over `prompt_budget` tokens are refused
+    with PromptTooLarge before anything is sent.
+    """
+
+    def __init__(self, parse_tools: Sequence[dict] = (), model: str = "gpt-3.5-turbo",
+                 prompt_budget: Optional[int] = None, parse_max_tokens: Optional[int] = None,
+                 response_max_tokens: Optional[int] = None):
+        self.prompt_budget = prompt_budget or int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+        self.parse_max_tokens = parse_max_tokens or int(os.getenv("PARSE_MAX_TOKENS", "200"))
+        self.response_max_tokens = response_max_tokens or int(os.getenv("RESPONSE_MAX_TOKENS", "300"))
+        self._encoding = _encoding_for(model)
+
+        self._parse_system = {"role": "system", "content": PARSE_INSTRUCTIONS}
+        self._response_system = {"role": "system", "content": RESPONSE_INSTRUCTIONS}
+        self._parse_prefix_tokens = (
+            self._message_tokens(self._parse_system)
+            + sum(self.count_tokens(json.dumps(tool)) for tool in parse_tools)
+        )
+        self._response_prefix_tokens = self._message_tokens(self._response_system)
+
+    def parse_prompt(self, natural_language: str, user_id: str, now: Optional[datetime] = None) -> Prompt:
+        """Messages for parse_request; per-request values go last"""
+        user = {
+            "role": "user",
+            "content": f"User ID: {user_id}\nCurrent time: {(now or datetime.now()).isoformat(timespec='minutes')}\n"
+                       f"Request: {natural_language}",
+        }
+        return self._finish("parse", [self._parse_system, user], self._parse_prefix_tokens, self.parse_max_tokens)
+
+    def response_prompt(self, structured_data: dict) -> Prompt:
+        """Messages for generate_response/stream_response"""
+        user = {"role": "user", "content": json.dumps(structured_data, indent=2, default=str)}
+        return self._finish("response", [self._response_system, user], self._response_prefix_tokens,
+                            self.response_max_tokens)
+
+    def _finish(self, call: str, messages: List[Dict[str, str]], prefix_tokens: int, max_tokens: int) -> Prompt:
+        tokens = prefix_tokens + self._message_tokens(messages[-1])
+        PROMPT_TOKENS_ESTIMATED.observe(tokens, call=call)
+        if tokens > self.prompt_budget:
+            PROMPT_REJECTED.inc(call=call)
+            raise PromptTooLarge(call, tokens, self.prompt_budget)
+        return Prompt(messages=messages, tokens=tokens, max_tokens=max_tokens)
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        # ~4 characters per token for English text and JSON
+        return (len(text) + 3) // 4
+
+    def _message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count_tokens(message["content"]) + _MESSAGE_OVERHEAD
+
+
+def record_usage(call: str, usage, intent: str = "unknown"):
+    """Publish the provider-reported token usage of one completion"""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, call=call, kind="prompt", intent=intent)
+    LLM_TOKENS.inc(usage.completion_tokens or 0, call=call, kind="completion", intent=intent)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached:
+        LLM_TOKENS.inc(cached, call=call, kind="cached_prompt", intent=intent)
+
+
+def _encoding_for(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
@@ -0,0 +1,261 @@
+# QueryRegistry.py
+"""Named, parameterised BigQuery statements with per-statement job statistics.
+
+Every statement has one fixed SQL text; values, including optional filters
+(NULL parameters), are always passed as query parameters. Repeated calls
+are therefore the same query to BigQuery, so its result cache can answer
+them, and each name's latency, bytes processed, slot time and cache hits
+can be aggregated.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.cloud import bigquery
+
+from Metrics import REGISTRY
+from QueryStream import iter_pages
+
+logger = logging.getLogger(__name__)
+
+QUERY_TOTAL = REGISTRY.counter(
+    "calendar_bq_named_query_total", "Named query executions by cache outcome (hit, miss, error)", ("query", "cache")
+)
+QUERY_SECONDS = REGISTRY.histogram(
+    "calendar_bq_named_query_seconds", "Named query latency, submit to result", ("query",)
+)
+QUERY_BYTES = REGISTRY.counter(
+    "calendar_bq_named_query_bytes_processed_total", "Bytes processed by named queries", ("query",)
+)
+QUERY_SLOT_MS = REGISTRY.counter(
+    "calendar_bq_named_query_slot_ms_total", "Slot milliseconds consumed by named queries", ("query",)
+)
+
+
+@dataclass(frozen=True)
+class NamedQuery:
+    name: str
+    sql: str
+    params: Tuple[Tuple[str, str], ...]  # (name, BigQuery type); "ARRAY<T>" for arrays
+
+    def job_config(self, values: Dict[str, Any]) -> bigquery.QueryJobConfig:
+        unknown = set(values) - {name for name, _ in self.params}
+        if unknown:
+            raise TypeError(f"Query {self.name} has no parameters {sorted(unknown)}")
+        parameters = []
+        for name, type_ in self.params:
+            value = values.get(name)
+            if type_.startswith("ARRAY<"):
+                parameters.append(bigquery.ArrayQueryParameter(name, type_[6:-1], list(value or [])))
+            else:
+                parameters.append(bigquery.ScalarQueryParameter(name, type_, value))
+        return bigquery.QueryJobConfig(query_parameters=parameters)
+
+
+class TrackedJob:
+    """A query job that records its statistics under the query's name once it completes"""
+
+    def __init__(self, name: str, job, started: float):
+        self.name = name
+        self.job = job
+        self.started = started
+        self._recorded = False
+
+    def __getattr__(self, attr):
+        return getattr(self.job, attr)
+
+    def __iter__(self):
+        return iter(self.result())
+
+    def result(self, **kwargs):
+        try:
+            rows = self.job.result(**kwargs)
+        except Exception:
+            self._record(error=True)
+            raise
+        self._record()
+        return rows
+
+    def _record(self, error: bool = False):
+        if self._recorded:
+            return
+        self._recorded = True
+        QUERY_SECONDS.observe(time.perf_counter() - self.started, query=self.name)
+        if error:
+            QUERY_TOTAL.inc(query=self.name, cache="error")
+            return
+        # Absent on recorded/replayed jobs and some DML: count what is reported
+        cache_hit = getattr(self.job, "cache_hit", None)
+        QUERY_TOTAL.inc(query=self.name, cache="hit" if cache_hit else "miss")
+        QUERY_BYTES.inc(getattr(self.job, "total_bytes_processed", None) or 0, query=self.name)
+        QUERY_SLOT_MS.inc(getattr(self.job, "slot_millis", None) or 0, query=self.name)
+
+
+class QueryRegistry:
+    def __init__(self):
+        self._queries: Dict[str, NamedQuery] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, sql: str, **param_types: str) -> NamedQuery:
+        query = NamedQuery(name, " ".join(sql.split()), tuple(param_types.items()))
+        with self._lock:
+            if name in self._queries and self._queries[name] != query:
+                raise ValueError(f"Query {name} is already registered with a different statement")
+            self._queries[name] = query
+        return query
+
+    def get(self, name: str) -> NamedQuery:
+        return self._queries[name]
+
+    def run(self, bq_client, name: str, **params) -> TrackedJob:
+        """Start a named query; its stats are recorded when `.result()` returns"""
+        query = self._queries[name]
+        job_config = query.job_config(params)
+        started = time.perf_counter()  # before the insert round trip: latency is submit to result
+        return TrackedJob(name, bq_client.query(query.sql, job_config=job_config), started)
+
+    def first(self, bq_client, name: str, **params) -> Optional[Dict[str, Any]]:
+        """First row of a named query as a dict, or None"""
+        row = next(iter(self.run(bq_client, name, **params).result()), None)
+        return dict(row) if row is not None else None
+
+    def rows(self, bq_client, name: str, **params) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.run(bq_client, name, **params).result()]
+
+    def pages(self, bq_client, name: str, page_size: Optional[int] = None, max_rows: Optional[int] = None,
+              **params) -> Iterator[List[Dict[str, Any]]]:
+        """Result of a named query a page at a time (see QueryStream)"""
+        job = self.run(bq_client, name, **params)
+        return iter_pages(job, page_size, max_rows, getattr(bq_client, "bqstorage_client", None))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-query totals since start: calls, latency, bytes, slot-ms and cache-hit ratio"""
+        summary = {}
+        for name in sorted(self._queries):
+            hits, misses = QUERY_TOTAL.value(query=name, cache="hit"), QUERY_TOTAL.value(query=name, cache="miss")
+            calls = QUERY_SECONDS.count(query=name)
+            if not calls:
+                continue
+            summary[name] = {
+                "calls": calls,
+                "errors": int(QUERY_TOTAL.value(query=name, cache="error")),
+                "mean_ms": round(QUERY_SECONDS.sum(query=name) / calls * 1000, 1),
+                "bytes_processed": int(QUERY_BYTES.value(query=name)),
+                "slot_ms": int(QUERY_SLOT_MS.value(query=name)),
+                "cache_hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+        return summary
+
+
+QUERIES = QueryRegistry()
+
+# Appointments
+QUERIES.register("appointment_by_id", """
+    SELECT *
+    FROM `calendar_system.appointments`
+    WHERE appointment_id = @appointment_id
+    AND user_id = @user_id
+    LIMIT 1
+""", appointment_id="STRING", user_id="STRING")
+
+QUERIES.register("appointment_by_details", """
+    SELECT a.*
+    FROM `calendar_system.appointments` a
+    JOIN `calendar_system.workers` w ON a.worker_id = w.worker_id
+    WHERE a.user_id = @user_id
+    AND LOWER(w.name) = LOWER(@worker_name)
+    AND a.start_time BETWEEN @start_time AND @end_time
+    AND a.status != 'cancelled'
+    LIMIT 1
+""", user_id="STRING", worker_name="STRING", start_time="DATETIME", end_time="DATETIME")
+
+_USER_APPOINTMENTS = """
+    SELECT *
+    FROM `calendar_system.appointments`
+    WHERE user_id = @user_id
+    AND status != 'cancelled'
+    AND (@before_time IS NULL
+         OR start_time < @before_time
+         OR (start_time = @before_time AND appointment_id < @before_id))
+    ORDER BY start_time DESC, appointment_id DESC
+"""
+QUERIES.register("user_appointments", _USER_APPOINTMENTS,
+                 user_id="STRING", before_time="TIMESTAMP", before_id="STRING")
+QUERIES.register("user_appointments_page", _USER_APPOINTMENTS + "LIMIT @row_limit",
+                 user_id="STRING", before_time="TIMESTAMP", before_id="STRING", row_limit="INT64")
+
+QUERIES.register("worker_appointments", """
+    SELECT *
+    FROM `calendar_system.appointments`
+    WHERE worker_id = @worker_id
+    AND status != 'cancelled'
+    ORDER BY start_time DESC
+""", worker_id="STRING")
+
+QUERIES.register("availability_conflicts", """
+    SELECT COUNT(*) AS conflicts
+    FROM `calendar_system.appointments`
+    WHERE worker_id = @worker_id
+    AND status NOT IN ('cancelled', 'rescheduled')
+    AND (
+        (start_time BETWEEN @start AND @end) OR
+        (end_time BETWEEN @start AND @end) OR
+        (start_time <= @start AND end_time >= @end)
+    )
+    AND (@exclude_id IS NULL OR appointment_id != @exclude_id)
+""", worker_id="STRING", start="DATETIME", end="DATETIME", exclude_id="STRING")
+
+QUERIES.register("busy_intervals", """
+    SELECT appointment_id, worker_id, start_time, end_time
+    FROM `calendar_system.appointments`
+    WHERE worker_id IN UNNEST(@worker_ids)
+    AND status NOT IN ('cancelled', 'rescheduled')
+    AND start_time <= @end
+    AND end_time >= @start
+    ORDER BY start_time
+""", worker_ids="ARRAY<STRING>", start="DATETIME", end="DATETIME")
+
+QUERIES.register("reschedule_appointment", """
+    UPDATE `calendar_system.appointments`
+    SET start_time = @start_time,
+        end_time = @end_time,
+        status = 'rescheduled'
+    WHERE appointment_id = @appointment_id
+    AND user_id = @user_id
+""", start_time="TIMESTAMP", end_time="TIMESTAMP", appointment_id="STRING", user_id="STRING")
+
+QUERIES.register("cancel_appointment", """
+    UPDATE `calendar_system.appointments`
+    SET status = 'cancelled'
+    WHERE appointment_id = @appointment_id
+    AND user_id = @user_id
+""", appointment_id="STRING", user_id="STRING")
+
+# Workers
+_WORKER_COLUMNS = "worker_id, name, role, working_hours, timezone"
+
+QUERIES.register("workers_all", f"SELECT {_WORKER_COLUMNS} FROM `calendar_system.workers`")
+
+QUERIES.register("worker_by_id", f"""
+    SELECT {_WORKER_COLUMNS}
+    FROM `calendar_system.workers`
+    WHERE worker_id = @worker_id
+    LIMIT 1
+""", worker_id="STRING")
+
+QUERIES.register("worker_by_name", f"""
+    SELECT {_WORKER_COLUMNS}
+    FROM `calendar_system.workers`
+    WHERE LOWER(name) = LOWER(@worker_name)
+    LIMIT 1
+""", worker_name="STRING")
+
+QUERIES.register("workers_by_names", f"""
+    SELECT {_WORKER_COLUMNS}
+    FROM `calendar_system.workers`
+    WHERE LOWER(name) IN UNNEST(@names)
+""", names="ARRAY<STRING>")
+
+QUERIES.register("worker_names", "SELECT name FROM `calendar_system.workers`")
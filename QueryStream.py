@@ -0,0 +1,89 @@
+# QueryStream.py
+"""Page-at-a-time iteration over query results, instead of one materialised list.
+
+Rows come back as plain dicts, one page (a list) at a time. Results of at
+least BQ_COLUMNAR_MIN_ROWS rows are read as Arrow record batches when
+pyarrow is installed, through the BigQuery Storage Read API when its client
+is available too: each column is converted once per batch rather than each
+cell once per row.
+"""
+import logging
+import os
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from Metrics import REGISTRY
+
+try:
+    import pyarrow
+except ImportError:  # optional; results are read page by page over REST
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+ROWS_STREAMED = REGISTRY.counter(
+    "calendar_bq_rows_streamed_total", "Rows read through the paged query API by read path", ("path",)
+)
+PAGES_STREAMED = REGISTRY.counter(
+    "calendar_bq_pages_streamed_total", "Pages read through the paged query API by read path", ("path",)
+)
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def iter_pages(job, page_size: Optional[int] = None, max_rows: Optional[int] = None,
+               bqstorage_client=None) -> Iterator[List[Dict[str, Any]]]:
+    """Pages (lists of row dicts) of a query job's result, at most `max_rows` rows in all"""
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    rows = job.result(page_size=page_size, max_results=max_rows)
+    if _columnar(rows, max_rows):
+        pages, path = _arrow_pages(rows, page_size, bqstorage_client), "columnar"
+    elif hasattr(rows, "pages"):
+        pages, path = ([dict(row) for row in page] for page in rows.pages), "rest"
+    else:
+        # Already materialised (e.g. a recorded result): just slice it
+        pages, path = _slices(rows, page_size), "memory"
+
+    remaining = max_rows
+    for page in pages:
+        if remaining is not None:
+            page = page[:remaining]
+            remaining -= len(page)
+        if page:
+            PAGES_STREAMED.inc(path=path)
+            ROWS_STREAMED.inc(len(page), path=path)
+            yield page
+        if remaining == 0:
+            return
+
+
+def iter_rows(job, page_size: Optional[int] = None, max_rows: Optional[int] = None,
+              bqstorage_client=None) -> Iterator[Dict[str, Any]]:
+    """Rows of a query job's result, fetched a page at a time"""
+    for page in iter_pages(job, page_size, max_rows, bqstorage_client):
+        yield from page
+
+
+def _columnar(rows, max_rows: Optional[int]) -> bool:
+    # max_results makes the client fall back to REST anyway, so only unbounded scans qualify
+    if pyarrow is None or max_rows is not None or not hasattr(rows, "to_arrow_iterable"):
+        return False
+    return (rows.total_rows or 0) >= int(os.getenv("BQ_COLUMNAR_MIN_ROWS", "5000"))
+
+
+def _arrow_pages(rows, page_size: int, bqstorage_client) -> Iterator[List[Dict[str, Any]]]:
+    for batch in rows.to_arrow_iterable(bqstorage_client=bqstorage_client):
+        names = batch.schema.names
+        for offset in range(0, batch.num_rows, page_size):
+            part = batch.slice(offset, page_size)  # zero-copy
+            columns = [column.to_pylist() for column in part.columns]
+            yield [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def _slices(rows: Iterable, page_size: int) -> Iterator[List[Dict[str, Any]]]:
+    rows = iter(rows)
+    while True:
+        page = [dict(row) for row in islice(rows, page_size)]
+        if not page:
+            return
+        yield page
@@ -0,0 +1,278 @@
+# ResilientLLM.py
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from Metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LLM_ATTEMPTS = REGISTRY.counter(
+    "calendar_llm_attempts_total", "Upstream LLM attempts by call and outcome", ("call", "outcome")
+)
+LLM_HEDGES = REGISTRY.counter(
+    "calendar_llm_hedges_total", "Hedged second requests, and which request answered first", ("call", "winner")
+)
+CIRCUIT_STATE = REGISTRY.gauge(
+    "calendar_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("breaker",)
+)
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "calendar_circuit_rejected_total", "Calls failed fast by an open circuit", ("breaker",)
+)
+
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+# Never start an attempt with less time than this left on the deadline
+_MIN_ATTEMPT = 0.25
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is currently considered unhealthy"""
+
+    def __init__(self, breaker: str, retry_after: float):
+        super().__init__(f"{breaker} circuit open, retry after {retry_after:.0f}s")
+        self.breaker = breaker
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failed calls.
+
+    While open every call fails fast with CircuitOpenError. After
+    `reset_timeout` seconds one probe call is let through (half-open); its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()  # also used from the sync adapter's threads
+        CIRCUIT_STATE.set(0, breaker=name)
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                waited = time.monotonic() - self._opened_at
+                if waited < self.reset_timeout:
+                    CIRCUIT_REJECTED.inc(breaker=self.name)
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+                self._set_state("half_open")
+            if self.state == "half_open":
+                if self._probing:
+                    CIRCUIT_REJECTED.inc(breaker=self.name)
+                    raise CircuitOpenError(self.name, 1)
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != "closed":
+                logger.info(f"Circuit {self.name} closed")
+                self._set_state("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit {self.name} opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                self._set_state("open")
+
+    def abandon(self):
+        """The call was cancelled before an outcome; let another probe through"""
+        with self._lock:
+            self._probing = False
+
+    def retry_after(self) -> float:
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], breaker=self.name)
+
+
+def _retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                        openai.InternalServerError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code in (408, 409)
+
+
+def upstream_unavailable(exc: BaseException) -> bool:
+    """True for failures that mean the upstream is down or overloaded, not a bad request"""
+    return isinstance(exc, CircuitOpenError) or _retryable(exc)
+
+
+def _retry_after_header(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class ResilientCaller:
+    """Deadline, retry, hedging and circuit-breaking policy for one upstream.
+
+    `call(name, fn)` runs `fn(timeout)` until it succeeds, the error is not
+    retryable, `max_retries` is used up or the overall `deadline` would be
+    exceeded. Each attempt gets at most `attempt_timeout` seconds. Backoff is
+    full-jitter exponential, or the server's Retry-After when it fits in the
+    budget. With hedging on, an attempt still running after the recent p95
+    latency gets a second, identical request and the first answer wins.
+    Calls that exhaust their retries count as failures for the breaker.
+    """
+
+    def __init__(self, name: str = "openai", breaker: Optional[CircuitBreaker] = None,
+                 deadline: Optional[float] = None, attempt_timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None, backoff: Optional[float] = None,
+                 hedge: Optional[bool] = None, hedge_min_delay: Optional[float] = None):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(
+            name,
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+        )
+        self.deadline = deadline or float(os.getenv("LLM_DEADLINE", "15"))
+        self.attempt_timeout = attempt_timeout or float(os.getenv("LLM_ATTEMPT_TIMEOUT", "8"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.backoff = backoff or float(os.getenv("LLM_BACKOFF", "0.2"))
+        self.hedge = hedge if hedge is not None else os.getenv("LLM_HEDGE", "0") == "1"
+        self.hedge_min_delay = hedge_min_delay or float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+        self._latencies = deque(maxlen=200)  # seconds, successful attempts
+
+    async def call(self, call: str, fn: Callable[[float], Awaitable[T]], hedge: bool = True) -> T:
+        self.breaker.before_call()
+        try:
+            return await self._call(call, fn, hedge and self.hedge)
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+
+    async def _call(self, call: str, fn, hedge: bool):
+        deadline = time.monotonic() + self.deadline
+        retries = 0
+        while True:
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            try:
+                result = await self._attempt(call, fn, timeout, hedge)
+            except Exception as e:
+                delay = self._next_delay(call, e, retries, deadline)
+                if delay is None:
+                    raise
+                retries += 1
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def call_sync(self, call: str, fn: Callable[[float], T]) -> T:
+        """Blocking variant of `call` (no hedging)"""
+        self.breaker.before_call()
+        deadline = time.monotonic() + self.deadline
+        retries = 0
+        while True:
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            started = time.monotonic()
+            try:
+                result = fn(timeout)
+            except Exception as e:
+                delay = self._next_delay(call, e, retries, deadline)
+                if delay is None:
+                    raise
+                retries += 1
+                time.sleep(delay)
+                continue
+            self._observe(call, time.monotonic() - started)
+            self.breaker.record_success()
+            return result
+
+    async def _attempt(self, call: str, fn, timeout: float, hedge: bool):
+        started = time.monotonic()
+        hedge_delay = self.hedge_delay() if hedge else None
+        if hedge_delay is None or hedge_delay >= timeout:
+            result = await asyncio.wait_for(fn(timeout), timeout)
+        else:
+            result = await self._hedged(call, fn, timeout, hedge_delay)
+        self._observe(call, time.monotonic() - started)
+        return result
+
+    async def _hedged(self, call: str, fn, timeout: float, hedge_delay: float):
+        primary = asyncio.ensure_future(fn(timeout))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        second = asyncio.ensure_future(fn(timeout - hedge_delay))
+        pending = {primary, second}
+        error = None
+        try:
+            remaining = timeout - hedge_delay
+            while pending:
+                started = time.monotonic()
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                remaining -= time.monotonic() - started
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.inc(call=call, winner="hedge" if task is second else "primary")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _next_delay(self, call: str, exc: Exception, retries: int, deadline: float) -> Optional[float]:
+        """Seconds to wait before retrying, or None to give up and re-raise"""
+        if isinstance(exc, CircuitOpenError):
+            return None
+        if not _retryable(exc):
+            # The upstream answered (e.g. 400/401): healthy, but retrying won't help
+            LLM_ATTEMPTS.inc(call=call, outcome="error")
+            self.breaker.record_success()
+            return None
+
+        outcome = "timeout" if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError)) else "retryable_error"
+        LLM_ATTEMPTS.inc(call=call, outcome=outcome)
+        delay = random.uniform(0, min(2.0, self.backoff * 2 ** retries))
+        server_delay = _retry_after_header(exc)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+        if retries >= self.max_retries or time.monotonic() + delay + _MIN_ATTEMPT >= deadline:
+            logger.warning(f"LLM {call} failed after {retries + 1} attempts: {str(exc)}")
+            self.breaker.record_failure()
+            return None
+        logger.info(f"Retrying LLM {call} in {delay:.2f}s after: {str(exc)}")
+        return delay
+
+    def _observe(self, call: str, seconds: float):
+        LLM_ATTEMPTS.inc(call=call, outcome="ok")
+        self._latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Recent p95 attempt latency, once there are enough samples"""
+        if len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return max(self.hedge_min_delay, ordered[int(len(ordered) * 0.95) - 1])
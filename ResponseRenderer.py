@@ -0,0 +1,112 @@
+# ResponseRenderer.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+
+def render_response(structured_data: Dict[str, Any]) -> str:
+    """Turn an AppointmentManager result into a user message without an LLM call"""
+    try:
+        if not isinstance(structured_data, dict):
+            return "Your request has been processed."
+
+        if "error" in structured_data:
+            return _render_error(structured_data)
+
+        status = structured_data.get("status")
+        if status == "conflict":
+            return _render_conflict(structured_data)
+        if "slots" in structured_data:
+            return _render_availability(structured_data)
+        if "cancelled_at" in structured_data:
+            return "Your appointment has been cancelled. Let us know if you'd like to book another time."
+        if "new_time" in structured_data:
+            when = _format_time(structured_data["new_time"], structured_data.get("timezone"))
+            with_whom = _with_worker(structured_data)
+            return f"All set! Your appointment{with_whom} has been moved to {when}."
+        if status == "scheduled" and "start_time" in structured_data:
+            return _render_created(structured_data)
+
+    except Exception as e:
+        logger.error(f"Template rendering failed: {str(e)}")
+
+    return "Your request has been processed. Check details below."
+
+
+def _render_created(data: Dict[str, Any]) -> str:
+    # start_time/end_time are stored as naive UTC
+    timezone = data.get("timezone")
+    start = _parse(data["start_time"], assume_utc=True)
+    when = _format_time(data["start_time"], timezone)
+    minutes = None
+    if data.get("end_time"):
+        minutes = int((_parse(data["end_time"], assume_utc=True) - start).total_seconds() // 60)
+
+    length = f" for {minutes} minutes" if minutes else ""
+    return f"You're booked{_with_worker(data)} on {when}{length}. See you then!"
+
+
+def _render_conflict(data: Dict[str, Any]) -> str:
+    alternatives: List[str] = data.get("alternatives") or []
+    if not alternatives:
+        return ("Sorry, that time isn't available and there are no nearby openings. "
+                "Please try a different day.")
+
+    listed = _join_times([_format_time(slot, data.get("timezone")) for slot in alternatives])
+    return f"Sorry, that time isn't available. The next open slots are {listed}. Would one of those work?"
+
+
+def _render_availability(data: Dict[str, Any], max_listed: int = 5) -> str:
+    who = data.get("worker_name") or "The worker"
+    slots: List[str] = data.get("slots") or []
+    if not slots:
+        return f"{who} has no openings in that period. Please try another day."
+
+    listed = _join_times([_format_time(slot) for slot in slots[:max_listed]])
+    more = f" ({len(slots) - max_listed} more slots available)" if len(slots) > max_listed else ""
+    return f"{who} is available {listed}{more}. Which time works for you?"
+
+
+def _render_error(data: Dict[str, Any]) -> str:
+    error = str(data.get("error", ""))
+    if error == "Unknown intent":
+        return "Sorry, I didn't understand what you'd like to do. You can book, reschedule or cancel an appointment."
+    return "Sorry, something went wrong while processing your request. Please try again."
+
+
+def _join_times(options: List[str]) -> str:
+    """'A, B or C', collapsing to 'Monday, March 3 at 4:00 PM, 4:30 PM or 5:00 PM' on one day"""
+    if len({option.split(" at ")[0] for option in options}) == 1:
+        options = [options[0]] + [option.split(" at ")[1] for option in options[1:]]
+    if len(options) == 1:
+        return options[0]
+    return ", ".join(options[:-1]) + f" or {options[-1]}"
+
+
+def _with_worker(data: Dict[str, Any]) -> str:
+    return f" with {data['worker_name']}" if data.get("worker_name") else ""
+
+
+def _parse(value: Any, assume_utc: bool = False) -> datetime:
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None and assume_utc:
+        parsed = pytz.utc.localize(parsed)
+    return parsed
+
+
+def _format_time(value: Any, timezone: Optional[str] = None) -> str:
+    """'Monday, March 3 at 4:00 PM', in the worker's timezone when known"""
+    moment = _parse(value)
+    suffix = ""
+    if moment.tzinfo is None:
+        # Naive values are stored UTC
+        moment = pytz.utc.localize(moment)
+        suffix = "" if timezone else " UTC"
+    if timezone:
+        moment = moment.astimezone(pytz.timezone(timezone))
+    hour = moment.strftime("%I").lstrip("0")
+    return f"{moment.strftime('%A, %B')} {moment.day} at {hour}:{moment.strftime('%M %p')}{suffix}"
@@ -0,0 +1,123 @@
+# SpeculativeLookup.py
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pytz
+
+from AppointmentManagementLogic import ALTERNATIVES_HORIZON, AppointmentManager
+from FastPathParser import find_date
+from Metrics import REGISTRY, timed
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_TOTAL = REGISTRY.counter(
+    "calendar_speculative_lookup_total",
+    "Speculative worker lookups by outcome (hit: the parsed worker was prefetched)", ("result",)
+)
+
+
+class WorkerNameIndex:
+    """Known worker names, for spotting candidates in raw request text.
+
+    Matches full names as whole words, case-insensitively; that is also how
+    worker lookups match. The list is reloaded from BigQuery every `ttl`
+    seconds, by one caller at a time.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl or float(os.getenv("WORKER_NAMES_TTL", "300"))
+        self._pattern: Optional[re.Pattern] = None
+        self._loaded_at = 0.0
+        self._refreshing = threading.Lock()
+
+    def stale(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def refresh(self, manager: AppointmentManager):
+        if not self._refreshing.acquire(blocking=False):
+            return  # another request is reloading; keep using the current list
+        try:
+            names = {n.strip().lower() for n in manager._list_all_worker_names() if n}
+            alternatives = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+            self._pattern = re.compile(rf"\b(?:{alternatives})\b") if names else None
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refreshing.release()
+
+    def find(self, natural_language: str) -> List[str]:
+        """Full names of workers mentioned in the text, in order of appearance"""
+        pattern = self._pattern
+        if pattern is None:
+            return []
+        found = []
+        for match in pattern.finditer(re.sub(r"\s+", " ", natural_language.lower())):
+            if match.group(0) not in found:
+                found.append(match.group(0))
+        return found
+
+
+@timed("speculative_lookup")
+def speculate(manager: AppointmentManager, index: WorkerNameIndex, natural_language: str) -> List[str]:
+    """Prefetch workers named in the text, and their busy intervals for the day it mentions.
+
+    Runs while the request is still being parsed. `manager` must carry
+    request-scoped caches (for_batch), which later lookups read from.
+    """
+    if index.stale():
+        index.refresh(manager)
+    names = index.find(natural_language)
+    if not names:
+        return []
+
+    workers = manager.prefetch_workers(names)
+    bounds, worker_ids = [], []
+    for worker in workers.values():
+        if worker['worker_id'] in worker_ids:
+            continue  # cached under both name and id
+        tz = pytz.timezone(worker['timezone'])
+        day = find_date(natural_language, datetime.now(tz).date())
+        if day is None:
+            continue
+        start = tz.localize(datetime.combine(day, datetime.min.time()))
+        bounds.extend([start, start + timedelta(days=1) + ALTERNATIVES_HORIZON])
+        worker_ids.append(worker['worker_id'])
+
+    if worker_ids:
+        manager.prefetch_busy_intervals(worker_ids, min(bounds), max(bounds))
+    return names
+
+
+def start_speculation(async_manager, index: WorkerNameIndex, natural_language: str) -> asyncio.Task:
+    """Run `speculate` on the read executor in the background"""
+    task = asyncio.create_task(
+        async_manager.run_read(speculate, async_manager.manager, index, natural_language)
+    )
+    # Abandoned tasks must not log "exception was never retrieved"
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+
+async def finish_speculation(task: asyncio.Task, parsed) -> None:
+    """Wait for the prefetch (usually already done) and record whether it was useful"""
+    try:
+        names = await task
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        SPECULATION_TOTAL.inc(result="error")
+        logger.warning(f"Speculative lookup failed: {str(e)}")
+        return
+
+    worker_name = getattr(parsed, "worker_name", None)
+    if not names:
+        SPECULATION_TOTAL.inc(result="no_candidate")
+    elif worker_name and worker_name.strip().lower() in names:
+        SPECULATION_TOTAL.inc(result="hit")
+    else:
+        SPECULATION_TOTAL.inc(result="miss")
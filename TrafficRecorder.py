@@ -0,0 +1,373 @@
+# TrafficRecorder.py
+"""Record LLM and BigQuery traffic to a compact log, and replay it offline.
+
+The log is gzip-compressed JSON Lines, one record per call:
+
+    {"t": 12.345, "rid": "a1b2", "k": "bq.query", "in": {...}, "out": {...}, "ms": 41.2}
+
+`t` is seconds since recording started, `rid` groups the calls of one HTTP
+request and `k` is one of http, llm.parse, llm.response, llm.stream,
+bq.query, bq.insert. Recording is switched on with RECORD_TRAFFIC=<path>
+(RECORD_SAMPLE sets the share of requests captured); replay.py reads the log
+back through ReplayLLMBackend and ReplayBigQueryClient.
+"""
+import asyncio
+import contextvars
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from google.cloud.bigquery import Row
+
+from CoreDatamodels import ParsedRequest
+from Metrics import REGISTRY
+from QueryStream import iter_pages, iter_rows
+
+logger = logging.getLogger(__name__)
+
+REPLAY_LOOKUPS = REGISTRY.counter(
+    "calendar_replay_lookups_total", "Replayed calls by kind and how they were matched", ("kind", "match")
+)
+
+
+class ReplayMiss(LookupError):
+    """A replayed call has no recording to answer it"""
+
+
+# Id of the HTTP request being recorded; None when this request is not sampled
+_recording_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("recording_id", default=None)
+
+
+def _encode(value: Any) -> Any:
+    """JSON-safe form of BigQuery/pydantic values; datetimes are tagged"""
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$d" in value:
+            return date.fromisoformat(value["$d"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _encode_parse_result(result: Union[ParsedRequest, dict]) -> dict:
+    if isinstance(result, ParsedRequest):
+        return {"parsed": result.model_dump(mode="json", exclude_none=True)}
+    return {"error": _encode(result)}
+
+
+def _decode_parse_result(out: dict) -> Union[ParsedRequest, dict]:
+    if "parsed" in out:
+        fields = dict(out["parsed"])
+        if fields.get("datetime"):
+            fields["datetime"] = datetime.fromisoformat(fields["datetime"])
+        # Recorded values were validated when captured; they may be in the past now
+        return ParsedRequest.model_construct(**fields)
+    return _decode(out["error"])
+
+
+def query_key(sql: str, job_config=None) -> Tuple[str, str]:
+    """(normalised SQL, serialised parameters), used to match replayed queries"""
+    params = []
+    for p in getattr(job_config, "query_parameters", None) or []:
+        value = p.values if hasattr(p, "values") else p.value
+        params.append([p.name, _encode(value)])
+    return " ".join(sql.split()), json.dumps(sorted(params), separators=(",", ":"), default=str)
+
+
+class TrafficRecorder:
+    """Thread-safe writer of the gzip JSON Lines log"""
+
+    def __init__(self, path: str, sample: float = 1.0):
+        self.path = path.format(pid=os.getpid())
+        self.sample = sample
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        logger.info(f"Recording traffic to {self.path} (sample={sample})")
+
+    @classmethod
+    def from_env(cls) -> Optional['TrafficRecorder']:
+        path = os.getenv("RECORD_TRAFFIC")
+        return cls(path, float(os.getenv("RECORD_SAMPLE", "1"))) if path else None
+
+    def start_request(self, path: str, body: dict) -> Optional[str]:
+        """Decide whether to record this HTTP request; log it and tag the context if so"""
+        if random.random() >= self.sample:
+            return None
+        request_id = uuid.uuid4().hex[:12]
+        _recording_id.set(request_id)
+        self.write("http", {"path": path, "body": _encode(body)}, None, 0.0, request_id)
+        return request_id
+
+    @staticmethod
+    def active() -> bool:
+        return _recording_id.get() is not None
+
+    def write(self, kind: str, inputs: Any, outputs: Any, seconds: float, request_id: Optional[str] = None):
+        record = {
+            "t": round(time.monotonic() - self._started - seconds, 4),
+            "rid": request_id or _recording_id.get(),
+            "k": kind,
+            "in": inputs,
+            "out": outputs,
+            "ms": round(seconds * 1000, 2),
+        }
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingLLMBackend:
+    """LLMBackend wrapper that logs calls of sampled requests"""
+
+    def __init__(self, backend, recorder: TrafficRecorder):
+        self.backend = backend
+        self.recorder = recorder
+
+    async def parse_request(self, natural_language: str, user_id: str):
+        started = time.monotonic()
+        result = await self.backend.parse_request(natural_language, user_id)
+        if self.recorder.active():
+            self.recorder.write("llm.parse", {"text": natural_language, "user_id": user_id},
+                                _encode_parse_result(result), time.monotonic() - started)
+        return result
+
+    async def generate_response(self, structured_data: dict) -> str:
+        started = time.monotonic()
+        text = await self.backend.generate_response(structured_data)
+        if self.recorder.active():
+            self.recorder.write("llm.response", _encode(structured_data), text, time.monotonic() - started)
+        return text
+
+    async def stream_response(self, structured_data: dict) -> AsyncIterator[str]:
+        started = last = time.monotonic()
+        chunks = []  # [text, seconds since the previous chunk]
+        async for chunk in self.backend.stream_response(structured_data):
+            now = time.monotonic()
+            chunks.append([chunk, round(now - last, 4)])
+            last = now
+            yield chunk
+        if self.recorder.active():
+            self.recorder.write("llm.stream", _encode(structured_data), chunks, time.monotonic() - started)
+
+    async def warm_up(self):
+        await self.backend.warm_up()
+
+    async def close(self):
+        await self.backend.close()
+
+
+class RecordedJob:
+    """Materialised query result; quacks like the QueryJob parts the app uses"""
+
+    def __init__(self, columns: List[str], rows: List[list]):
+        self._index = {name: i for i, name in enumerate(columns)}
+        self._rows = rows
+
+    def result(self, **kwargs) -> Iterator[Row]:
+        return iter([Row(values, self._index) for values in self._rows])
+
+    def __iter__(self):
+        return self.result()
+
+
+class RecordingBigQueryClient:
+    """BigQueryClient wrapper that logs statements, parameters, results and latency"""
+
+    def __init__(self, client, recorder: TrafficRecorder):
+        self.client = client
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def query(self, query: str, job_config=None):
+        if not self.recorder.active():
+            return self.client.query(query, job_config=job_config)
+        started = time.monotonic()
+        job = self.client.query(query, job_config=job_config)
+        rows = [dict(row) for row in job.result()]
+        columns = list(rows[0]) if rows else []
+        sql, params = query_key(query, job_config)
+        self.recorder.write("bq.query", {"sql": sql, "params": params},
+                            {"cols": columns, "rows": [_encode(list(r.values())) for r in rows]},
+                            time.monotonic() - started)
+        recorded = RecordedJob(columns, [list(r.values()) for r in rows])
+        # Keep the job statistics for per-query accounting (see QueryRegistry)
+        for stat in ("cache_hit", "total_bytes_processed", "slot_millis"):
+            setattr(recorded, stat, getattr(job, stat, None))
+        return recorded
+
+    def query_pages(self, query: str, job_config=None, page_size: Optional[int] = None,
+                    max_rows: Optional[int] = None):
+        return iter_pages(self.query(query, job_config=job_config), page_size, max_rows)
+
+    def iter_query(self, query: str, job_config=None, page_size: Optional[int] = None,
+                   max_rows: Optional[int] = None):
+        return iter_rows(self.query(query, job_config=job_config), page_size, max_rows)
+
+    def insert_data(self, table_name: str, data: List[Dict[str, Any]]):
+        return self._insert("insert_data", table_name, data)
+
+    def insert_rows_json(self, table_id: str, rows: list, row_ids: Optional[list] = None) -> list:
+        return self._insert("insert_rows_json", table_id, rows, row_ids)
+
+    def _insert(self, method: str, table: str, rows: list, *args):
+        started = time.monotonic()
+        result = getattr(self.client, method)(table, rows, *args)
+        if self.recorder.active():
+            self.recorder.write("bq.insert", {"table": table, "rows": len(rows)}, None, time.monotonic() - started)
+        return result
+
+
+class TrafficLog:
+    """A recorded log, indexed for replay"""
+
+    def __init__(self, path: str):
+        self.requests: List[dict] = []  # http records, in arrival order
+        self._calls: Dict[str, Dict[Any, deque]] = defaultdict(lambda: defaultdict(deque))
+        self._lock = threading.Lock()
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(json.loads(line))
+        self.requests.sort(key=lambda r: r["t"])
+
+    def _add(self, record: dict):
+        kind, inputs = record["k"], record["in"]
+        if kind == "http":
+            self.requests.append(record)
+        elif kind == "llm.parse":
+            self._calls[kind][(inputs["text"], inputs["user_id"])].append(record)
+        elif kind in ("llm.response", "llm.stream"):
+            self._calls[kind][json.dumps(inputs, sort_keys=True)].append(record)
+            self._calls[kind][None].append(record)
+        elif kind == "bq.query":
+            self._calls[kind][(inputs["sql"], inputs["params"])].append(record)
+            self._calls[kind][inputs["sql"]].append(record)
+        elif kind == "bq.insert":
+            self._calls[kind][inputs["table"]].append(record)
+
+    def take(self, kind: str, *keys) -> Optional[dict]:
+        """Next recorded call for the first key that has one: the exact inputs, then a fallback key"""
+        with self._lock:
+            for match, key in zip(("exact", "fallback"), keys):
+                queue = self._calls[kind].get(key)
+                if queue:
+                    record = queue.popleft()
+                    queue.append(record)  # cycle, so repeated replays keep working
+                    REPLAY_LOOKUPS.inc(kind=kind, match=match)
+                    return record
+        REPLAY_LOOKUPS.inc(kind=kind, match="miss")
+        return None
+
+
+class ReplayLLMBackend:
+    """LLMBackend that answers from a TrafficLog with the recorded latencies"""
+
+    def __init__(self, log: TrafficLog, speed: float = 1.0):
+        self.log = log
+        self.speed = speed
+
+    async def parse_request(self, natural_language: str, user_id: str):
+        record = self.log.take("llm.parse", (natural_language, user_id))
+        if record is None:
+            return {"error": "Validation failed", "details": "request not in the replay log"}
+        await asyncio.sleep(record["ms"] / 1000 / self.speed)
+        return _decode_parse_result(record["out"])
+
+    async def generate_response(self, structured_data: dict) -> str:
+        record = self.log.take("llm.response", json.dumps(_encode(structured_data), sort_keys=True), None)
+        if record is None:
+            from ResponseRenderer import render_response
+            return render_response(structured_data)
+        await asyncio.sleep(record["ms"] / 1000 / self.speed)
+        return record["out"]
+
+    async def stream_response(self, structured_data: dict) -> AsyncIterator[str]:
+        record = self.log.take("llm.stream", json.dumps(_encode(structured_data), sort_keys=True), None)
+        if record is None:
+            from ResponseRenderer import render_response
+            yield render_response(structured_data)
+            return
+        for text, delay in record["out"]:
+            await asyncio.sleep(delay / self.speed)
+            yield text
+
+    async def warm_up(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class ReplayBigQueryClient:
+    """BigQueryClient stand-in that answers from a TrafficLog, sleeping the recorded latency"""
+
+    def __init__(self, log: TrafficLog, speed: float = 1.0, default_latency: float = 0.05):
+        self.log = log
+        self.speed = speed
+        self.default_latency = default_latency
+
+    def query(self, query: str, job_config=None) -> RecordedJob:
+        sql, params = query_key(query, job_config)
+        record = self.log.take("bq.query", (sql, params), sql)
+        if record is None:
+            # Fail like BigQuery would rather than invent rows the caller may rely on
+            time.sleep(self.default_latency / self.speed)
+            raise ReplayMiss(f"Query not in the replay log: {sql[:200]}")
+        time.sleep(record["ms"] / 1000 / self.speed)
+        out = record["out"]
+        return RecordedJob(out["cols"], [_decode(row) for row in out["rows"]])
+
+    def query_pages(self, query: str, job_config=None, page_size: Optional[int] = None,
+                    max_rows: Optional[int] = None):
+        return iter_pages(self.query(query, job_config=job_config), page_size, max_rows)
+
+    def iter_query(self, query: str, job_config=None, page_size: Optional[int] = None,
+                   max_rows: Optional[int] = None):
+        return iter_rows(self.query(query, job_config=job_config), page_size, max_rows)
+
+    def insert_data(self, table_name: str, data: List[Dict[str, Any]]):
+        self._insert(table_name)
+
+    def insert_rows_json(self, table_id: str, rows: list, row_ids: Optional[list] = None) -> list:
+        self._insert(table_id)
+        return []
+
+    def _insert(self, table: str):
+        record = self.log.take("bq.insert", table)
+        time.sleep((record["ms"] / 1000 if record else self.default_latency) / self.speed)
+
+    def close(self):
+        pass
@@ -0,0 +1,153 @@
+# WorkerDirectory.py
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from Metrics import REGISTRY
+from QueryRegistry import QUERIES
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_LOOKUPS = REGISTRY.counter(
+    "calendar_worker_directory_lookups_total",
+    "Worker directory lookups by index and result (miss: not in memory, asked BigQuery)", ("index", "result")
+)
+DIRECTORY_REFRESHES = REGISTRY.counter(
+    "calendar_worker_directory_refreshes_total", "Full reloads of the worker directory by outcome", ("outcome",)
+)
+DIRECTORY_SIZE = REGISTRY.gauge("calendar_worker_directory_workers", "Workers held in the worker directory")
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_hours(start: str, end: str) -> Tuple[int, int, int, int]:
+    start_hour, start_minute = map(int, start.split(':'))
+    end_hour, end_minute = map(int, end.split(':'))
+    return start_hour, start_minute, end_hour, end_minute
+
+
+def working_hours(worker: Dict) -> Tuple[int, int, int, int]:
+    """(start_hour, start_minute, end_hour, end_minute) of a worker's local working day"""
+    return _parse_hours(worker['working_hours']['start'], worker['working_hours']['end'])
+
+
+class _Indexes:
+    """One immutable generation of the directory; readers never see a half-built one"""
+
+    def __init__(self, workers: List[Dict]):
+        self.by_id: Dict[str, Dict] = {}
+        self.by_name: Dict[str, Dict] = {}
+        self.by_role: Dict[str, List[Dict]] = {}
+        for worker in workers:
+            self.by_id[worker['worker_id']] = worker
+            self.by_name.setdefault(worker['name'].strip().casefold(), worker)
+            self.by_role.setdefault((worker.get('role') or "").strip().casefold(), []).append(worker)
+            working_hours(worker)  # parse once, at load
+        self.names = [worker['name'] for worker in workers]
+
+
+class WorkerDirectory:
+    """Process-local copy of `calendar_system.workers`, indexed by id, name and role.
+
+    Loaded in full on first use, then reloaded in the background every `ttl`
+    seconds while the current copy keeps serving (the table has no change
+    timestamp to load deltas by). A worker missing from memory, e.g. one
+    added since the last reload, is fetched by a point query and merged in;
+    repeated misses for the same key are answered from memory for
+    `miss_ttl` seconds. If the initial load fails, `ready()` is False and
+    callers fall back to their own queries.
+    """
+
+    def __init__(self, bq_client, ttl: Optional[float] = None, miss_ttl: Optional[float] = None):
+        self.bq_client = bq_client
+        self.ttl = ttl or float(os.getenv("WORKER_DIRECTORY_TTL", "300"))
+        self.miss_ttl = miss_ttl or float(os.getenv("WORKER_DIRECTORY_MISS_TTL", "30"))
+        self._indexes: Optional[_Indexes] = None
+        self._loaded_at = 0.0
+        self._failed_at: Optional[float] = None
+        self._misses: Dict[Tuple[str, str], float] = {}
+        self._load_lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._merge_lock = threading.Lock()
+
+    def ready(self) -> bool:
+        """Loaded (loading now if needed) and usable; schedules a reload when stale"""
+        if self._indexes is None:
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.miss_ttl:
+                return False
+            with self._load_lock:
+                if self._indexes is None:
+                    try:
+                        self._reload()
+                    except Exception as e:
+                        logger.error(f"Worker directory load failed: {str(e)}")
+                        DIRECTORY_REFRESHES.inc(outcome="error")
+                        self._failed_at = time.monotonic()
+                        return False
+        elif time.monotonic() - self._loaded_at > self.ttl and self._refreshing.acquire(blocking=False):
+            threading.Thread(target=self._background_reload, name="worker-directory", daemon=True).start()
+        return True
+
+    def by_id(self, worker_id: str) -> Optional[Dict]:
+        worker = self._indexes.by_id.get(worker_id)
+        if worker is not None:
+            DIRECTORY_LOOKUPS.inc(index="id", result="hit")
+            return worker
+        return self._fetch_missing("id", worker_id, "worker_by_id", worker_id=worker_id)
+
+    def by_name(self, worker_name: str) -> Optional[Dict]:
+        key = worker_name.strip().casefold()
+        worker = self._indexes.by_name.get(key)
+        if worker is not None:
+            DIRECTORY_LOOKUPS.inc(index="name", result="hit")
+            return worker
+        return self._fetch_missing("name", key, "worker_by_name", worker_name=key)
+
+    def by_role(self, role: str) -> List[Dict]:
+        DIRECTORY_LOOKUPS.inc(index="role", result="hit")
+        return list(self._indexes.by_role.get(role.strip().casefold(), []))
+
+    def names(self) -> List[str]:
+        return list(self._indexes.names)
+
+    def _fetch_missing(self, index: str, key: str, query: str, **params) -> Optional[Dict]:
+        missed_at = self._misses.get((index, key))
+        if missed_at is not None and time.monotonic() - missed_at < self.miss_ttl:
+            DIRECTORY_LOOKUPS.inc(index=index, result="known_missing")
+            return None
+
+        DIRECTORY_LOOKUPS.inc(index=index, result="miss")
+        worker = QUERIES.first(self.bq_client, query, **params)
+        if worker is None:
+            self._misses[(index, key)] = time.monotonic()
+            return None
+        with self._merge_lock:
+            current = self._indexes
+            merged = [w for w in current.by_id.values() if w['worker_id'] != worker['worker_id']]
+            self._indexes = _Indexes(merged + [worker])
+        DIRECTORY_SIZE.set(len(self._indexes.by_id))
+        return worker
+
+    def _background_reload(self):
+        try:
+            self._reload()
+        except Exception as e:
+            # Keep serving the previous copy and try again in 30 seconds
+            logger.error(f"Worker directory refresh failed: {str(e)}")
+            DIRECTORY_REFRESHES.inc(outcome="error")
+            self._loaded_at = time.monotonic() - self.ttl + min(self.ttl, 30)
+        finally:
+            self._refreshing.release()
+
+    def _reload(self):
+        started = time.perf_counter()
+        indexes = _Indexes(QUERIES.rows(self.bq_client, "workers_all"))
+        with self._merge_lock:
+            self._indexes = indexes
+            self._misses = {}
+        self._loaded_at = time.monotonic()
+        DIRECTORY_SIZE.set(len(indexes.by_id))
+        DIRECTORY_REFRESHES.inc(outcome="ok")
+        logger.info(f"Worker directory loaded {len(indexes.by_id)} workers in {time.perf_counter() - started:.2f}s")
@@ -1,24 +1,58 @@
 # api.py
 import os
+import json
+import time
+import asyncio
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, ValidationError
+from datetime import datetime as DateTime  # for fields named `datetime`
+from typing import Optional, Dict, Any, List, Tuple
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel, ValidationError, field_validator
 from dotenv import load_dotenv
 
 # Import your custom modules
-from ChatGPTIntegration import ChatGPTAdapter
-from BigQueryIntergration import BigQueryClient
+from ChatGPTIntegration import LLM_UNAVAILABLE
 from CoreDatamodels import ParsedRequest, Appointment
-from AppointmentManagementLogic import AppointmentManager
+from AppointmentManagementLogic import appointment_cursor, parse_appointment_cursor
+from ClientRegistry import registry
+from QueryRegistry import QUERIES
+from ResponseRenderer import render_response
+from AdmissionControl import AdmissionRejected
+from SpeculativeLookup import start_speculation, finish_speculation
+from Metrics import (
+    REGISTRY, PROMETHEUS_CONTENT_TYPE, REQUEST_LATENCY, REQUEST_TOTAL,
+    stage, set_intent, start_request_timings, server_timing_header
+)
 
 # Initialize logging
 logger = logging.getLogger(__name__)
 load_dotenv()
 
 app = FastAPI(title="Calendar RAG System", version="1.0.0")
+# Readiness: set once warm-up succeeds, cleared when the worker starts draining
+app.state.ready = False
+app.state.draining = False
+
+# Seconds between warm-up attempts when the first one fails
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "10"))
+
+async def _warm_up() -> bool:
+    try:
+        await registry.warm_up()
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}")
+        return False
+    app.state.ready = not app.state.draining
+    return True
+
+async def _retry_warm_up():
+    while not app.state.draining:
+        await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+        if await _warm_up():
+            return
 
 # Configure logging on startup
 @app.on_event("startup")
@@ -28,18 +62,123 @@ async def startup_event():
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
-    logger.info("Application startup completed")
+    # Warm clients, credentials and connections before this worker accepts
+    # traffic; on failure keep serving as not-ready and retry in the background
+    if not await _warm_up():
+        app.state.warm_up_task = asyncio.create_task(_retry_warm_up())
+    logger.info(f"Application startup completed (ready={app.state.ready})")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.ready = False
+    app.state.draining = True
+    await registry.aclose()
+    logger.info("Application shutdown completed")
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Per-request latency metrics and a Server-Timing header with stage timings"""
+    timings = start_request_timings()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, intent=timings.intent, outcome=str(status_code))
+        REQUEST_TOTAL.inc(endpoint=endpoint, intent=timings.intent, outcome=str(status_code))
+
+    # Streaming responses send headers before their stages run
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed * 1000)
+    return response
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Shed load quickly instead of queueing behind a saturated upstream"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={
+            "text": "The service is busy right now, please try again shortly",
+            "structured_data": {"error": str(exc), "upstream": exc.limiter, "reason": exc.reason},
+            "status_code": exc.status_code
+        }
+    )
+
+# Liveness: the event loop is responding
+@app.get("/health/live", tags=["Health Check"])
+async def liveness():
+    return {"status": "alive"}
+
+# Readiness: warmed up and not draining
+@app.get("/health/ready", tags=["Health Check"])
+async def readiness():
+    if app.state.ready and not app.state.draining:
+        return {"status": "ready"}
+    status = "draining" if app.state.draining else "warming_up"
+    return JSONResponse(status_code=503, content={"status": status})
+
+# Prometheus scrape endpoint
+@app.get("/metrics", tags=["Health Check"])
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/metrics/queries", tags=["Health Check"])
+async def query_stats():
+    """Per named BigQuery statement: calls, mean latency, bytes processed, slot-ms and cache-hit ratio"""
+    return QUERIES.stats()
 
 # Request/Response models
 class ChatRequest(BaseModel):
     text: str
     user_id: str
+    polish: Optional[bool] = None  # Rephrase the reply with the LLM (defaults to RESPONSE_MODE)
 
 class ChatResponse(BaseModel):
     text: str
     structured_data: Dict[str, Any]
     status_code: int = 200
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+
+class BatchChatResult(ChatResponse):
+    index: int
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+    stats: Dict[str, Any]
+
+# Structured REST models (ParsedRequest fields without the LLM)
+def _local_time(value: DateTime) -> DateTime:
+    if value.tzinfo is not None:
+        raise ValueError("datetime is the worker's local time and must not carry a timezone offset")
+    return value
+
+class AppointmentCreateRequest(BaseModel):
+    user_id: str
+    worker_name: str
+    datetime: DateTime  # worker's local time
+    duration: Optional[int] = None
+
+    _local_datetime = field_validator('datetime')(_local_time)
+
+class AppointmentRescheduleRequest(BaseModel):
+    user_id: str
+    datetime: DateTime  # worker's local time
+    duration: Optional[int] = None
+
+    _local_datetime = field_validator('datetime')(_local_time)
+
+# Max LLM calls in flight for a single batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# "template" renders replies locally; "llm" polishes them with a second LLM call
+RESPONSE_MODE = os.getenv("RESPONSE_MODE", "template")
+
 # Root endpoint
 @app.get("/", tags=["Health Check"])
 async def root():
@@ -51,33 +190,104 @@ async def root():
         }
     }
 
+async def _dispatch_intent(manager, request: ParsedRequest) -> Dict[str, Any]:
+    """Route a parsed request to the matching AppointmentManager method"""
+    intent = request.intent
+
+    if intent == 'create_appointment':
+        return await manager.create_appointment(request)
+    elif intent == 'cancel_appointment':
+        return await manager.cancel_appointment(request)
+    elif intent == 'reschedule_appointment':
+        return await manager.reschedule_appointment(request)
+    elif intent == 'get_availability':
+        return await manager.get_availability(request)
+    return {"error": "Unknown intent"}
+
+async def _parse(gpt_adapter, manager, text: str, user_id: str):
+    """Rule-based fast path first; the LLM only when it is not confident"""
+    parsed = await registry.fast_path.parse(text, user_id, manager.worker_timezone)
+    if parsed is not None:
+        return parsed
+    started = time.perf_counter()
+    parsed = await gpt_adapter.parse_request(text, user_id)
+    if isinstance(parsed, ParsedRequest):
+        registry.fast_path.observe_llm_parse(time.perf_counter() - started)
+    elif parsed.get("error") == LLM_UNAVAILABLE:
+        # Degraded mode while OpenAI is unhealthy: a known booking or availability phrasing anywhere in
+        # the text; cancels and reschedules get the 503
+        fallback = await registry.fast_path.parse(text, user_id, manager.worker_timezone, lenient=True)
+        if fallback is not None:
+            return fallback
+    return parsed
+
+def _parse_failure(parsed_data: Dict[str, Any]) -> Tuple[str, int]:
+    """User-facing text and status code for a failed parse"""
+    if parsed_data.get("error") == LLM_UNAVAILABLE:
+        return "The assistant is temporarily unavailable, please try again shortly", 503
+    return "Could not understand request", 400
+
+async def _parse_speculatively(gpt_adapter, manager, text: str, user_id: str):
+    """Parse while workers named in the text are prefetched into `manager`'s request-scoped caches"""
+    speculation = start_speculation(manager, registry.worker_names, text)
+    try:
+        with stage("parse"):
+            parsed = await _parse(gpt_adapter, manager, text, user_id)
+    except BaseException:
+        speculation.cancel()
+        raise
+    await finish_speculation(speculation, parsed)
+    return parsed
+
+def _record_request(path: str, body: BaseModel):
+    """Log the request for replay when traffic recording is on (RECORD_TRAFFIC)"""
+    if registry.recorder is not None:
+        registry.recorder.start_request(path, body.model_dump(mode="json"))
+
+def _wants_polish(request: ChatRequest) -> bool:
+    return request.polish if request.polish is not None else RESPONSE_MODE == "llm"
+
+async def _render_reply(gpt_adapter, result: Dict[str, Any], polish: bool) -> str:
+    """Template reply by default, LLM-polished reply when requested"""
+    with stage("response"):
+        if polish:
+            return await gpt_adapter.generate_response(result)
+        return render_response(result)
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 # Main chat endpoint
 @app.post("/api/chat", response_model=ChatResponse)
 async def handle_chat(request: ChatRequest):
+    _record_request("/api/chat", request)
     try:
         logger.info(f"Processing request from user {request.user_id}")
         
         # Initialize components
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if not openai_key:
+        if not registry.llm_configured():
             raise HTTPException(status_code=500, detail="OpenAI API key not configured")
 
-        gpt_adapter = ChatGPTAdapter(openai_key)
-        bq_client = BigQueryClient()
-        manager = AppointmentManager(bq_client)
+        # Shared, process-wide async clients (see ClientRegistry); nothing
+        # below blocks the event loop
+        gpt_adapter = registry.llm_backend
+        # Request-scoped caches, filled by the speculative lookup during parsing
+        manager = registry.async_appointment_manager.for_batch()
 
         # Step 1: Parse natural language request
-        parsed_data = gpt_adapter.parse_request(request.text,request.user_id)
+        parsed_data = await _parse_speculatively(gpt_adapter, manager, request.text, request.user_id)
         
         # Handle parsing errors
         if isinstance(parsed_data, dict) and "error" in parsed_data:
             logger.error(f"Parsing failed: {parsed_data.get('details', 'Unknown error')}")
+            text, status_code = _parse_failure(parsed_data)
             return JSONResponse(
-                status_code=400,
+                status_code=status_code,
                 content={
-                    "text": "Could not understand request",
+                    "text": text,
                     "structured_data": parsed_data,
-                    "status_code": 400
+                    "status_code": status_code
                 }
             )
 
@@ -97,30 +307,19 @@ async def handle_chat(request: ChatRequest):
         #     )
 
         # Step 3: Process appointment
-        result = None
-        intent = validated_request.intent
-        
-        if intent == 'create_appointment':
-            result = manager.create_appointment(validated_request)
-        elif intent == 'cancel_appointment':
-            result = manager.cancel_appointment(validated_request)
-        elif intent == 'reschedule_appointment':
-            result = manager.reschedule_appointment(validated_request)
-        elif intent == 'get_availability':
-            result = manager.get_availability(validated_request)
-        else:
-            result = {"error": "Unknown intent"}
-            
+        set_intent(validated_request.intent)
+        result = await _dispatch_intent(manager, validated_request)
+
 
         # Step 4: Generate response
         return {
-            "text": gpt_adapter.generate_response(result),
+            "text": await _render_reply(gpt_adapter, result, _wants_polish(request)),
             "structured_data": result,
             "status_code": 200
         }
 
-    except HTTPException as he:
-        raise he
+    except (HTTPException, AdmissionRejected):
+        raise
     except Exception as e:
         logger.exception(f"Unexpected error: {str(e)}")
         return JSONResponse(
@@ -132,6 +331,251 @@ async def handle_chat(request: ChatRequest):
             }
         )
 
+# Streaming chat endpoint
+@app.post("/api/chat/stream")
+async def handle_chat_stream(request: ChatRequest):
+    """Same pipeline as /api/chat, delivered as server-sent events.
+
+    Emits `structured_data` as soon as the appointment work is done, then the
+    reply as `token` events (one per streamed chunk when polishing with the
+    LLM, a single event for the template reply) and a final `done` event.
+    """
+    if not registry.llm_configured():
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+
+    _record_request("/api/chat/stream", request)
+    gpt_adapter = registry.llm_backend
+    manager = registry.async_appointment_manager.for_batch()
+
+    async def events():
+        try:
+            logger.info(f"Processing streaming request from user {request.user_id}")
+            parsed_data = await _parse_speculatively(gpt_adapter, manager, request.text, request.user_id)
+
+            if isinstance(parsed_data, dict) and "error" in parsed_data:
+                logger.error(f"Parsing failed: {parsed_data.get('details', 'Unknown error')}")
+                text, status_code = _parse_failure(parsed_data)
+                yield _sse_event("error", {
+                    "text": text,
+                    "structured_data": parsed_data,
+                    "status_code": status_code
+                })
+                return
+
+            set_intent(parsed_data.intent)
+            result = await _dispatch_intent(manager, parsed_data)
+            yield _sse_event("structured_data", result)
+
+            if _wants_polish(request):
+                async for token in gpt_adapter.stream_response(result):
+                    yield _sse_event("token", {"text": token})
+            else:
+                yield _sse_event("token", {"text": render_response(result)})
+            yield _sse_event("done", {"status_code": 200})
+
+        except AdmissionRejected as e:
+            yield _sse_event("error", {
+                "text": "The service is busy right now, please try again shortly",
+                "structured_data": {"error": str(e), "retry_after": e.retry_after},
+                "status_code": e.status_code
+            })
+        except Exception as e:
+            logger.exception(f"Unexpected error: {str(e)}")
+            yield _sse_event("error", {
+                "text": "An unexpected error occurred",
+                "structured_data": {"error": str(e)},
+                "status_code": 500
+            })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _rejected_item(index: int, exc: AdmissionRejected) -> Dict[str, Any]:
+    return {"index": index, "text": "The service is busy right now, please try again shortly",
+            "structured_data": {"error": str(exc), "retry_after": exc.retry_after},
+            "status_code": exc.status_code}
+
+# Batch chat endpoint
+@app.post("/api/chat/batch", response_model=BatchChatResponse)
+async def handle_chat_batch(batch: BatchChatRequest):
+    """Process many chat requests concurrently.
+
+    Requests are parsed concurrently (at most BATCH_CONCURRENCY LLM calls in
+    flight), workers and their busy intervals are loaded once for the whole
+    batch, and requests for the same worker are processed in order so that
+    they see each other's bookings. Each item carries its own status/error.
+    """
+    if not registry.llm_configured():
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+
+    started = time.perf_counter()
+    set_intent("batch")
+    _record_request("/api/chat/batch", batch)
+    gpt_adapter = registry.llm_backend
+    manager = registry.async_appointment_manager.for_batch()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(batch.requests)
+
+    async def parse(item: ChatRequest):
+        async with semaphore:
+            with stage("parse"):
+                return await _parse(gpt_adapter, manager, item.text, item.user_id)
+
+    # Step 1: Parse everything concurrently
+    parsed = await asyncio.gather(*(parse(item) for item in batch.requests), return_exceptions=True)
+
+    valid: Dict[int, ParsedRequest] = {}
+    for index, parsed_data in enumerate(parsed):
+        if isinstance(parsed_data, AdmissionRejected):
+            results[index] = _rejected_item(index, parsed_data)
+        elif isinstance(parsed_data, Exception):
+            results[index] = {"index": index, "text": "An unexpected error occurred",
+                              "structured_data": {"error": str(parsed_data)}, "status_code": 500}
+        elif isinstance(parsed_data, dict) and "error" in parsed_data:
+            text, status_code = _parse_failure(parsed_data)
+            results[index] = {"index": index, "text": text,
+                              "structured_data": parsed_data, "status_code": status_code}
+        else:
+            valid[index] = parsed_data
+
+    # Step 2: Shared worker lookups and availability data for the whole batch
+    try:
+        await manager.prefetch_for(list(valid.values()))
+    except Exception as e:
+        logger.error(f"Batch prefetch failed, falling back to per-item queries: {str(e)}")
+
+    # Step 3: Same-worker requests run in order, groups run concurrently
+    groups: Dict[str, List[int]] = {}
+    for index, parsed_request in valid.items():
+        key = parsed_request.worker_name.strip().lower() if parsed_request.worker_name else f"#{index}"
+        groups.setdefault(key, []).append(index)
+
+    processed: Dict[int, Dict[str, Any]] = {}
+
+    async def process_group(indexes: List[int]):
+        for index in indexes:
+            try:
+                processed[index] = await _dispatch_intent(manager, valid[index])
+            except AdmissionRejected as e:
+                results[index] = _rejected_item(index, e)
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {str(e)}")
+                results[index] = {"index": index, "text": "An unexpected error occurred",
+                                  "structured_data": {"error": str(e)}, "status_code": 500}
+
+    await asyncio.gather(*(process_group(indexes) for indexes in groups.values()))
+
+    # Step 4: Generate responses concurrently
+    async def respond(index: int, result: Dict[str, Any]):
+        if _wants_polish(batch.requests[index]):
+            async with semaphore:
+                text = await gpt_adapter.generate_response(result)
+        else:
+            text = render_response(result)
+        results[index] = {"index": index, "text": text, "structured_data": result, "status_code": 200}
+
+    await asyncio.gather(*(respond(index, result) for index, result in processed.items()))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "results": results,
+        "stats": {
+            "items": len(results),
+            "succeeded": sum(1 for r in results if r["status_code"] == 200),
+            "worker_groups": len(groups),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "items_per_second": round(len(results) / elapsed, 2) if elapsed else None
+        }
+    }
+
+# Structured REST API: calls AppointmentManager directly, no LLM involved
+def _to_parsed_request(**fields) -> ParsedRequest:
+    try:
+        return ParsedRequest(**fields)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+async def _call_manager(call):
+    """Await a manager call and map its outcome onto HTTP status codes"""
+    try:
+        result = await call
+    except ValueError as e:
+        status_code = 404 if "not found" in str(e).lower() else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
+    if isinstance(result, dict) and result.get("status") == "conflict":
+        return JSONResponse(status_code=409, content=result)
+    return result
+
+@app.post("/api/appointments", status_code=201, tags=["Appointments"])
+async def create_appointment(body: AppointmentCreateRequest):
+    set_intent("create_appointment")
+    parsed = _to_parsed_request(intent="create_appointment", **body.model_dump())
+    return await _call_manager(registry.async_appointment_manager.create_appointment(parsed))
+
+@app.get("/api/appointments/{appointment_id}", tags=["Appointments"])
+async def get_appointment(appointment_id: str, user_id: str):
+    set_intent("get_appointment")
+    appointment = await registry.async_appointment_manager.get_appointment(appointment_id, user_id)
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found or access denied")
+    return appointment
+
+@app.delete("/api/appointments/{appointment_id}", tags=["Appointments"])
+async def cancel_appointment(appointment_id: str, user_id: str):
+    set_intent("cancel_appointment")
+    parsed = _to_parsed_request(intent="cancel_appointment", user_id=user_id, appointment_id=appointment_id)
+    return await _call_manager(registry.async_appointment_manager.cancel_appointment(parsed))
+
+@app.post("/api/appointments/{appointment_id}/reschedule", tags=["Appointments"])
+async def reschedule_appointment(appointment_id: str, body: AppointmentRescheduleRequest):
+    set_intent("reschedule_appointment")
+    parsed = _to_parsed_request(
+        intent="reschedule_appointment", appointment_id=appointment_id, **body.model_dump()
+    )
+    return await _call_manager(registry.async_appointment_manager.reschedule_appointment(parsed))
+
+async def _json_array(pages):
+    """Serialise pages of rows as one JSON array without holding them all"""
+    yield "["
+    first = True
+    try:
+        async for page in pages:
+            for row in page:
+                yield ("" if first else ",") + json.dumps(jsonable_encoder(row))
+                first = False
+    except Exception as e:
+        # Headers are already sent: abort the response rather than close the array, so a
+        # client cannot mistake a truncated list for the whole one
+        logger.error(f"Failed to stream appointments: {str(e)}")
+        raise
+    yield "]"
+
+@app.get("/api/users/{user_id}/appointments", tags=["Appointments"])
+async def list_user_appointments(user_id: str, limit: Optional[int] = Query(None, ge=1, le=1000),
+                                 cursor: Optional[str] = None):
+    """All of a user's appointments, newest first, streamed; or one page of `limit` with `X-Next-Cursor`"""
+    set_intent("get_user_appointments")
+    if cursor:
+        try:
+            parse_appointment_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    manager = registry.async_appointment_manager
+    if limit is None:
+        return StreamingResponse(_json_array(manager.iter_user_appointments(user_id, cursor)),
+                                 media_type="application/json")
+    appointments = await manager.get_user_appointments(user_id, limit, cursor)
+    headers = {"X-Next-Cursor": appointment_cursor(appointments[-1])} if len(appointments) == limit else {}
+    return JSONResponse(content=jsonable_encoder(appointments), headers=headers)
+
+@app.get("/api/workers/{worker_id}/appointments", tags=["Appointments"])
+async def list_worker_appointments(worker_id: str):
+    set_intent("get_worker_appointments")
+    return await registry.async_appointment_manager.get_worker_appointments(worker_id)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
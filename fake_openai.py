@@ -0,0 +1,101 @@
+# fake_openai.py
+"""Local OpenAI-compatible server for exercising the resilient LLM client.
+
+Answers /v1/chat/completions with deterministic results (the fast-path rules
+for parse calls, the template renderer for replies) and injects latency and
+faults on demand:
+
+    FAKE_LATENCY=0.3 FAKE_ERROR_RATE=0.1 FAKE_HANG_RATE=0.01 \\
+        uvicorn fake_openai:app --port 9000
+    OPENAI_BASE_URL=http://localhost:9000/v1 python api.py
+
+FAKE_LATENCY      mean seconds per call (exponentially distributed)
+FAKE_ERROR_RATE   share of calls answered with 500
+FAKE_429_RATE     share of calls answered with 429 + Retry-After
+FAKE_HANG_RATE    share of calls that never answer (until FAKE_HANG seconds)
+FAKE_MALFORMED_RATE  share of parse answers sent as fenced, sloppy JSON (see JsonRepair)
+"""
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from FastPathParser import FastPathParser
+from ResponseRenderer import render_response
+
+app = FastAPI(title="Fake OpenAI")
+parser = FastPathParser()
+
+
+def _setting(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _completion(model: str, message: dict) -> dict:
+    return {
+        "id": f"chatcmpl-fake-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def _parse_reply(user_message: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in user_message.splitlines() if ": " in line)
+    request = fields.get("Request", "")
+    match = parser.match(request) or parser.match(request, lenient=True)
+    parsed = parser.build(match, fields.get("User ID", "")) if match else None
+    arguments = parsed.model_dump_json(exclude_none=True) if parsed else json.dumps(
+        {"intent": "unknown", "user_id": fields.get("User ID", "")}
+    )
+    if random.random() < _setting("FAKE_MALFORMED_RATE", 0):
+        arguments = f"Here you go:\n```json\n{arguments[:-1]}, // parsed\n}}\n```"
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [{"id": "call_fake", "type": "function",
+                        "function": {"name": "submit_parsed_request", "arguments": arguments}}],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(random.expovariate(1 / _setting("FAKE_LATENCY", 0.2)))
+
+    roll = random.random()
+    if roll < _setting("FAKE_HANG_RATE", 0):
+        await asyncio.sleep(_setting("FAKE_HANG", 300))
+    roll -= _setting("FAKE_HANG_RATE", 0)
+    if roll < _setting("FAKE_ERROR_RATE", 0):
+        return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+    roll -= _setting("FAKE_ERROR_RATE", 0)
+    if roll < _setting("FAKE_429_RATE", 0):
+        return JSONResponse({"error": {"message": "injected rate limit", "type": "rate_limit"}},
+                            status_code=429, headers={"retry-after": "1"})
+
+    user_message = body["messages"][-1]["content"]
+    if body.get("tools"):
+        return _completion(body["model"], _parse_reply(user_message))
+
+    try:
+        text = render_response(json.loads(user_message))
+    except ValueError:
+        text = "OK"
+    if not body.get("stream"):
+        return _completion(body["model"], {"role": "assistant", "content": text})
+
+    async def chunks():
+        for word in text.split(" "):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body["model"], "choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
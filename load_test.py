@@ -0,0 +1,112 @@
+# load_test.py
+"""Concurrency load test for the chat API.
+
+Fires the same chat request at a running server with increasing numbers of
+concurrent clients and reports throughput and latency per level. With the
+async pipeline, requests/sec should keep rising with concurrency instead of
+staying flat at 1 / (single request latency).
+
+    python load_test.py --url http://localhost:8000 --levels 1 4 16 --requests 64
+
+With --batch N it instead compares N sequential /api/chat calls against a
+single /api/chat/batch call carrying the same N requests.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_level(client: httpx.AsyncClient, url: str, payload: Dict, concurrency: int, total: int) -> Dict:
+    """Send `total` requests with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=payload)
+                if response.status_code >= 500:
+                    failures += 1
+            except httpx.HTTPError:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "failures": failures,
+        "throughput": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+async def compare_batch(client: httpx.AsyncClient, base_url: str, payload: Dict, size: int):
+    """N sequential /api/chat calls vs one /api/chat/batch of N items"""
+    started = time.perf_counter()
+    for _ in range(size):
+        await client.post(base_url + "/api/chat", json=payload)
+    sequential = time.perf_counter() - started
+
+    started = time.perf_counter()
+    response = await client.post(base_url + "/api/chat/batch", json={"requests": [payload] * size})
+    batched = time.perf_counter() - started
+    stats = response.json().get("stats", {}) if response.status_code == 200 else {}
+
+    print(f"sequential: {size} requests in {sequential:.2f}s ({size / sequential:.2f} req/s)")
+    print(f"batch:      {size} requests in {batched:.2f}s ({size / batched:.2f} req/s), "
+          f"{stats.get('succeeded', '?')} succeeded")
+    print(f"speed-up:   x{sequential / batched:.1f}")
+
+
+async def main(args):
+    payload = {"text": args.text, "user_id": args.user_id}
+    url = args.url.rstrip("/") + args.path
+    limits = httpx.Limits(max_connections=max(args.levels), max_keepalive_connections=max(args.levels))
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        if args.batch:
+            await compare_batch(client, args.url.rstrip("/"), payload, args.batch)
+            return
+
+        print(f"{'conc':>5} {'reqs':>6} {'fail':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        baseline = None
+        for level in args.levels:
+            stats = await run_level(client, url, payload, level, args.requests)
+            baseline = baseline or stats["throughput"]
+            print(
+                f"{stats['concurrency']:>5} {stats['requests']:>6} {stats['failures']:>5} "
+                f"{stats['throughput']:>9.2f} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                f"{stats['p99_ms']:>9.1f}  x{stats['throughput'] / baseline:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/api/chat")
+    parser.add_argument("--text", default="What is Tyler's availability tomorrow?")
+    parser.add_argument("--user-id", default="USER001")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--batch", type=int, default=0, help="compare N sequential calls with one batch of N")
+    asyncio.run(main(parser.parse_args()))
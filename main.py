@@ -1,23 +1,37 @@
 # main.py
+import argparse
+
 from BigQueryIntergration import BigQueryClient
+from BulkLoader import BulkLoader
 from sampleDataGeneration import DataGenerator
 
-def initialize_system():
+def generate_sample_data(users=50, workers=10, appointments=200):
+    """{table_name: rows} for the sample users, workers and their appointments"""
+    dg = DataGenerator()
+    user_models = dg.generate_users(users)
+    worker_models = dg.generate_workers(workers)
+    return {
+        'users': (u.model_dump(mode='json') for u in user_models),
+        'workers': (w.model_dump(mode='json') for w in worker_models),
+        'appointments': dg.generate_appointments(user_models, worker_models, appointments),
+    }
+
+def initialize_system(users=50, workers=10, appointments=200):
     # Initialize BigQuery
     bq = BigQueryClient()
     bq.initialize_database()
-    
-    # Generate sample data
-    dg = DataGenerator()
-    users = dg.generate_users(50)
-    workers = dg.generate_workers(10)
-    appointments = dg.generate_appointments(users, workers, 200)
-    
-    # Insert data
-    bq.insert_data('users', [u.model_dump() for u in users])
-    bq.insert_data('workers', [w.model_dump() for w in workers])
-    bq.insert_data('appointments', appointments)
+
+    # Generate and load sample data in parallel chunks. All three tables are
+    # spooled first, so an interrupted run resumes with the same data
+    loader = BulkLoader(bq, on_progress=print)
+    loader.load_many(lambda: generate_sample_data(users, workers, appointments), name='sample_data')
+    bq.close()
 
 if __name__ == "__main__":
-    initialize_system()
-    print("System initialized successfully!")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create the calendar_system dataset and load sample data")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--appointments", type=int, default=200)
+    args = parser.parse_args()
+    initialize_system(args.users, args.workers, args.appointments)
+    print("System initialized successfully!")
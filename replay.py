@@ -0,0 +1,115 @@
+# replay.py
+"""Replay recorded traffic against the API with no live OpenAI or BigQuery.
+
+Record on a real deployment (or a staging run) with
+
+    RECORD_TRAFFIC=traffic-{pid}.jsonl.gz RECORD_SAMPLE=0.1 python api.py
+
+then drive the app in-process from the log; every LLM and BigQuery call is
+answered from the recording after its recorded latency:
+
+    python replay.py traffic-1234.jsonl.gz                 # original arrival times
+    python replay.py traffic-1234.jsonl.gz --speed 4       # 4x faster (arrivals and upstream latency)
+    python replay.py traffic-1234.jsonl.gz --concurrency 32 --repeat 5   # closed loop, as fast as possible
+
+Calls are matched on their inputs (for BigQuery: the statement and its
+parameters, then the statement alone). Unmatched LLM calls get a template
+reply or a parse error, unmatched queries raise; all are counted as misses.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from collections import Counter
+from contextlib import nullcontext
+from typing import Dict, List
+
+import httpx
+
+from TrafficRecorder import REPLAY_LOOKUPS, ReplayBigQueryClient, ReplayLLMBackend, TrafficLog
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _install(log: TrafficLog, speed: float):
+    """Point the process-wide registry at the replay backends, before the app is imported"""
+    os.environ.pop("RECORD_TRAFFIC", None)
+    os.environ["LLM_BACKEND"] = "stub"  # no OpenAI key needed, no sync OpenAI adapter built
+    from ClientRegistry import registry
+    registry._llm_backend = ReplayLLMBackend(log, speed)
+    registry._bq_client = ReplayBigQueryClient(log, speed)
+    registry._recorder_loaded = True  # never record the replay itself
+
+
+async def replay(log: TrafficLog, speed: float, concurrency: int, repeat: int, timeout: float) -> Dict:
+    from api import app
+
+    origin = log.requests[0]["t"]
+    span = log.requests[-1]["t"] - origin
+    # (seconds after start at the recorded pace, record); repeats follow each other
+    schedule = [(n * span + r["t"] - origin, r) for n in range(repeat) for r in log.requests]
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=timeout) as client:
+        started = time.perf_counter()
+
+        async def one(offset: float, record: dict):
+            if semaphore is None:
+                # Open loop: keep the recorded arrival offsets
+                await asyncio.sleep(max(0.0, offset / speed - (time.perf_counter() - started)))
+            async with semaphore or nullcontext():
+                sent = time.perf_counter()
+                try:
+                    response = await client.post(record["in"]["path"], json=record["in"]["body"])
+                    statuses[str(response.status_code)] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - sent)
+
+        await asyncio.gather(*(one(offset, r) for offset, r in schedule))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(schedule),
+        "elapsed": elapsed,
+        "statuses": dict(statuses),
+        "throughput": len(schedule) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": _percentile(latencies, 95) * 1000 if latencies else 0.0,
+        "p99_ms": _percentile(latencies, 99) * 1000 if latencies else 0.0,
+    }
+
+
+def main(args):
+    log = TrafficLog(args.log)
+    if not log.requests:
+        raise SystemExit(f"No recorded HTTP requests in {args.log}")
+    _install(log, args.speed)
+
+    stats = asyncio.run(replay(log, args.speed, args.concurrency, args.repeat, args.timeout))
+    print(f"requests     {stats['requests']} in {stats['elapsed']:.2f}s ({stats['throughput']:.2f} req/s)")
+    print(f"statuses     {stats['statuses']}")
+    print(f"latency      p50 {stats['p50_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms  p99 {stats['p99_ms']:.1f} ms")
+    for kind in ("llm.parse", "llm.response", "llm.stream", "bq.query", "bq.insert"):
+        counts = {m: int(REPLAY_LOOKUPS.value(kind=kind, match=m)) for m in ("exact", "fallback", "miss")}
+        if any(counts.values()):
+            print(f"{kind:<13}{counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="recorded .jsonl or .jsonl.gz file")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression for arrivals and latencies")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="closed loop with this many requests in flight (0: recorded arrival times)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the log this many times")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    main(parser.parse_args())
@@ -0,0 +1,77 @@
+# serve.py
+"""Production launcher for the Calendar RAG API.
+
+Runs several uvicorn worker processes on one shared socket, using uvloop and
+httptools when they are installed. Each worker warms up (clients, credentials,
+connections) in its startup hook before it accepts connections. On SIGTERM a
+worker reports not-ready on /health/ready for DRAIN_DELAY seconds, so the load
+balancer can take it out of rotation. It then stops accepting connections and
+gives in-flight requests up to GRACEFUL_TIMEOUT seconds to finish.
+
+    python serve.py            # WEB_CONCURRENCY workers on $PORT (default 8000)
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import signal
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+DRAIN_DELAY = float(os.getenv("DRAIN_DELAY", "5"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that reports not-ready before it stops accepting"""
+
+    def handle_exit(self, sig, frame):
+        if sig != signal.SIGTERM or self.should_exit or DRAIN_DELAY <= 0:
+            return super().handle_exit(sig, frame)
+
+        import api  # already imported by this worker
+        if api.app.state.draining:
+            return super().handle_exit(sig, frame)
+        api.app.state.draining = True
+        api.app.state.ready = False
+        logger.info(f"SIGTERM received, draining for {DRAIN_DELAY}s before shutdown")
+        asyncio.get_event_loop().call_later(DRAIN_DELAY, super().handle_exit, sig, frame)
+
+
+def main():
+    config = uvicorn.Config(
+        "api:app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        lifespan="on",
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        timeout_keep_alive=int(os.getenv("KEEPALIVE_TIMEOUT", "5")),
+        log_config=None,
+    )
+    server = DrainingServer(config=config)
+    logger.info(f"Starting {WORKERS} workers (loop={config.loop}, http={config.http})")
+
+    if WORKERS > 1:
+        # Same as uvicorn.run(workers=N), but with DrainingServer in each worker
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from AdmissionControl import REJECTED, AdmissionRejected, ConcurrencyLimiter, limiter_from_env
+
+
+def limiter(name, max_concurrent=1, max_queue=1, queue_timeout=0.05, avg_hold=2.0):
+    limiter = ConcurrencyLimiter(name, max_concurrent=max_concurrent, max_queue=max_queue,
+                                 queue_timeout=queue_timeout)
+    limiter._avg_hold = avg_hold  # seconds; makes Retry-After predictable
+    return limiter
+
+
+async def hold(limiter, release: asyncio.Event):
+    async with limiter.acquire():
+        await release.wait()
+
+
+async def admitted(limiter):
+    async with limiter.acquire():
+        return True
+
+
+def test_admits_up_to_max_concurrent_without_waiting():
+    async def run():
+        gate = limiter("test_admit", max_concurrent=2)
+        release = asyncio.Event()
+        holders = [asyncio.ensure_future(hold(gate, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert gate._in_flight == 2 and gate._waiting == 0
+        release.set()
+        await asyncio.gather(*holders)
+        assert gate._in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_queued_call_is_admitted_when_a_slot_frees():
+    async def run():
+        gate = limiter("test_queue", queue_timeout=1.0)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(gate, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(admitted(gate))
+        await asyncio.sleep(0)
+        assert gate._waiting == 1
+        release.set()
+        assert await waiter is True
+        await holder
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_rejected_with_503():
+    async def run():
+        gate = limiter("test_queue_full", max_queue=1, queue_timeout=1.0)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(gate, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(admitted(gate))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admitted(gate)
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return rejected.value
+
+    before = REJECTED.value(limiter="test_queue_full", reason="queue_full")
+    rejected = asyncio.run(run())
+    assert (rejected.reason, rejected.status_code) == ("queue_full", 503)
+    # One call already waiting, plus this one: 2 * 2.0s through 1 slot
+    assert rejected.retry_after == 4
+    assert REJECTED.value(limiter="test_queue_full", reason="queue_full") == before + 1
+
+
+def test_queue_timeout_is_rejected_with_429():
+    async def run():
+        gate = limiter("test_queue_timeout", max_queue=5, queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(gate, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admitted(gate)
+        assert gate._waiting == 0
+        release.set()
+        await holder
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert (rejected.reason, rejected.status_code) == ("queue_timeout", 429)
+    # Only the caller itself was queued: 1 * 2.0s through 1 slot
+    assert rejected.retry_after == 2
+
+
+def test_retry_after_is_bounded():
+    async def run(avg_hold):
+        gate = limiter("test_bounds", max_queue=0, avg_hold=avg_hold)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(gate, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admitted(gate)
+        release.set()
+        await holder
+        return rejected.value.retry_after
+
+    assert asyncio.run(run(0.01)) == 1
+    assert asyncio.run(run(120.0)) == 30
+
+
+def test_limiter_from_env(monkeypatch):
+    monkeypatch.setenv("TEST_LIMITER_MAX_CONCURRENCY", "7")
+    monkeypatch.setenv("TEST_LIMITER_QUEUE_TIMEOUT", "1.5")
+    gate = limiter_from_env("test_env", "TEST_LIMITER", max_concurrent=2, max_queue=3, queue_timeout=5.0)
+    assert (gate.max_concurrent, gate.max_queue, gate.queue_timeout) == (7, 3, 1.5)
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import api
+from AppointmentManagementLogic import (AppointmentManager, AsyncAppointmentManager, appointment_cursor,
+                                        parse_appointment_cursor)
+from QueryRegistry import QUERIES
+
+BASE = datetime(2030, 3, 5, 9, 0, tzinfo=pytz.utc)
+
+
+def appointment(appointment_id, start_time, user_id="USER001"):
+    return {"appointment_id": appointment_id, "user_id": user_id, "worker_id": "WORKER001",
+            "start_time": start_time, "end_time": start_time + timedelta(minutes=30), "status": "scheduled"}
+
+
+class FakeJob:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def result(self, page_size=None, max_results=None):
+        return self.rows[:max_results] if max_results else self.rows
+
+
+class FakeBigQuery:
+    """Evaluates the user_appointments statements the way BigQuery would (see QueryRegistry)"""
+
+    def __init__(self, appointments):
+        self.appointments = appointments
+        self.params = []
+
+    def query(self, sql, job_config=None):
+        params = {p.name: p.value for p in job_config.query_parameters}
+        self.params.append(params)
+        before_time, before_id = params["before_time"], params["before_id"]
+        rows = [a for a in self.appointments if a["user_id"] == params["user_id"] and a["status"] != "cancelled"
+                and (before_time is None or a["start_time"] < before_time
+                     or (a["start_time"] == before_time and a["appointment_id"] < before_id))]
+        rows.sort(key=lambda a: (a["start_time"], a["appointment_id"]), reverse=True)
+        if params.get("row_limit"):
+            rows = rows[:params["row_limit"]]
+        return FakeJob(rows)
+
+
+@pytest.mark.parametrize("start_time", [
+    datetime(2030, 3, 5, 9, 30),  # naive UTC, as stored
+    datetime(2030, 3, 5, 9, 30, tzinfo=pytz.utc),
+    pytz.timezone("America/New_York").localize(datetime(2030, 3, 5, 4, 30)),
+    "2030-03-05T09:30:00",
+])
+def test_cursor_round_trip(start_time):
+    cursor = appointment_cursor({"appointment_id": "APT-1-WORKER1", "start_time": start_time})
+    assert "=" not in cursor
+    assert parse_appointment_cursor(cursor) == (datetime(2030, 3, 5, 9, 30, tzinfo=pytz.utc), "APT-1-WORKER1")
+
+
+@pytest.mark.parametrize("cursor", [
+    "garbage!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(json.dumps(["2030-03-05T09:30:00"]).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps(["yesterday", "APT-1-WORKER1"]).encode()).decode(),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        parse_appointment_cursor(cursor)
+
+
+def test_keyset_query_breaks_ties_on_appointment_id():
+    sql = QUERIES.get("user_appointments_page").sql
+    assert "ORDER BY start_time DESC, appointment_id DESC" in sql
+    assert "(start_time = @before_time AND appointment_id < @before_id)" in sql
+
+
+def test_pages_with_shared_start_times_neither_skip_nor_repeat():
+    appointments = [appointment(f"APT-{i}-WORKER1", BASE + timedelta(hours=i // 3)) for i in range(10)]
+    appointments.append(appointment("APT-99-WORKER1", BASE, user_id="USER002"))
+    manager = AppointmentManager(FakeBigQuery(appointments))
+
+    seen, cursor = [], None
+    while True:
+        page = manager.get_user_appointments("USER001", limit=2, cursor=cursor)
+        seen.extend(a["appointment_id"] for a in page)
+        if len(page) < 2:
+            break
+        cursor = appointment_cursor(page[-1])
+
+    newest_first = sorted(appointments[:10], key=lambda a: (a["start_time"], a["appointment_id"]), reverse=True)
+    assert seen == [a["appointment_id"] for a in newest_first]
+
+
+def test_get_user_appointments_rejects_malformed_cursor():
+    with pytest.raises(ValueError):
+        AppointmentManager(FakeBigQuery([])).get_user_appointments("USER001", limit=2, cursor="garbage!")
+
+
+def test_stream_serialises_every_page():
+    async def pages():
+        yield [{"a": 1}, {"a": datetime(2030, 3, 5, 9, 0)}]
+        yield [{"a": 3}]
+
+    async def run():
+        return "".join([chunk async for chunk in api._json_array(pages())])
+
+    assert json.loads(asyncio.run(run())) == [{"a": 1}, {"a": "2030-03-05T09:00:00"}, {"a": 3}]
+
+
+class FailingRows:
+    """A result that yields `count` rows, then fails as a later page fetch would"""
+
+    def __init__(self, count):
+        self.count = count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield appointment(f"APT-{i}-WORKER1", BASE - timedelta(minutes=i))
+        raise ConnectionError("page fetch failed")
+
+
+def test_failing_page_aborts_the_stream():
+    class FailingBigQuery(FakeBigQuery):
+        def query(self, sql, job_config=None):
+            return FakeJob(FailingRows(600))  # one full 500-row page, then the error
+
+    manager = AsyncAppointmentManager(AppointmentManager(FailingBigQuery([])), ThreadPoolExecutor(1))
+
+    async def run():
+        chunks = []
+        with pytest.raises(ConnectionError):
+            async for chunk in api._json_array(manager.iter_user_appointments("USER001")):
+                chunks.append(chunk)
+        return chunks
+
+    chunks = asyncio.run(run())
+    assert len(chunks) == 501  # "[" and the first page's rows
+    assert chunks[-1] != "]"
+    with pytest.raises(ValueError):
+        json.loads("".join(chunks))
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import AppointmentManagementLogic
+from AppointmentManagementLogic import (AppointmentManager, _overlaps_any, _slots_in_gap, _subtract_intervals,
+                                        _working_window)
+from CoreDatamodels import ParsedRequest
+
+UTC = pytz.utc
+NEW_YORK = pytz.timezone("America/New_York")
+WORKER = {"worker_id": "WORKER001", "name": "Tyler", "role": "doctor", "timezone": "UTC",
+          "working_hours": {"start": "09:00", "end": "17:00"}}
+HALF_HOUR = timedelta(minutes=30)
+
+
+def at(hour, minute=0, day=12):
+    return UTC.localize(datetime(2030, 3, day, hour, minute))
+
+
+def subtract(*busy):
+    return [(start.hour + start.minute / 60, end.hour + end.minute / 60, start_open, end_open)
+            for start, end, start_open, end_open in _subtract_intervals(at(9), at(17), list(busy))]
+
+
+def test_free_window_without_bookings():
+    assert subtract() == [(9, 17, False, False)]
+
+
+def test_overlapping_busy_intervals_merge():
+    assert subtract((at(10), at(11)), (at(10, 30), at(12)), (at(11), at(11, 30))) == [
+        (9, 10, False, True), (12, 17, True, False)
+    ]
+
+
+def test_back_to_back_busy_intervals_leave_no_gap():
+    assert subtract((at(10), at(11)), (at(11), at(12))) == [(9, 10, False, True), (12, 17, True, False)]
+
+
+def test_busy_intervals_beyond_the_window_are_clipped():
+    assert subtract((at(7), at(10)), (at(16), at(19))) == [(10, 16, True, True)]
+
+
+def test_busy_intervals_outside_the_window_are_ignored():
+    assert subtract((at(6), at(8)), (at(18), at(19))) == [(9, 17, False, False)]
+
+
+def test_busy_all_day_leaves_nothing():
+    assert subtract((at(8), at(18))) == []
+
+
+def test_slots_stop_short_of_a_closed_busy_edge():
+    busy = [(at(10), at(11))]
+    gaps = _subtract_intervals(at(9), at(12), busy)
+    slots = [slot for gap in gaps for slot in _slots_in_gap(gap, HALF_HOUR, HALF_HOUR, UTC)]
+    # 09:30-10:00 touches the booking at 10:00 and 11:00-11:30 touches its end: both conflict
+    assert slots == [at(9), at(11, 30)]
+    intervals = [("APT-1-WORKER001", start.replace(tzinfo=None), end.replace(tzinfo=None)) for start, end in busy]
+    assert not any(_overlaps_any(intervals, slot, slot + HALF_HOUR) for slot in slots)
+    assert _overlaps_any(intervals, at(9, 30), at(10)) and _overlaps_any(intervals, at(11), at(11, 30))
+
+
+def test_slots_may_end_at_the_working_day_end():
+    assert _slots_in_gap((at(16), at(17), False, False), HALF_HOUR, HALF_HOUR, UTC) == [at(16), at(16, 30)]
+
+
+def test_slots_are_aligned_to_the_local_grid():
+    gap = (at(9, 10), at(10, 30), False, False)
+    assert _slots_in_gap(gap, HALF_HOUR, HALF_HOUR, UTC) == [at(9, 30), at(10)]
+
+
+def test_working_window_follows_dst():
+    # Clocks in New York go forward on 2030-03-10
+    assert _working_window(WORKER, datetime(2030, 3, 9).date(), NEW_YORK) == (at(14, day=9), at(22, day=9))
+    assert _working_window(WORKER, datetime(2030, 3, 10).date(), NEW_YORK) == (at(13, day=10), at(21, day=10))
+
+
+def availability(worker=WORKER, busy=(), day=12):
+    manager = AppointmentManager(None, worker_cache={"tyler": worker}, busy_cache={
+        worker["worker_id"]: (datetime(2000, 1, 1), datetime(2100, 1, 1),
+                              [("APT-1-WORKER001", start.replace(tzinfo=None), end.replace(tzinfo=None))
+                               for start, end in busy])
+    })
+    request = ParsedRequest(intent="get_availability", user_id="USER001", worker_name="Tyler",
+                            datetime=datetime(2030, 3, day, 23, 59))
+    return manager.get_availability(request)
+
+
+def test_get_availability_on_dst_day():
+    result = availability(dict(WORKER, timezone="America/New_York"), day=10)
+    assert result["slots"][0] == "2030-03-10T09:00:00-04:00"
+    assert result["slots"][-1] == "2030-03-10T16:30:00-04:00"
+    assert len(result["slots"]) == 16
+
+
+def test_get_availability_excludes_bookings():
+    result = availability(busy=[(at(9), at(12)), (at(13, 30), at(17))])
+    # Neither 12:00 (the end of a booking) nor 13:00 (ends at the start of one) is free
+    assert result["slots"] == ["2030-03-12T12:30:00+00:00"]
+    assert result["free_windows"] == [{"start": "2030-03-12T12:00:00+00:00", "end": "2030-03-12T13:30:00+00:00"}]
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    def freeze(now):
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now.astimezone(tz) if tz else now.replace(tzinfo=None)
+        monkeypatch.setattr(AppointmentManagementLogic, "datetime", FrozenDatetime)
+    return freeze
+
+
+def test_get_availability_starts_from_now(frozen_now):
+    frozen_now(at(15, 10))
+    assert availability()["slots"] == ["2030-03-12T15:30:00+00:00", "2030-03-12T16:00:00+00:00",
+                                       "2030-03-12T16:30:00+00:00"]
+
+
+def test_get_availability_after_hours_is_empty(frozen_now):
+    frozen_now(at(16, 45))
+    result = availability()
+    assert result["slots"] == [] and result["free_windows"] == []
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+
+import pytest
+from google.api_core.exceptions import NotFound
+
+from BulkLoader import BulkLoader, BulkLoadError
+
+
+class FakeJob:
+    def __init__(self, fail_poll=False, error=None):
+        self.fail_poll = fail_poll
+        self.error_result = error
+        self.state = "DONE"
+
+    def done(self):
+        if self.fail_poll:
+            self.fail_poll = False
+            raise ConnectionError("lost connection while polling")
+        return True
+
+    def reload(self):
+        pass
+
+
+class FakeClient:
+    """BigQuery client stand-in; the `fail_at`-th insert call (1-based) raises"""
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.insert_calls = 0
+        self.inserted = {}  # (table, row id) -> row
+        self.duplicates = 0
+        self.jobs = {}
+        self.submitted = []
+        self.next_job = FakeJob()
+        self.lock = threading.Lock()
+
+    def get_table(self, table_id):
+        return type("Table", (), {"table_id": table_id, "schema": []})()
+
+    def insert_rows_json(self, table, rows, row_ids=None):
+        with self.lock:
+            self.insert_calls += 1
+            if self.insert_calls == self.fail_at:
+                raise ConnectionError("insert failed")
+            for rid, row in zip(row_ids, rows):
+                self.duplicates += (table.table_id, rid) in self.inserted
+                self.inserted[(table.table_id, rid)] = row
+        return []
+
+    def get_job(self, job_id):
+        if job_id not in self.jobs:
+            raise NotFound(job_id)
+        return self.jobs[job_id]
+
+    def load_table_from_file(self, f, table, job_id, job_config):
+        self.submitted.append((job_id, sum(1 for _ in f)))
+        self.jobs[job_id] = self.next_job
+        return self.next_job
+
+
+class FakeBigQuery:
+    def __init__(self, client):
+        self.client = client
+
+
+def loader(client, tmp_path, **kwargs):
+    kwargs = {"chunk_rows": 10, "workers": 1, "max_attempts": 1, "on_progress": lambda message: None, **kwargs}
+    return BulkLoader(FakeBigQuery(client), state_dir=str(tmp_path), **kwargs)
+
+
+def checkpointed_chunks(tmp_path, table_name):
+    with open(tmp_path / f"{table_name}.checkpoint.json") as f:
+        return len(json.load(f)["done"])
+
+
+def rows(count, key="n"):
+    return [{key: i} for i in range(count)]
+
+
+def test_stream_resumes_after_the_checkpointed_chunks(tmp_path):
+    client = FakeClient(fail_at=3)
+    with pytest.raises(BulkLoadError):
+        loader(client, tmp_path).load("users", rows(50))
+    # Chunks already sent when the third failed still finish and are checkpointed
+    done = checkpointed_chunks(tmp_path, "users")
+    assert done >= 2 and len(client.inserted) == 10 * done
+
+    client.fail_at = None
+    calls_before = client.insert_calls
+    report = loader(client, tmp_path).load("users", rows(999, key="ignored"))  # spooled rows win
+    assert (report.method, report.rows, report.chunks, report.resumed_chunks) == ("stream", 50, 5, done)
+    assert client.insert_calls - calls_before == 5 - done
+    assert len(client.inserted) == 50 and client.duplicates == 0
+    assert sorted(row["n"] for row in client.inserted.values()) == list(range(50))
+    assert os.listdir(tmp_path) == []
+
+
+def test_load_without_rows_needs_a_checkpoint(tmp_path):
+    with pytest.raises(BulkLoadError):
+        loader(FakeClient(), tmp_path).load("users")
+
+
+def test_load_many_resumes_without_producing_again(tmp_path):
+    produced = []
+
+    def produce():
+        produced.append(1)
+        return {"users": iter(rows(10)), "workers": iter(rows(30)), "appointments": iter(rows(20))}
+
+    client = FakeClient(fail_at=3)  # users: 1 call; workers fail on their second chunk
+    with pytest.raises(BulkLoadError):
+        loader(client, tmp_path).load_many(produce, name="seed")
+    assert sorted(os.listdir(tmp_path)) == ["appointments.checkpoint.json", "appointments.ndjson",
+                                            "seed.manifest.json", "workers.checkpoint.json", "workers.ndjson"]
+
+    done = checkpointed_chunks(tmp_path, "workers")
+
+    client.fail_at = None
+    reports = loader(client, tmp_path).load_many(produce, name="seed")
+    assert [(r.table, r.rows, r.resumed_chunks) for r in reports] == [("workers", 30, done), ("appointments", 20, 0)]
+    assert produced == [1]
+    assert len(client.inserted) == 60 and client.duplicates == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_load_many_interrupted_while_spooling_starts_over(tmp_path):
+    def interrupted():
+        def appointments():
+            yield {"n": 0}
+            raise KeyboardInterrupt
+        return {"users": iter(rows(10)), "appointments": appointments()}
+
+    client = FakeClient()
+    with pytest.raises(KeyboardInterrupt):
+        loader(client, tmp_path).load_many(interrupted, name="seed")
+    assert client.insert_calls == 0
+
+    reports = loader(client, tmp_path).load_many(lambda: {"users": iter(rows(10)), "appointments": iter(rows(5))},
+                                                 name="seed")
+    assert [(r.table, r.rows) for r in reports] == [("users", 10), ("appointments", 5)]
+
+
+def test_load_job_is_found_again_after_an_interruption(tmp_path):
+    client = FakeClient()
+    client.next_job = FakeJob(fail_poll=True)
+    with pytest.raises(ConnectionError):
+        loader(client, tmp_path, load_job_rows=5).load("appointments", rows(20))
+    assert len(client.submitted) == 1
+
+    report = loader(client, tmp_path, load_job_rows=5).load("appointments")
+    assert (report.method, report.rows, report.resumed_chunks) == ("load_job", 20, 1)
+    assert len(client.submitted) == 1
+
+
+def test_failed_load_job_is_retried_under_a_new_id(tmp_path):
+    client = FakeClient()
+    client.next_job = FakeJob(error={"reason": "invalid"})
+    with pytest.raises(BulkLoadError):
+        loader(client, tmp_path, load_job_rows=5).load("appointments", rows(20))
+
+    client.next_job = FakeJob()
+    loader(client, tmp_path, load_job_rows=5).load("appointments")
+    (first_id, first_rows), (second_id, second_rows) = client.submitted
+    assert first_id != second_id and first_rows == second_rows == 20
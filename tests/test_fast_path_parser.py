@@ -0,0 +1,171 @@
+import asyncio
+from datetime import date, datetime, time
+
+import pytest
+import pytz
+
+from FastPathParser import FAST_PATH_TOTAL, FastPathParser, _resolve_date, _resolve_duration, _resolve_time
+
+# A Tuesday, far enough ahead that resolved times pass ParsedRequest's past-date check
+NOW = datetime(2030, 3, 5, 12, 0, tzinfo=pytz.utc)
+TODAY = NOW.date()
+
+
+def parse(text, timezones=None, lenient=False):
+    timezones = timezones if timezones is not None else {"tyler": "America/New_York"}
+    calls = []
+
+    async def lookup(worker_name=None, worker_id=None):
+        calls.append((worker_name, worker_id))
+        return timezones.get((worker_name or "").lower()) or timezones.get(worker_id)
+
+    parsed = asyncio.run(FastPathParser().parse(text, "USER001", lookup, lenient=lenient))
+    return parsed, calls
+
+
+@pytest.mark.parametrize("text, intent, fields", [
+    ("cancel APT-1712345678-WORKER001", "cancel_appointment", {"appointment_id": "APT-1712345678-WORKER001"}),
+    ("Please delete my appointment apt-1-worker2.", "cancel_appointment", {"appointment_id": "APT-1-WORKER2"}),
+    ("reschedule APT-1-WORKER001 to friday at 14:00", "reschedule_appointment",
+     {"appointment_id": "APT-1-WORKER001", "date_text": "friday", "time_text": "14:00"}),
+    ("book Tyler tomorrow at 3pm for 45 minutes", "create_appointment",
+     {"worker_name": "Tyler", "date_text": "tomorrow", "time_text": "3pm", "duration_text": "45 minutes"}),
+    ("can you book me an appointment with tyler on march 22nd at 10:30 am", "create_appointment",
+     {"worker_name": "Tyler", "date_text": "march 22nd", "time_text": "10:30 am"}),
+    ("book dr smith at 9am next monday", "create_appointment",
+     {"worker_name": "Dr Smith", "date_text": "next monday", "time_text": "9am"}),
+    ("book Pat O'Brien tomorrow at noon", "create_appointment", {"worker_name": "Pat O'Brien"}),
+    ("when is Tyler free next Tuesday?", "get_availability", {"worker_name": "Tyler", "date_text": "next tuesday"}),
+    ("what's tyler's availability", "get_availability", {"worker_name": "Tyler", "date_text": None}),
+])
+def test_match_known_phrasings(text, intent, fields):
+    match = FastPathParser().match(text)
+    assert match is not None and match.intent == intent
+    for name, value in fields.items():
+        assert getattr(match, name) == value
+
+
+@pytest.mark.parametrize("text", [
+    "book tyler tomorrow at 9",  # bare hour: am or pm?
+    "I need to see someone about my knee next week",
+    "book tyler tomorrow at 3pm and cancel APT-1-WORKER1",
+    "do not delete APT-1740812400-WORKER123",
+    "cancel my appointment with tyler",
+])
+def test_match_rejects_anything_else(text):
+    assert FastPathParser().match(text) is None
+
+
+def test_worker_id_comes_from_appointment_id():
+    assert FastPathParser().match("cancel APT-1-WORKER007").worker_id == "WORKER007"
+
+
+def test_build_resolves_in_worker_timezone():
+    match = FastPathParser().match("book tyler tomorrow at 3pm for an hour")
+    parsed = FastPathParser().build(match, "USER001", "America/New_York", now=NOW)
+    assert parsed.datetime == datetime(2030, 3, 6, 15, 0)
+    assert parsed.duration == 60
+
+
+def test_build_uses_local_date_not_utc():
+    # 02:00 UTC on Wednesday is still Tuesday evening in New York
+    now = datetime(2030, 3, 6, 2, 0, tzinfo=pytz.utc)
+    match = FastPathParser().match("book tyler tomorrow at 3pm")
+    assert FastPathParser().build(match, "USER001", "America/New_York", now=now).datetime.date() == date(2030, 3, 6)
+
+
+def test_build_refuses_past_times():
+    match = FastPathParser().match("book tyler today at 9am")
+    assert FastPathParser().build(match, "USER001", "UTC", now=NOW) is None
+
+
+def test_build_availability_without_time_keeps_whole_day():
+    match = FastPathParser().match("is tyler available on friday")
+    parsed = FastPathParser().build(match, "USER001", "UTC", now=NOW)
+    assert parsed.intent == "get_availability"
+    assert parsed.datetime == datetime(2030, 3, 8, 23, 59)
+
+
+def test_build_rejects_out_of_range_duration():
+    match = FastPathParser().match("book tyler tomorrow at 3pm for 5 minutes")
+    assert FastPathParser().build(match, "USER001", "UTC", now=NOW) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("today", date(2030, 3, 5)),
+    ("tomorrow", date(2030, 3, 6)),
+    ("day after tomorrow", date(2030, 3, 7)),
+    ("tuesday", date(2030, 3, 12)),  # never today
+    ("next tuesday", date(2030, 3, 12)),
+    ("fri", date(2030, 3, 8)),
+    ("2030-04-01", date(2030, 4, 1)),
+    ("3/22", date(2030, 3, 22)),
+    ("1/2", date(2031, 1, 2)),  # already past this year
+    ("22nd of march", date(2030, 3, 22)),
+    ("march 1st", date(2031, 3, 1)),
+    ("dec 25, 2031", date(2031, 12, 25)),
+])
+def test_resolve_date(text, expected):
+    assert _resolve_date(text, TODAY) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("3pm", time(15, 0)), ("12am", time(0, 0)), ("12 p.m.", time(12, 0)), ("9:45 am", time(9, 45)),
+    ("14:30", time(14, 30)), ("noon", time(12, 0)),
+])
+def test_resolve_time(text, expected):
+    assert _resolve_time(text) == expected
+
+
+def test_resolve_time_rejects_invalid_12_hour_clock():
+    with pytest.raises(ValueError):
+        _resolve_time("13pm")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("45 minutes", 45), ("an hour", 60), ("half an hour", 30), ("2 hours", 120),
+])
+def test_resolve_duration(text, expected):
+    assert _resolve_duration(text) == expected
+
+
+def test_parse_hit_looks_up_worker_timezone():
+    parsed, calls = parse("book tyler tomorrow at 3pm")
+    assert parsed.intent == "create_appointment" and parsed.worker_name == "Tyler"
+    assert calls == [("Tyler", None)]
+
+
+def test_parse_unknown_worker_falls_through_to_llm():
+    before = FAST_PATH_TOTAL.value(result="fallthrough", intent="create_appointment")
+    parsed, calls = parse("book a haircut tomorrow at 3pm")
+    assert parsed is None
+    assert calls == [("Haircut", None)]
+    assert FAST_PATH_TOTAL.value(result="fallthrough", intent="create_appointment") == before + 1
+
+
+def test_parse_cancel_needs_no_timezone():
+    parsed, calls = parse("cancel APT-1712345678-WORKER001", timezones={})
+    assert parsed.intent == "cancel_appointment" and calls == []
+
+
+def test_parse_miss():
+    before = FAST_PATH_TOTAL.value(result="miss", intent="unknown")
+    assert parse("hello there")[0] is None
+    assert FAST_PATH_TOTAL.value(result="miss", intent="unknown") == before + 1
+
+
+@pytest.mark.parametrize("text", [
+    "do not delete APT-1740812400-WORKER123",
+    "Please don't cancel APT-1-WORKER1, move it to friday at 3pm instead",
+    "book tyler tomorrow at 3pm and cancel APT-1-WORKER1",
+    "cancel APT-1712345678-WORKER001",
+    "reschedule APT-1-WORKER001 to friday at 14:00",
+])
+def test_degraded_mode_never_touches_existing_appointments(text):
+    assert FastPathParser().match(text, lenient=True) is None
+    assert parse(text, lenient=True)[0] is None
+
+
+def test_degraded_mode_finds_booking_in_longer_text():
+    match = FastPathParser().match("hi! could you book tyler tomorrow at 3pm, thanks", lenient=True)
+    assert match.intent == "create_appointment" and match.worker_name == "Tyler"
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from InsertBuffer import INSERT_FLUSHES, InsertBuffer, row_id
+
+TABLE = "calendar_system.test_insert_buffer"
+
+
+class FakeClient:
+    """insert_rows_json stand-in: rows with "bad" set are rejected, or every call raises `fail`"""
+
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_table(self, table_id):
+        return table_id
+
+    def insert_rows_json(self, table, rows, row_ids=None, skip_invalid_rows=False):
+        with self.lock:
+            self.calls.append((table, list(rows), list(row_ids)))
+        if self.fail:
+            raise self.fail
+        return [{"index": i, "errors": [{"reason": "invalid", "row": row["n"]}]}
+                for i, row in enumerate(rows) if row.get("bad")]
+
+
+def flushes(reason):
+    return INSERT_FLUSHES.value(table=TABLE, reason=reason)
+
+
+def test_concurrent_callers_share_one_call_and_get_their_own_errors():
+    client = FakeClient()
+    buffer = InsertBuffer(client, max_rows=4, max_delay=60)
+    results = {}
+    started = threading.Barrier(2)
+
+    def caller(name, rows):
+        started.wait()
+        results[name] = buffer.insert(TABLE, rows)
+
+    threads = [threading.Thread(target=caller, args=("a", [{"n": 1}, {"n": 2, "bad": True}])),
+               threading.Thread(target=caller, args=("b", [{"n": 3, "bad": True}, {"n": 4}]))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(client.calls) == 1 and len(client.calls[0][1]) == 4
+    # Indexes are into each caller's own rows
+    assert results["a"] == [{"index": 1, "errors": [{"reason": "invalid", "row": 2}]}]
+    assert results["b"] == [{"index": 0, "errors": [{"reason": "invalid", "row": 3}]}]
+    buffer.close()
+
+
+def test_full_batch_is_flushed_by_rows():
+    client = FakeClient()
+    buffer = InsertBuffer(client, max_rows=2, max_delay=60)
+    before = flushes("rows")
+    futures = buffer.submit(TABLE, [{"n": 1}, {"n": 2}, {"n": 3}])
+    assert [len(rows) for _, rows, _ in client.calls] == [2]
+    assert [f.done() for f in futures] == [True, True, False]
+    assert flushes("rows") == before + 1
+    buffer.close()
+    assert futures[2].result(timeout=1) == []
+
+
+def test_full_batch_is_flushed_by_bytes():
+    client = FakeClient()
+    buffer = InsertBuffer(client, max_rows=500, max_bytes=40, max_delay=60)
+    before = flushes("bytes")
+    buffer.submit(TABLE, [{"n": 1, "pad": "x" * 20}, {"n": 2, "pad": "x" * 20}])
+    assert len(client.calls) == 1 and flushes("bytes") == before + 1
+    buffer.close()
+
+
+def test_partial_batch_is_flushed_after_max_delay():
+    client = FakeClient()
+    buffer = InsertBuffer(client, max_rows=500, max_delay=0.01)
+    before = flushes("delay")
+    assert buffer.insert(TABLE, [{"n": 1}]) == []
+    assert len(client.calls) == 1 and flushes("delay") == before + 1
+    buffer.close()
+
+
+def test_close_flushes_pending_rows():
+    client = FakeClient()
+    buffer = InsertBuffer(client, max_rows=500, max_delay=60)
+    futures = buffer.submit(TABLE, [{"n": 1}, {"n": 2}])
+    assert client.calls == []
+    buffer.close()
+    assert [f.result(timeout=1) for f in futures] == [[], []]
+    assert len(client.calls) == 1
+    with pytest.raises(RuntimeError):
+        buffer.submit(TABLE, [{"n": 3}])
+
+
+def test_failed_call_reaches_every_waiting_caller():
+    client = FakeClient(fail=ConnectionError("bigquery down"))
+    buffer = InsertBuffer(client, max_rows=500, max_delay=60)
+    first = buffer.submit(TABLE, [{"n": 1}])
+    second = buffer.submit(TABLE, [{"n": 2}, {"n": 3}])
+    buffer.flush()
+    for future in first + second:
+        with pytest.raises(ConnectionError):
+            future.result(timeout=1)
+    buffer.close()
+
+
+def test_row_ids_are_content_derived():
+    client = FakeClient()
+    buffer = InsertBuffer(client, max_rows=500, max_delay=60)
+    buffer.submit(TABLE, [{"n": 1, "a": "x"}])
+    buffer.submit(TABLE, [{"a": "x", "n": 1}], row_ids=["given"])
+    buffer.close()
+    _, _, ids = client.calls[0]
+    assert ids == [row_id(TABLE, {"a": "x", "n": 1}), "given"]
+    assert row_id(TABLE, {"n": 1}) != row_id("calendar_system.other", {"n": 1})
@@ -0,0 +1,110 @@
+import pytest
+
+from JsonRepair import JSON_REPAIRS, record_repairs, repair_parse_output
+
+VALID = '{"intent": "cancel_appointment", "user_id": "USER001", "appointment_id": "APT-1-WORKER1"}'
+EXPECTED = {"intent": "cancel_appointment", "user_id": "USER001", "appointment_id": "APT-1-WORKER1"}
+
+
+def test_valid_json_needs_no_repair():
+    assert repair_parse_output(VALID) == (EXPECTED, [])
+
+
+@pytest.mark.parametrize("raw, repairs", [
+    (f"```json\n{VALID}\n```", ["fence"]),
+    (f"```\n{VALID}\n```", ["fence"]),
+    (f"Sure! Here is the request: {VALID} Let me know if you need anything else.", ["prose"]),
+    ('{"intent": "cancel_appointment", // the intent\n "user_id": "USER001", /* id */ '
+     '"appointment_id": "APT-1-WORKER1"}', ["comments"]),
+    ('{"intent": "cancel_appointment", "user_id": "USER001", "appointment_id": "APT-1-WORKER1",}', ["trailing_comma"]),
+    ("{'intent': 'cancel_appointment', 'user_id': 'USER001', 'appointment_id': 'APT-1-WORKER1'}", ["quotes"]),
+    ('{intent: "cancel_appointment", user_id: "USER001", appointment_id: "APT-1-WORKER1"}', ["unquoted_key"]),
+    ('{"intent": "cancel_appointment", "user_id": "USER001", "appointment_id": "APT-1-WORKER1"', ["unclosed"]),
+    ('{"arguments": ' + VALID + '}', ["unwrap"]),
+])
+def test_syntax_repairs(raw, repairs):
+    assert repair_parse_output(raw) == (EXPECTED, repairs)
+
+
+def test_python_literals():
+    data, repairs = repair_parse_output('{"intent": "get_availability", "user_id": "USER001", "flexible": True, '
+                                        '"strict": False, "note": None}')
+    assert data == {"intent": "get_availability", "user_id": "USER001", "flexible": True, "strict": False}
+    assert repairs == ["literals", "empty_values"]
+
+
+@pytest.mark.parametrize("raw, name", [
+    ("{'worker_name': 'Tyler O\\'Brien'}", "Tyler O'Brien"),
+    ('{\'worker_name\': \'say "hi"\'}', 'say "hi"'),
+    ('{\'worker_name\': \'back\\\\slash\'}', "back\\slash"),
+])
+def test_single_quoted_strings_keep_their_content(raw, name):
+    data, repairs = repair_parse_output(raw)
+    assert data == {"worker_name": name} and repairs == ["quotes"]
+
+
+def test_braces_inside_strings_do_not_end_the_object():
+    data, repairs = repair_parse_output('Result: {"intent": "cancel_appointment", "user_id": "USER001", '
+                                        '"appointment_id": "APT-1-WORKER1", "note": "use } carefully"} done')
+    assert data["note"] == "use } carefully" and repairs == ["prose"]
+
+
+def test_empty_values_are_dropped():
+    data, repairs = repair_parse_output('{"intent": "cancel_appointment", "user_id": "USER001", '
+                                        '"appointment_id": "APT-1-WORKER1", "worker_name": "", "datetime": null}')
+    assert data == EXPECTED and repairs == ["empty_values"]
+
+
+@pytest.mark.parametrize("intent, expected", [
+    ("Cancel Appointment", "cancel_appointment"),
+    ("cancel-appointment", "cancel_appointment"),
+    ("cancel", "cancel_appointment"),
+    ("availability", "get_availability"),
+    ("check_availability", "get_availability"),
+])
+def test_intent_is_normalised(intent, expected):
+    data, repairs = repair_parse_output(f'{{"intent": "{intent}", "user_id": "USER001"}}')
+    assert data["intent"] == expected and repairs == ["intent"]
+
+
+def test_unknown_intent_is_left_for_validation():
+    data, repairs = repair_parse_output('{"intent": "book_flight", "user_id": "USER001"}')
+    assert data["intent"] == "book_flight" and repairs == []
+
+
+def test_ids_are_upper_cased():
+    data, repairs = repair_parse_output('{"intent": "cancel_appointment", "user_id": " user001", '
+                                        '"appointment_id": "apt-1-worker1"}')
+    assert data == EXPECTED and repairs == ["user_id", "appointment_id"]
+
+
+@pytest.mark.parametrize("duration, minutes", [
+    ('"1 hour"', 60), ('"1.5 hours"', 90), ('"45 min"', 45), ('"2h"', 120), ("30.0", 30),
+])
+def test_duration_is_converted_to_minutes(duration, minutes):
+    data, repairs = repair_parse_output(f'{{"intent": "create_appointment", "duration": {duration}}}')
+    assert data["duration"] == minutes and repairs == ["duration"]
+
+
+@pytest.mark.parametrize("duration", ['"30"', "30", '"a while"'])
+def test_duration_left_as_is(duration):
+    data, repairs = repair_parse_output(f'{{"intent": "create_appointment", "duration": {duration}}}')
+    assert repairs == []
+
+
+@pytest.mark.parametrize("suffix", ["Z", "+05:30", "-0400"])
+def test_timezone_suffix_is_dropped(suffix):
+    raw = f'{{"intent": "create_appointment", "datetime": "2030-03-06T15:00:00{suffix}"}}'
+    data, repairs = repair_parse_output(raw)
+    assert data["datetime"] == "2030-03-06T15:00:00" and repairs == ["timezone_suffix"]
+
+
+@pytest.mark.parametrize("raw", ["no json here", "[1, 2, 3]", '{"intent": "cancel_appointment" "user_id"}'])
+def test_unrepairable_output(raw):
+    assert repair_parse_output(raw)[0] is None
+
+
+def test_record_repairs_counts_each_repair():
+    before = JSON_REPAIRS.value(repair="quotes")
+    record_repairs(["quotes", "prose"])
+    assert JSON_REPAIRS.value(repair="quotes") == before + 1
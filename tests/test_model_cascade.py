@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from ChatGPTIntegration import AsyncChatGPTAdapter, ChatGPTAdapter
+from CoreDatamodels import ParsedRequest
+from ModelCascade import CASCADE_TOTAL, ModelCascade
+from ResilientLLM import CircuitBreaker, ResilientCaller
+
+TEXT = "cancel APT-1-WORKER1"
+ANSWER = '{"intent": "cancel_appointment", "user_id": "USER001", "appointment_id": "APT-1-WORKER1"}'
+
+
+def rate_limited():
+    response = httpx.Response(429, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def completion(arguments):
+    message = SimpleNamespace(tool_calls=[SimpleNamespace(function=SimpleNamespace(arguments=arguments))],
+                              content=None)
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeCompletions:
+    """Answers per model: an exception to raise or tool-call arguments to return"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.models = []
+
+    def _answer(self, model):
+        self.models.append(model)
+        answer = self.answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        return completion(answer)
+
+    def create(self, model, **kwargs):
+        return self._answer(model)
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    async def create(self, model, **kwargs):
+        return self._answer(model)
+
+
+def caller(name, failures=5):
+    return ResilientCaller(name, breaker=CircuitBreaker(name, failure_threshold=failures), max_retries=0)
+
+
+def adapter(cls, completions, cascade_failures=5):
+    gpt = cls("test-key", parse_model="strong", cascade=ModelCascade("cheap", "strong"),
+              resilience=caller("test_strong"), cascade_resilience=caller("test_cheap", cascade_failures))
+    gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return gpt
+
+
+def test_rate_limited_cheap_model_escalates_to_strong_model():
+    completions = FakeCompletions({"cheap": rate_limited(), "strong": ANSWER})
+    before = CASCADE_TOTAL.value(result="escalated", reason="unavailable")
+    result = adapter(ChatGPTAdapter, completions)._parse_with_llm(TEXT, "USER001")
+    assert isinstance(result, ParsedRequest) and result.appointment_id == "APT-1-WORKER1"
+    assert completions.models == ["cheap", "strong"]
+    assert CASCADE_TOTAL.value(result="escalated", reason="unavailable") == before + 1
+
+
+def test_open_cascade_circuit_escalates_without_calling_cheap_model():
+    completions = AsyncFakeCompletions({"cheap": rate_limited(), "strong": ANSWER})
+    gpt = adapter(AsyncChatGPTAdapter, completions, cascade_failures=1)
+    asyncio.run(gpt._parse_with_llm(TEXT, "USER001"))
+    assert gpt.cascade_resilience.breaker.state == "open"
+    assert gpt.resilience.breaker.state == "closed"
+
+    completions.models.clear()
+    result = asyncio.run(gpt._parse_with_llm(TEXT, "USER001"))
+    assert isinstance(result, ParsedRequest)
+    assert completions.models == ["strong"]
+
+
+def test_cheap_answer_accepted_without_strong_call():
+    completions = AsyncFakeCompletions({"cheap": ANSWER, "strong": ANSWER})
+    result = asyncio.run(adapter(AsyncChatGPTAdapter, completions)._parse_with_llm(TEXT, "USER001"))
+    assert isinstance(result, ParsedRequest) and completions.models == ["cheap"]
+
+
+@pytest.mark.parametrize("answer, reason", [
+    ('{"intent": "cancel_appointment", "user_id": "USER001", "appointment_id": "APT-2-WORKER9"}', "low_confidence"),
+    ('{"intent": "bogus"}', "invalid"),
+])
+def test_unreliable_cheap_answer_escalates(answer, reason):
+    completions = AsyncFakeCompletions({"cheap": answer, "strong": ANSWER})
+    before = CASCADE_TOTAL.value(result="escalated", reason=reason)
+    result = asyncio.run(adapter(AsyncChatGPTAdapter, completions)._parse_with_llm(TEXT, "USER001"))
+    assert isinstance(result, ParsedRequest) and completions.models == ["cheap", "strong"]
+    assert CASCADE_TOTAL.value(result="escalated", reason=reason) == before + 1
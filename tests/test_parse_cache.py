@@ -0,0 +1,105 @@
+import time
+from datetime import date, datetime
+
+import pytest
+
+import ParseCache as parse_cache_module
+from CoreDatamodels import ParsedRequest
+from ParseCache import CACHE_EVICTIONS, CACHE_LOOKUPS, ParseCache
+
+TEXT = "Book Tyler tomorrow at 3pm"
+
+
+def parsed(user_id="USER001"):
+    return ParsedRequest(intent="create_appointment", user_id=user_id, worker_name="Tyler",
+                         datetime=datetime(2030, 3, 6, 15, 0))
+
+
+@pytest.fixture
+def today(monkeypatch):
+    def set_today(day):
+        class FixedDate(date):
+            @classmethod
+            def today(cls):
+                return day
+        monkeypatch.setattr(parse_cache_module, "date", FixedDate)
+    set_today(date(2030, 3, 5))
+    return set_today
+
+
+def test_hit_for_same_text_user_and_day(today):
+    cache = ParseCache()
+    cache.put(TEXT, "USER001", parsed())
+    hits = CACHE_LOOKUPS.value(result="hit")
+    assert cache.get(TEXT, "USER001") == parsed()
+    assert CACHE_LOOKUPS.value(result="hit") == hits + 1
+
+
+@pytest.mark.parametrize("variant", [
+    "book tyler tomorrow at 3pm", "  Book   Tyler tomorrow at 3pm!", "BOOK TYLER TOMORROW AT 3PM.",
+])
+def test_text_is_normalised(today, variant):
+    cache = ParseCache()
+    cache.put(TEXT, "USER001", parsed())
+    assert cache.get(variant, "USER001") is not None
+
+
+def test_other_user_misses(today):
+    cache = ParseCache()
+    cache.put(TEXT, "USER001", parsed())
+    misses = CACHE_LOOKUPS.value(result="miss")
+    assert cache.get(TEXT, "USER002") is None
+    assert CACHE_LOOKUPS.value(result="miss") == misses + 1
+
+
+def test_next_day_misses(today):
+    # "tomorrow" means another date once the day changes
+    cache = ParseCache()
+    cache.put(TEXT, "USER001", parsed())
+    today(date(2030, 3, 6))
+    assert cache.get(TEXT, "USER001") is None
+
+
+def test_key_includes_reference_day():
+    assert ParseCache.key(" Hello  there! ", "USER001", date(2030, 3, 5)) == ("hello there", "USER001", "2030-03-05")
+
+
+@pytest.mark.parametrize("result", [
+    {"error": "Validation failed", "details": "missing datetime"},
+    {"error": "Language service unavailable", "details": "timeout"},
+    None,
+])
+def test_errors_are_never_cached(today, result):
+    cache = ParseCache()
+    cache.put(TEXT, "USER001", result)
+    assert cache.get(TEXT, "USER001") is None
+    assert len(cache._cache) == 0
+
+
+def test_entries_are_copies(today):
+    cache = ParseCache()
+    original = parsed()
+    cache.put(TEXT, "USER001", original)
+    original.worker_name = "Changed"
+    first = cache.get(TEXT, "USER001")
+    first.duration = 60
+    assert cache.get(TEXT, "USER001") == parsed()
+
+
+def test_entries_expire(today):
+    cache = ParseCache(ttl=0.05)
+    cache.put(TEXT, "USER001", parsed())
+    expired = CACHE_EVICTIONS.value(reason="ttl")
+    time.sleep(0.1)
+    assert cache.get(TEXT, "USER001") is None
+    assert CACHE_EVICTIONS.value(reason="ttl") == expired + 1
+
+
+def test_least_recently_used_entry_is_evicted(today):
+    cache = ParseCache(maxsize=2)
+    for user_id in ("USER001", "USER002"):
+        cache.put(TEXT, user_id, parsed(user_id))
+    cache.get(TEXT, "USER001")
+    cache.put(TEXT, "USER003", parsed("USER003"))
+    assert cache.get(TEXT, "USER002") is None
+    assert cache.get(TEXT, "USER001") is not None and cache.get(TEXT, "USER003") is not None
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from QueryRegistry import QUERY_SECONDS, QUERY_TOTAL, QueryRegistry
+
+
+class FakeJob:
+    cache_hit = True
+    total_bytes_processed = 0
+    slot_millis = 0
+
+    def result(self, **kwargs):
+        return [{"n": 1}]
+
+
+class SlowSubmitClient:
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+
+    def query(self, sql, job_config=None):
+        self.calls.append((sql, {p.name: p.value for p in job_config.query_parameters}))
+        time.sleep(self.delay)  # the job-insert round trip
+        return FakeJob()
+
+
+def test_latency_includes_submission():
+    queries = QueryRegistry()
+    queries.register("test_slow_submit", "SELECT @n AS n", n="INT64")
+    assert queries.rows(SlowSubmitClient(0.05), "test_slow_submit", n=1) == [{"n": 1}]
+    assert QUERY_SECONDS.sum(query="test_slow_submit") >= 0.05
+    assert QUERY_TOTAL.value(query="test_slow_submit", cache="hit") == 1
+
+
+def test_sql_is_normalised_and_parameters_bound():
+    queries = QueryRegistry()
+    queries.register("test_params", """
+        SELECT *
+        FROM t WHERE a = @a AND (@b IS NULL OR b = @b)
+    """, a="STRING", b="STRING")
+    client = SlowSubmitClient(0)
+    queries.rows(client, "test_params", a="x")
+    assert client.calls == [("SELECT * FROM t WHERE a = @a AND (@b IS NULL OR b = @b)", {"a": "x", "b": None})]
+
+
+def test_unknown_parameter_is_rejected():
+    queries = QueryRegistry()
+    queries.register("test_unknown", "SELECT @a", a="STRING")
+    with pytest.raises(TypeError):
+        queries.run(SlowSubmitClient(0), "test_unknown", b="x")
+
+
+def test_conflicting_registration_is_rejected():
+    queries = QueryRegistry()
+    queries.register("test_dup", "SELECT 1")
+    queries.register("test_dup", "SELECT   1")  # same statement after normalisation
+    with pytest.raises(ValueError):
+        queries.register("test_dup", "SELECT 2")
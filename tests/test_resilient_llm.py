@@ -0,0 +1,276 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+import ResilientLLM
+from ResilientLLM import LLM_HEDGES, CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+class FakeTime:
+    """Stands in for the `time` module inside ResilientLLM: sleeping just advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(ResilientLLM, "time", fake)
+    return fake
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def rate_limited(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers,
+                              request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def bad_request():
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return openai.BadRequestError("bad request", response=response, body=None)
+
+
+class Flaky:
+    """fn(timeout) that raises the queued errors, then returns "ok"; records each attempt's timeout"""
+
+    def __init__(self, *errors, clock=None, takes=0.0):
+        self.errors = list(errors)
+        self.timeouts = []
+        self.clock = clock
+        self.takes = takes
+
+    def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        if self.clock is not None:
+            self.clock.now += min(self.takes, timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def caller(**kwargs):
+    kwargs = {"deadline": 10.0, "attempt_timeout": 4.0, "max_retries": 2, "backoff": 0.2, "hedge": False, **kwargs}
+    return ResilientCaller(kwargs.pop("name", "test"), **kwargs)
+
+
+# ----------------------------------------------------------------------
+# CircuitBreaker
+# ----------------------------------------------------------------------
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test_open", failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()  # a success resets the count
+    for _ in range(3):
+        assert breaker.state == "closed"
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == pytest.approx(20)
+    assert breaker.retry_after() == pytest.approx(20)
+
+
+def test_breaker_half_open_lets_one_probe_through_then_closes(clock):
+    breaker = CircuitBreaker("test_half_open", failure_threshold=1, reset_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()  # the probe
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # a second caller while the probe is out
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("test_reopen", failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 31
+    breaker.before_call()
+    breaker.record_failure()  # one failure in half-open is enough
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_abandoned_probe_lets_another_through(clock):
+    breaker = CircuitBreaker("test_abandon", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()
+    breaker.abandon()
+    breaker.before_call()
+    assert breaker.state == "half_open"
+
+
+# ----------------------------------------------------------------------
+# call_sync
+# ----------------------------------------------------------------------
+def test_retryable_errors_are_retried(clock):
+    fn = Flaky(connection_error(), rate_limited())
+    assert caller(name="test_retry").call_sync("parse", fn) == "ok"
+    assert len(fn.timeouts) == 3 and len(clock.sleeps) == 2
+    # Full jitter: at most backoff * 2 ** retries
+    assert clock.sleeps[0] <= 0.2 and clock.sleeps[1] <= 0.4
+
+
+def test_server_retry_after_is_honoured(clock):
+    fn = Flaky(rate_limited(retry_after=3))
+    assert caller(name="test_retry_after").call_sync("parse", fn) == "ok"
+    assert clock.sleeps == [3.0]
+
+
+def test_non_retryable_error_is_raised_at_once(clock):
+    resilience = caller(name="test_bad_request", breaker=CircuitBreaker("test_bad_request", failure_threshold=1))
+    fn = Flaky(bad_request())
+    with pytest.raises(openai.BadRequestError):
+        resilience.call_sync("parse", fn)
+    assert len(fn.timeouts) == 1
+    assert resilience.breaker.state == "closed"  # the upstream answered: it is healthy
+
+
+def test_retries_stay_within_the_deadline(clock):
+    # Every attempt times out after using its whole budget
+    fn = Flaky(*[asyncio.TimeoutError()] * 20, clock=clock, takes=100)
+    resilience = caller(name="test_deadline", deadline=10.0, attempt_timeout=4.0, max_retries=20)
+    started = clock.now
+    with pytest.raises(asyncio.TimeoutError):
+        resilience.call_sync("parse", fn)
+    assert clock.now - started <= 10.0
+    assert all(timeout <= 4.0 for timeout in fn.timeouts)
+    assert len(fn.timeouts) >= 2
+
+
+def test_exhausted_retries_open_the_breaker(clock):
+    resilience = caller(name="test_exhausted", max_retries=1,
+                        breaker=CircuitBreaker("test_exhausted", failure_threshold=2, reset_timeout=30))
+    for _ in range(2):
+        with pytest.raises(openai.APIConnectionError):
+            resilience.call_sync("parse", Flaky(connection_error(), connection_error()))
+    assert resilience.breaker.state == "open"
+    fn = Flaky()
+    with pytest.raises(CircuitOpenError):
+        resilience.call_sync("parse", fn)
+    assert fn.timeouts == []  # failed fast
+
+
+# ----------------------------------------------------------------------
+# call (async)
+# ----------------------------------------------------------------------
+def test_async_attempt_timeout_is_retried():
+    attempts = []
+
+    async def fn(timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)  # hangs past the attempt timeout
+        return "ok"
+
+    resilience = caller(name="test_async_timeout", attempt_timeout=0.05, backoff=0.01)
+    assert asyncio.run(resilience.call("parse", fn)) == "ok"
+    assert len(attempts) == 2
+
+
+def test_async_gives_up_at_the_deadline():
+    async def fn(timeout):
+        await asyncio.sleep(1)
+
+    resilience = caller(name="test_async_deadline", deadline=0.3, attempt_timeout=0.1, max_retries=10, backoff=0.01)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(asyncio.TimeoutError):
+            await resilience.call("parse", fn)
+        return loop.time() - started
+
+    assert asyncio.run(run()) < 0.5
+
+
+def hedging_caller(name):
+    resilience = caller(name=name, hedge=True, hedge_min_delay=0.02, attempt_timeout=2.0)
+    resilience._latencies.extend([0.01] * 20)  # recent p95: below hedge_min_delay
+    return resilience
+
+
+def test_slow_attempt_is_hedged():
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+            return "primary"
+        return "hedge"
+
+    before = LLM_HEDGES.value(call="parse", winner="hedge")
+    assert asyncio.run(hedging_caller("test_hedge").call("parse", fn)) == "hedge"
+    assert len(calls) == 2 and calls[1] < calls[0]  # the hedge gets what is left of the attempt
+    assert LLM_HEDGES.value(call="parse", winner="hedge") == before + 1
+
+
+def test_fast_attempt_is_not_hedged():
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        return "primary"
+
+    assert asyncio.run(hedging_caller("test_no_hedge").call("parse", fn)) == "primary"
+    assert len(calls) == 1
+
+
+def test_hedging_can_be_turned_off_per_call():
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert asyncio.run(hedging_caller("test_hedge_off").call("parse", fn, hedge=False)) == "primary"
+    assert len(calls) == 1
+
+
+def test_cancelled_probe_is_abandoned(clock):
+    breaker = CircuitBreaker("test_cancel", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    resilience = caller(name="test_cancel", breaker=breaker)
+
+    async def hang(timeout):
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.ensure_future(resilience.call("parse", hang))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    breaker.before_call()  # another probe is allowed